@@ -4,6 +4,15 @@ from typing import List, Dict
 import json
 import re
 
+from .exact import cluster_exact
+from .incremental import ClusterStateUnavailable, get_state_store, sketches, text_hash
+from .minhash import cluster_minhash
+from .parallel import cluster_sharded
+from .sweep import MAX_SWEEP_THRESHOLDS, MIN_SWEEP_THRESHOLD, TooManyEdges, sweep_clusters
+
+# Jaccard similarity needed to share a group
+CLUSTER_THRESHOLD = 0.15
+
 def tokenize(text: str) -> set:
     return set(re.findall(r"\b\w{3,}\b", text.lower()))
 
@@ -34,6 +43,83 @@ def cluster_bookmarks(bookmarks: List[Dict], threshold: float = 0.5) -> List[Lis
 
     return clusters
 
+def group_by_label(bookmarks: List[Dict], labels: List[int]) -> List[List[Dict]]:
+    """
+    Turn one component label per bookmark into cluster lists, ordered by
+    each cluster's first bookmark, members in input order.
+    """
+    clusters: Dict[int, List[Dict]] = {}
+    for bookmark, label in zip(bookmarks, labels):
+        clusters.setdefault(label, []).append(bookmark)
+    return list(clusters.values())
+
+def parse_thresholds(value) -> List[float]:
+    """
+    Validated "thresholds" list: 1..MAX_SWEEP_THRESHOLDS numbers in
+    [MIN_SWEEP_THRESHOLD, 1].
+    """
+    if not isinstance(value, list) or not 0 < len(value) <= MAX_SWEEP_THRESHOLDS:
+        raise ValueError(f"'thresholds' must be a list of 1 to {MAX_SWEEP_THRESHOLDS} numbers.")
+    thresholds = []
+    for t in value:
+        if isinstance(t, bool) or not isinstance(t, (int, float)) or not MIN_SWEEP_THRESHOLD <= t <= 1:
+            raise ValueError(f"Each threshold must be a number from {MIN_SWEEP_THRESHOLD} to 1.")
+        thresholds.append(float(t))
+    return thresholds
+
+def group_names(labels: List[int]) -> List[str]:
+    """
+    "Group N" per bookmark, numbering groups by their first bookmark.
+    """
+    numbers: Dict[int, int] = {}
+    return [f"Group {numbers.setdefault(label, len(numbers) + 1)}" for label in labels]
+
+def item_id_for(item) -> str:
+    return str(item.get("id") or item.get("url") or item.get("title") or "")
+
+def apply_cluster_delta(user_key: str, add: List[Dict], remove: List[Dict], snapshot=None):
+    """
+    "mode": "incremental": place added/edited bookmarks (`add`) into the
+    user's stored clusters and drop removed ones (`remove`, items with
+    id/url). `snapshot`, if given, is the user's full list: anything
+    stored but missing from it is removed, and unchanged bookmarks cost a
+    hash. Group ids of bookmarks already stored never change.
+    Returns (changed assignments, removed ids, stats).
+    """
+    store = get_state_store()
+    upserts = {item_id_for(item): item.get("url_content", "") or "" for item in add}
+    removals = {item_id_for(item) for item in remove}
+    if snapshot is not None:
+        upserts.update((item_id_for(item), item.get("url_content", "") or "") for item in snapshot)
+
+    with store.open(user_key, CLUSTER_THRESHOLD) as state:
+        if snapshot is not None:
+            removals.update(i for i in state.items if i not in upserts)
+
+        removed = []
+        for item_id in removals:
+            if item_id not in upserts and state.remove(item_id):
+                removed.append(item_id)
+
+        # New or edited bookmarks, in request order; an edit is re-placed
+        pending = []
+        for item_id, text in upserts.items():
+            digest = text_hash(text)
+            previous = state.items.get(item_id)
+            if previous is not None and previous[1] == digest:
+                continue
+            if previous is not None:
+                state.remove(item_id)
+            pending.append((item_id, digest, tokenize(text)))
+
+        changed = []
+        for (item_id, digest, tokens), sketch in zip(pending, sketches([p[2] for p in pending])):
+            cluster_id = state.add(item_id, digest, tokens, sketch)
+            changed.append({"id": item_id, "cluster_group": f"Group {cluster_id}"})
+
+    stats = {"clusters": len(state.clusters), "items_clustered": len(pending)}
+    return changed, removed, stats
+
 def format_response(clusters: List[List[Dict]]) -> List[Dict]:
     response = []
     for idx, cluster in enumerate(clusters):
@@ -50,6 +136,36 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         data = req.get_json()
         bookmarks = data.get("bookmarks") or data.get("urls") or []
 
+        # "mode": "incremental" -> place only added/edited bookmarks into the
+        # user's stored clusters; group ids stay stable between calls
+        if str(data.get("mode") or "").strip().lower() == "incremental":
+            user_key = str(data.get("user_key") or "").strip()
+            if not user_key:
+                return func.HttpResponse(
+                    json.dumps({"error": "user_key is required in incremental mode"}),
+                    status_code=400,
+                    mimetype="application/json"
+                )
+            snapshot = data.get("bookmarks") or data.get("urls")
+            try:
+                changed, removed, stats = apply_cluster_delta(
+                    user_key,
+                    data.get("add") or [],
+                    data.get("remove") or [],
+                    snapshot if isinstance(snapshot, list) else None,
+                )
+            except ClusterStateUnavailable as e:
+                return func.HttpResponse(
+                    json.dumps({"error": str(e), "success": False}),
+                    status_code=503,
+                    mimetype="application/json"
+                )
+            return func.HttpResponse(
+                json.dumps({"success": True, "changed": changed, "removed": removed, **stats}),
+                status_code=200,
+                mimetype="application/json"
+            )
+
         if not bookmarks or not isinstance(bookmarks, list):
             return func.HttpResponse(
                 json.dumps({"error": "No valid bookmark list provided."}),
@@ -57,7 +173,55 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 mimetype="application/json"
             )
 
-        clusters = cluster_bookmarks(bookmarks, threshold=0.15)
+        engine = str(data.get("engine") or "greedy").strip().lower()
+
+        # "thresholds": [...] -> one similarity graph, one grouping per
+        # threshold; bookmarks stay in input order with a group per threshold
+        if data.get("thresholds") is not None:
+            try:
+                thresholds = parse_thresholds(data.get("thresholds"))
+            except ValueError as e:
+                return func.HttpResponse(
+                    json.dumps({"error": str(e)}),
+                    status_code=400,
+                    mimetype="application/json"
+                )
+            token_sets = [tokenize(bm.get("url_content", "")) for bm in bookmarks]
+            try:
+                labels, engine = sweep_clusters(token_sets, thresholds, engine=engine)
+            except TooManyEdges as e:
+                return func.HttpResponse(
+                    json.dumps({"error": f"{e} Use a higher lowest threshold."}),
+                    status_code=400,
+                    mimetype="application/json"
+                )
+            names = [group_names(labels[t]) for t in thresholds]
+            result = []
+            for idx, bm in enumerate(bookmarks):
+                bm_copy = bm.copy()
+                bm_copy["cluster_groups"] = [groups[idx] for groups in names]
+                result.append(bm_copy)
+
+            return func.HttpResponse(
+                json.dumps({"success": True, "thresholds": thresholds, "engine": engine, "results": result}),
+                status_code=200,
+                mimetype="application/json"
+            )
+
+        # "engine": "exact" -> same groups as greedy, via a token index
+        # "engine": "minhash" -> LSH candidates + union-find (scales to 100k)
+        # "engine": "sharded" -> exact greedy per domain shard on a process
+        # pool, then a greedy merge of the shard representatives
+        if engine == "exact":
+            token_sets = [tokenize(bm.get("url_content", "")) for bm in bookmarks]
+            clusters = group_by_label(bookmarks, cluster_exact(token_sets, CLUSTER_THRESHOLD))
+        elif engine == "minhash":
+            token_sets = [tokenize(bm.get("url_content", "")) for bm in bookmarks]
+            clusters = group_by_label(bookmarks, cluster_minhash(token_sets, CLUSTER_THRESHOLD))
+        elif engine == "sharded":
+            clusters = group_by_label(bookmarks, cluster_sharded(bookmarks, CLUSTER_THRESHOLD, tokenize))
+        else:
+            clusters = cluster_bookmarks(bookmarks, threshold=CLUSTER_THRESHOLD)
         result = format_response(clusters)
 
         return func.HttpResponse(
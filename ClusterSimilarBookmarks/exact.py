@@ -0,0 +1,98 @@
+"""
+Indexed exact greedy clustering for ClusterSimilarBookmarks ("engine": "exact").
+
+Same result as cluster_bookmarks(): each bookmark joins the first cluster
+(in creation order) whose representative has Jaccard >= threshold with
+it, otherwise it starts a new cluster. Instead of comparing against every
+representative, each representative is tokenized once and indexed by
+token, so only clusters that share a token with the bookmark are scored.
+
+Two bounds keep the candidate lists short:
+
+- Prefix filter: Jaccard >= t needs an overlap of at least ceil(t * |x|)
+  tokens for either set x. With tokens in a fixed rarest-first order,
+  a representative only needs indexing under its first
+  |r| - ceil(t * |r|) + 1 tokens, and a bookmark only probes its first
+  |a| - ceil(t * |a|) + 1 tokens. Any pair that can reach the threshold
+  shares a token in both prefixes, and common words rarely make it into
+  a prefix.
+- Length filter: Jaccard <= min(|a|, |r|) / max(|a|, |r|), so a
+  representative outside [t * |a|, |a| / t] is skipped without computing
+  the intersection.
+
+Candidates are then checked in cluster order with the exact Jaccard, so
+the first match is the cluster the plain scan would have picked.
+"""
+import math
+from typing import Dict, List, Sequence, Set
+
+# Slack on ceil(t * n), so float error can only make prefixes longer
+_EPS = 1e-9
+
+
+def prefix_length(threshold: float, size: int) -> int:
+    """
+    Tokens of a rarest-first ordered set that any set with Jaccard >=
+    threshold against it must share at least one of.
+    """
+    return max(0, size - max(1, math.ceil(threshold * size - _EPS)) + 1)
+
+
+def token_ranks(token_sets: Sequence[Set[str]]) -> Dict[str, int]:
+    """
+    Rarest-first rank of every token (ties by token), fixed for a run.
+    """
+    df: Dict[str, int] = {}
+    for tokens in token_sets:
+        for t in tokens:
+            df[t] = df.get(t, 0) + 1
+    return {t: r for r, t in enumerate(sorted(df, key=lambda t: (df[t], t)))}
+
+
+def cluster_exact(token_sets: Sequence[Set[str]], threshold: float) -> List[int]:
+    """
+    Cluster id per bookmark (the index of the cluster's first member),
+    identical to the greedy first-representative scan.
+    """
+    n = len(token_sets)
+    if threshold <= 0:
+        # every similarity is >= threshold: all join the first cluster
+        return [0] * n
+
+    rank = token_ranks(token_sets)
+
+    labels: List[int] = [0] * n
+    reps: List[int] = []                   # cluster -> first bookmark index
+    postings: Dict[str, List[int]] = {}    # token -> clusters, ascending
+    for i, tokens in enumerate(token_sets):
+        size = len(tokens)
+        ordered = sorted(tokens, key=rank.__getitem__)
+        prefix = ordered[:prefix_length(threshold, size)]
+
+        candidates: Set[int] = set()
+        for t in prefix:
+            candidates.update(postings.get(t, ()))
+
+        placed = -1
+        lo, hi = threshold * size - _EPS, size / threshold + _EPS
+        for c in sorted(candidates):
+            rep_tokens = token_sets[reps[c]]
+            rep_size = len(rep_tokens)
+            if rep_size < lo or rep_size > hi:
+                continue
+            inter = len(tokens & rep_tokens)
+            if inter / (size + rep_size - inter) >= threshold:
+                placed = c
+                break
+
+        if placed >= 0:
+            labels[i] = reps[placed]
+            continue
+
+        # New cluster: this bookmark is its representative
+        cluster = len(reps)
+        reps.append(i)
+        labels[i] = i
+        for t in prefix:
+            postings.setdefault(t, []).append(cluster)
+    return labels
@@ -0,0 +1,368 @@
+"""
+Incremental clustering for ClusterSimilarBookmarks ("mode": "incremental").
+
+Per user we keep the clusters themselves instead of re-clustering the
+whole library on every call: each cluster has a stable id (never reused,
+so "Group 7" stays "Group 7"), a representative bookmark with its token
+set and MinHash sketch, and its members. Representatives' sketches are
+indexed by LSH band, so a new bookmark is only compared with the
+representatives it collides with, and joins the oldest cluster whose
+representative has Jaccard >= threshold (greedy, as in
+cluster_bookmarks()), or starts a new one.
+
+Removing a bookmark never moves the others: if it was its cluster's
+representative, the next-oldest member takes over, and an empty cluster
+is dropped.
+
+SQLite (CLUSTER_STATE_DB_PATH, which must be shared by every instance)
+holds one row per bookmark and one per cluster (representative and
+sketch), so a delta writes only the rows it touched. Loaded states are
+kept in a small in-process LRU, but each delta checks the stored version
+first and reloads if another process saved since.
+"""
+import hashlib
+import heapq
+import json
+import logging
+import os
+import sqlite3
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .minhash import MAX_BUCKET_HEADS, MAX_BUCKET_SIZE, NUM_PERM, jaccard, lsh_params, np, signature_matrix, signatures
+
+# Required for "mode": "incremental". Group ids are only stable if every
+# instance and worker process uses the same database (e.g. a file on an
+# Azure Files mount), so there is deliberately no per-instance default.
+CLUSTER_STATE_DB_PATH = os.environ.get("CLUSTER_STATE_DB_PATH", "")
+
+# User states kept in memory per worker
+CLUSTER_STATE_CACHE_SIZE = int(os.environ.get("CLUSTER_STATE_CACHE_SIZE", "64"))
+
+logger = logging.getLogger(__name__)
+
+
+def text_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def sketches(token_sets: List[Set[str]]) -> List[Optional[tuple]]:
+    """
+    MinHash signature per token set (None if empty), NumPy-backed when
+    available.
+    """
+    if np is None or not token_sets:
+        return signatures(token_sets, NUM_PERM)
+    docs, matrix = signature_matrix(token_sets, NUM_PERM)
+    out: List[Optional[tuple]] = [None] * len(token_sets)
+    for row, i in enumerate(docs.tolist()):
+        out[i] = tuple(matrix[row].tolist())
+    return out
+
+
+class Cluster:
+    def __init__(self, rep_id: str, rep_tokens: Iterable[str], sketch: Optional[tuple]):
+        self.rep_id = rep_id
+        self.rep_tokens = frozenset(rep_tokens)
+        self.sketch = sketch
+        self.members: Dict[str, None] = {}  # insertion-ordered set, oldest first
+
+
+class ClusterState:
+    """
+    One user's clusters. `dirty_items` / `dirty_clusters` record what
+    changed since the last save.
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.bands, self.rows = lsh_params(threshold, NUM_PERM)
+        self.next_cluster = 1
+        self.next_seq = 0
+        self.version = 0  # stored version this state was loaded at / saved as
+        # id -> (cluster, hash, tokens, seq); seq orders members oldest first
+        self.items: Dict[str, Tuple[int, str, Tuple[str, ...], int]] = {}
+        self.clusters: Dict[int, Cluster] = {}
+        self.buckets: Dict[tuple, List[int]] = {}  # (band, band values) -> cluster ids
+        self.by_sketch: Dict[tuple, List[int]] = {}  # whole sketch -> cluster ids
+        self.dirty_items: Set[str] = set()
+        self.dirty_clusters: Set[int] = set()
+
+    # --- LSH index of representatives -------------------------------------------
+
+    def _band_keys(self, sketch: tuple) -> Iterable[tuple]:
+        rows = self.rows
+        for band in range(self.bands):
+            yield (band,) + sketch[band * rows:band * rows + rows]
+
+    def _index(self, cluster_id: int) -> None:
+        sketch = self.clusters[cluster_id].sketch
+        if sketch is not None:
+            self.by_sketch.setdefault(sketch, []).append(cluster_id)
+            for key in self._band_keys(sketch):
+                self.buckets.setdefault(key, []).append(cluster_id)
+
+    def _unindex(self, cluster_id: int) -> None:
+        sketch = self.clusters[cluster_id].sketch
+        if sketch is not None:
+            same = self.by_sketch[sketch]
+            same.remove(cluster_id)
+            if not same:
+                del self.by_sketch[sketch]
+            for key in self._band_keys(sketch):
+                bucket = self.buckets[key]
+                bucket.remove(cluster_id)
+                if not bucket:
+                    del self.buckets[key]
+
+    def _candidates(self, sketch: Optional[tuple]) -> List[int]:
+        if sketch is None:
+            return []
+        # Representatives with the same whole sketch always qualify; an
+        # oversized bucket only contributes its oldest clusters
+        found: Set[int] = set(self.by_sketch.get(sketch, ()))
+        for key in self._band_keys(sketch):
+            bucket = self.buckets.get(key)
+            if not bucket:
+                continue
+            if len(bucket) <= MAX_BUCKET_SIZE:
+                found.update(bucket)
+            else:
+                found.update(heapq.nsmallest(MAX_BUCKET_HEADS, bucket))
+        return sorted(found)
+
+    # --- updates ----------------------------------------------------------------
+
+    def add(self, item_id: str, digest: str, tokens: Set[str], sketch: Optional[tuple]) -> int:
+        """
+        Place a new bookmark (not already stored); returns its cluster id.
+        """
+        for cluster_id in self._candidates(sketch):
+            if jaccard(tokens, self.clusters[cluster_id].rep_tokens) >= self.threshold:
+                break
+        else:
+            cluster_id = self.next_cluster
+            self.next_cluster += 1
+            self.clusters[cluster_id] = Cluster(item_id, tokens, sketch)
+            self._index(cluster_id)
+            self.dirty_clusters.add(cluster_id)
+
+        self.clusters[cluster_id].members[item_id] = None
+        self.items[item_id] = (cluster_id, digest, tuple(sorted(tokens)), self.next_seq)
+        self.next_seq += 1
+        self.dirty_items.add(item_id)
+        return cluster_id
+
+    def remove(self, item_id: str) -> bool:
+        item = self.items.pop(item_id, None)
+        if item is None:
+            return False
+        cluster_id = item[0]
+        cluster = self.clusters[cluster_id]
+        del cluster.members[item_id]
+        self.dirty_items.add(item_id)
+
+        if cluster.rep_id == item_id:
+            self.dirty_clusters.add(cluster_id)
+            self._unindex(cluster_id)
+            if not cluster.members:
+                del self.clusters[cluster_id]
+                return True
+            # The next-oldest member represents the cluster from now on
+            cluster.rep_id = next(iter(cluster.members))
+            cluster.rep_tokens = frozenset(self.items[cluster.rep_id][2])
+            cluster.sketch = sketches([set(cluster.rep_tokens)])[0]
+            self._index(cluster_id)
+        return True
+
+    def group_of(self, item_id: str) -> Optional[int]:
+        item = self.items.get(item_id)
+        return item[0] if item else None
+
+
+class ClusterStateUnavailable(Exception):
+    """
+    No shared cluster state database is configured or it can't be opened.
+    """
+
+
+class ClusterStateStore:
+    """
+    user_key -> ClusterState in SQLite, with an in-process LRU of loaded
+    states. Every delta runs in one write transaction: the stored version
+    is compared with the cached state's, so a state changed by another
+    process or instance is reloaded, never overwritten.
+    """
+
+    def __init__(self, path: str, max_cached: int = CLUSTER_STATE_CACHE_SIZE):
+        self.lock = Lock()
+        self.max_cached = max(1, max_cached)
+        self._cache: "OrderedDict[str, ClusterState]" = OrderedDict()
+        # autocommit; transactions are opened explicitly in open()
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False, isolation_level=None)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS cluster_user (
+                user_key     TEXT PRIMARY KEY,
+                threshold    REAL NOT NULL,
+                next_cluster INTEGER NOT NULL,
+                next_seq     INTEGER NOT NULL,
+                version      INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS cluster_group (
+                user_key   TEXT NOT NULL,
+                cluster_id INTEGER NOT NULL,
+                rep_id     TEXT NOT NULL,
+                sketch     TEXT,
+                PRIMARY KEY (user_key, cluster_id)
+            );
+            CREATE TABLE IF NOT EXISTS cluster_item (
+                user_key   TEXT NOT NULL,
+                item_id    TEXT NOT NULL,
+                cluster_id INTEGER NOT NULL,
+                digest     TEXT NOT NULL,
+                tokens     TEXT NOT NULL,
+                seq        INTEGER NOT NULL,
+                PRIMARY KEY (user_key, item_id)
+            );
+            """
+        )
+
+    def _remember(self, user_key: str, state: ClusterState) -> None:
+        self._cache[user_key] = state
+        self._cache.move_to_end(user_key)
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+    def _load(self, user_key: str, threshold: float, row: tuple) -> ClusterState:
+        state = ClusterState(threshold)
+        state.next_cluster, state.next_seq, state.version = row[1], row[2], row[3]
+        for cluster_id, rep_id, sketch in self._conn.execute(
+                "SELECT cluster_id, rep_id, sketch FROM cluster_group WHERE user_key = ?", (user_key,)):
+            state.clusters[cluster_id] = Cluster(rep_id, (), tuple(json.loads(sketch)) if sketch else None)
+        for item_id, cluster_id, digest, tokens, seq in self._conn.execute(
+                "SELECT item_id, cluster_id, digest, tokens, seq FROM cluster_item "
+                "WHERE user_key = ? ORDER BY seq", (user_key,)):
+            state.items[item_id] = (cluster_id, digest, tuple(json.loads(tokens)), seq)
+            cluster = state.clusters[cluster_id]
+            cluster.members[item_id] = None
+            if cluster.rep_id == item_id:
+                cluster.rep_tokens = frozenset(state.items[item_id][2])
+        for cluster_id in state.clusters:
+            state._index(cluster_id)
+        return state
+
+    def _current(self, user_key: str, threshold: float) -> ClusterState:
+        """
+        The stored state, from the LRU only if nobody saved a newer version.
+        """
+        row = self._conn.execute(
+            "SELECT threshold, next_cluster, next_seq, version FROM cluster_user WHERE user_key = ?",
+            (user_key,),
+        ).fetchone()
+        if row is None:
+            return ClusterState(threshold)
+        if row[0] != threshold:
+            # Clustered at another threshold: start over, under a new
+            # version so no cached copy of the old clusters can match it
+            for table in ("cluster_group", "cluster_item"):
+                self._conn.execute(f"DELETE FROM {table} WHERE user_key = ?", (user_key,))
+            self._conn.execute(
+                "UPDATE cluster_user SET threshold = ?, next_cluster = 1, next_seq = 0, version = version + 1 "
+                "WHERE user_key = ?", (threshold, user_key),
+            )
+            state = ClusterState(threshold)
+            state.version = row[3] + 1
+            return state
+        cached = self._cache.get(user_key)
+        if cached is not None and cached.threshold == threshold and cached.version == row[3]:
+            return cached
+        return self._load(user_key, threshold, row)
+
+    @contextmanager
+    def open(self, user_key: str, threshold: float) -> Iterator[ClusterState]:
+        """
+        Yield the user's state for one delta and write what changed. The
+        write lock is held throughout, so concurrent deltas for the same
+        database (other threads, processes or instances) are serialized.
+        """
+        with self.lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                state = self._current(user_key, threshold)
+                yield state
+                self._write(user_key, state)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                self._cache.pop(user_key, None)
+                raise
+            self._remember(user_key, state)
+
+    def _write(self, user_key: str, state: ClusterState) -> None:
+        """
+        Write the bookmarks and clusters changed since the last save and
+        bump the stored version.
+        """
+        dirty_items, dirty_clusters = state.dirty_items, state.dirty_clusters
+        if not dirty_items and not dirty_clusters and state.version:
+            return
+        for item_id in dirty_items:
+            item = state.items.get(item_id)
+            if item is None:
+                self._conn.execute(
+                    "DELETE FROM cluster_item WHERE user_key = ? AND item_id = ?", (user_key, item_id))
+            else:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cluster_item "
+                    "(user_key, item_id, cluster_id, digest, tokens, seq) VALUES (?, ?, ?, ?, ?, ?)",
+                    (user_key, item_id, item[0], item[1], json.dumps(item[2]), item[3]),
+                )
+        for cluster_id in dirty_clusters:
+            cluster = state.clusters.get(cluster_id)
+            if cluster is None:
+                self._conn.execute(
+                    "DELETE FROM cluster_group WHERE user_key = ? AND cluster_id = ?", (user_key, cluster_id))
+            else:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cluster_group (user_key, cluster_id, rep_id, sketch) "
+                    "VALUES (?, ?, ?, ?)",
+                    (user_key, cluster_id, cluster.rep_id,
+                     json.dumps(cluster.sketch) if cluster.sketch is not None else None),
+                )
+        self._conn.execute(
+            "INSERT OR REPLACE INTO cluster_user (user_key, threshold, next_cluster, next_seq, version) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (user_key, state.threshold, state.next_cluster, state.next_seq, state.version + 1),
+        )
+        state.version += 1
+        state.dirty_items, state.dirty_clusters = set(), set()
+
+
+_store: Optional[ClusterStateStore] = None
+_store_lock = Lock()
+
+
+def get_state_store() -> ClusterStateStore:
+    """
+    The process-wide store. Raises ClusterStateUnavailable when
+    CLUSTER_STATE_DB_PATH isn't set or can't be opened: a per-instance
+    default would hand out conflicting group ids on a scaled-out app.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            if not CLUSTER_STATE_DB_PATH:
+                raise ClusterStateUnavailable(
+                    "Incremental mode needs CLUSTER_STATE_DB_PATH set to a database on "
+                    "storage shared by every instance."
+                )
+            try:
+                _store = ClusterStateStore(CLUSTER_STATE_DB_PATH)
+            except sqlite3.Error as e:
+                logger.warning("ClusterSimilarBookmarks: cluster state db unavailable at %s",
+                               CLUSTER_STATE_DB_PATH, exc_info=True)
+                raise ClusterStateUnavailable("Cluster state database is unavailable.") from e
+        return _store
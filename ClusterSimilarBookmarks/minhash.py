@@ -0,0 +1,324 @@
+"""
+MinHash + LSH clustering for ClusterSimilarBookmarks ("engine": "minhash").
+
+Each bookmark's tokenize(url_content) set gets a MinHash signature; LSH
+banding buckets signatures so only bookmarks that collide in some band
+become candidate pairs. Candidates are checked with exact Jaccard and
+similar pairs are joined with union-find, so clusters are the connected
+components of the "Jaccard >= threshold" graph (up to LSH recall) rather
+than the greedy first-representative assignment.
+
+NumPy is optional; without it signatures are computed in pure Python,
+which is correct but much slower.
+"""
+import hashlib
+import random
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the deployment
+    np = None
+
+NUM_PERM = 128
+
+# Buckets with more members than this (band minima on common words like
+# "the" and "and") aren't expanded into all pairs, which would make the
+# run quadratic: each member is only checked against the bucket's first
+# MAX_BUCKET_HEADS members. Identical signatures are joined before
+# banding, so exact duplicates never depend on this.
+MAX_BUCKET_SIZE = 64
+MAX_BUCKET_HEADS = 4
+
+# Tokens hashed per NumPy block when building signatures
+_SIGNATURE_BLOCK = 1 << 14
+
+_MASK64 = (1 << 64) - 1
+
+
+class TooManyEdges(ValueError):
+    """
+    A similarity graph would have more than the allowed number of edges,
+    or take more than the allowed number of candidate pairs to find.
+    """
+
+
+class UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> bool:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return False
+        # smaller root wins: components are labelled by their first member
+        if ra < rb:
+            self.parent[rb] = ra
+        else:
+            self.parent[ra] = rb
+        return True
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    inter = len(a & b)
+    return inter / (len(a) + len(b) - inter)
+
+
+@lru_cache(maxsize=64)
+def lsh_params(threshold: float, num_perm: int = NUM_PERM) -> Tuple[int, int]:
+    """
+    (bands, rows) minimising the equally weighted false-positive and
+    false-negative areas of the LSH S-curve around `threshold`.
+    """
+    def area(f, lo, hi, steps=100):
+        step = (hi - lo) / steps
+        return sum(f(lo + (i + 0.5) * step) for i in range(steps)) * step
+
+    best, best_err = (num_perm, 1), float("inf")
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        if rows < 1:
+            continue
+        prob = lambda s, b=bands, r=rows: 1.0 - (1.0 - s ** r) ** b  # noqa: E731
+        fp = area(prob, 0.0, threshold)
+        fn = area(lambda s: 1.0 - prob(s), threshold, 1.0)
+        if fp + fn < best_err:
+            best, best_err = (bands, rows), fp + fn
+    return best
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _permutations(num_perm: int) -> Tuple[List[int], List[int]]:
+    # Fixed seed: signatures (and so clusters) are reproducible run to run
+    rng = random.Random(0x5EED)
+    a = [rng.getrandbits(64) | 1 for _ in range(num_perm)]
+    b = [rng.getrandbits(64) for _ in range(num_perm)]
+    return a, b
+
+
+def _hashed(token_sets: Sequence[Set[str]]) -> List[List[int]]:
+    memo: Dict[str, int] = {}
+    out = []
+    for tokens in token_sets:
+        hs = []
+        for t in tokens:
+            h = memo.get(t)
+            if h is None:
+                h = memo[t] = _token_hash(t)
+            hs.append(h)
+        out.append(hs)
+    return out
+
+
+def signatures(token_sets: Sequence[Set[str]], num_perm: int = NUM_PERM) -> List[Optional[tuple]]:
+    """
+    MinHash signature per token set, with multiply-shift hashing
+    h(x) = ((a*x + b) mod 2^64) >> 32 as the permutations. Empty sets
+    get None. Pure Python; see signature_matrix() for the NumPy version.
+    """
+    a, b = _permutations(num_perm)
+    out: List[Optional[tuple]] = []
+    for hs in _hashed(token_sets):
+        if not hs:
+            out.append(None)
+            continue
+        out.append(tuple(
+            min(((ai * x + bi) & _MASK64) >> 32 for x in hs)
+            for ai, bi in zip(a, b)
+        ))
+    return out
+
+
+def signature_matrix(token_sets: Sequence[Set[str]], num_perm: int = NUM_PERM):
+    """
+    Same signatures as signatures(), as (doc indexes, uint64 matrix with
+    one row per non-empty token set). Requires NumPy.
+    """
+    a, b = _permutations(num_perm)
+    a_arr = np.asarray(a, dtype=np.uint64)[:, None]
+    b_arr = np.asarray(b, dtype=np.uint64)[:, None]
+    hashes = _hashed(token_sets)
+    docs = [i for i, hs in enumerate(hashes) if hs]
+    matrix = np.empty((len(docs), num_perm), dtype=np.uint64)
+
+    # Blocks of whole documents, reduced per document with minimum.reduceat
+    start = 0
+    while start < len(docs):
+        stop, size = start, 0
+        while stop < len(docs) and (stop == start or size + len(hashes[docs[stop]]) <= _SIGNATURE_BLOCK):
+            size += len(hashes[docs[stop]])
+            stop += 1
+        block = docs[start:stop]
+        flat = np.fromiter((x for i in block for x in hashes[i]), dtype=np.uint64, count=size)
+        offsets = np.cumsum([0] + [len(hashes[i]) for i in block[:-1]])
+        with np.errstate(over="ignore"):
+            permuted = (a_arr * flat[None, :] + b_arr) >> np.uint64(32)
+        matrix[start:stop] = np.minimum.reduceat(permuted, offsets, axis=1).T
+        start = stop
+    return np.asarray(docs, dtype=np.int64), matrix
+
+
+def band_buckets(sigs: Sequence[Optional[tuple]], bands: int, rows: int) -> Iterable[List[int]]:
+    """
+    Members (ascending index) of every LSH bucket with two or more
+    signatures, band by band.
+    """
+    for band in range(bands):
+        lo, hi = band * rows, band * rows + rows
+        buckets: Dict[tuple, List[int]] = {}
+        for i, sig in enumerate(sigs):
+            if sig is not None:
+                buckets.setdefault(sig[lo:hi], []).append(i)
+        for members in buckets.values():
+            if len(members) > 1:
+                yield members
+
+
+def band_buckets_matrix(docs, matrix, bands: int, rows: int) -> Iterable[List[int]]:
+    """
+    band_buckets() over signature_matrix() output: each band's rows are
+    sorted together so buckets are runs of equal keys, instead of hashing
+    a tuple per document and band.
+    """
+    if not len(docs):
+        return
+    for band in range(bands):
+        block = matrix[:, band * rows:band * rows + rows]
+        # last key is primary; position breaks ties so members stay ascending
+        order = np.lexsort((docs,) + tuple(block[:, c] for c in reversed(range(rows))))
+        ordered = block[order]
+        change = np.any(ordered[1:] != ordered[:-1], axis=1)
+        bounds = np.flatnonzero(np.concatenate(([True], change, [True])))
+        sizes = np.diff(bounds)
+        keep = sizes > 1
+        members = docs[order].tolist()
+        for lo, size in zip(bounds[:-1][keep].tolist(), sizes[keep].tolist()):
+            yield members[lo:lo + size]
+
+
+def bucket_pairs(members: List[int]) -> Iterable[Tuple[int, int]]:
+    """
+    (i, j) pairs with i < j to check in one bucket: all of them for a
+    small bucket, each member against the first MAX_BUCKET_HEADS members
+    of an oversized one.
+    """
+    heads = members if len(members) <= MAX_BUCKET_SIZE else members[:MAX_BUCKET_HEADS]
+    for x, i in enumerate(heads):
+        for j in members[x + 1:]:
+            yield i, j
+
+
+def lsh_candidates(token_sets: Sequence[Set[str]], threshold: float,
+                   num_perm: int = NUM_PERM) -> Tuple[List[Tuple[int, int]], Iterable[List[int]]]:
+    """
+    (same-signature pairs, buckets) for `threshold`. Bookmarks whose whole
+    signatures are equal come back as (first, other) pairs and only the
+    first of them is banded, so duplicates can't flood the buckets.
+    NumPy-backed when available.
+    """
+    bands, rows = lsh_params(threshold, num_perm)
+    duplicates: List[Tuple[int, int]] = []
+    if np is None:
+        sigs = signatures(token_sets, num_perm)
+        first: Dict[tuple, int] = {}
+        for i, sig in enumerate(sigs):
+            if sig is None:
+                continue
+            head = first.setdefault(sig, i)
+            if head != i:
+                duplicates.append((head, i))
+                sigs[i] = None
+        return duplicates, band_buckets(sigs, bands, rows)
+
+    docs, matrix = signature_matrix(token_sets, num_perm)
+    if not len(docs):
+        return duplicates, iter(())
+    _, first_rows, inverse = np.unique(matrix, axis=0, return_index=True, return_inverse=True)
+    heads = first_rows[inverse.reshape(-1)]
+    for row in np.flatnonzero(heads != np.arange(len(docs))).tolist():
+        duplicates.append((int(docs[heads[row]]), int(docs[row])))
+    keep = np.sort(first_rows)
+    return duplicates, band_buckets_matrix(docs[keep], matrix[keep], bands, rows)
+
+
+def cluster_minhash(token_sets: Sequence[Set[str]], threshold: float,
+                    num_perm: int = NUM_PERM) -> List[int]:
+    """
+    Component id per bookmark: the index of the component's first member.
+    Components don't depend on the order pairs are checked in, so pairs
+    already joined are skipped and dissimilar pairs are checked once.
+    """
+    n = len(token_sets)
+    uf = UnionFind(n)
+    if n < 2:
+        return [uf.find(i) for i in range(n)]
+
+    duplicates, buckets = lsh_candidates(token_sets, threshold, num_perm)
+    for i, j in duplicates:
+        if jaccard(token_sets[i], token_sets[j]) >= threshold:
+            uf.union(i, j)
+    rejected: Set[Tuple[int, int]] = set()
+    for members in buckets:
+        for i, j in bucket_pairs(members):
+            if uf.find(i) == uf.find(j) or (i, j) in rejected:
+                continue
+            if jaccard(token_sets[i], token_sets[j]) >= threshold:
+                uf.union(i, j)
+            else:
+                rejected.add((i, j))
+    return [uf.find(i) for i in range(n)]
+
+
+def candidate_edges(token_sets: Sequence[Set[str]], threshold: float,
+                    num_perm: int = NUM_PERM,
+                    max_edges: Optional[int] = None,
+                    max_candidates: Optional[int] = None) -> List[Tuple[float, int, int]]:
+    """
+    (jaccard, i, j) for every LSH candidate pair with i < j and
+    jaccard >= threshold, each pair once. Bookmarks with equal signatures
+    are linked to the first of them. Raises TooManyEdges past max_edges
+    edges, or before comparing anything if the buckets hold more than
+    max_candidates candidate pairs (repeats across bands included).
+    """
+    edges: List[Tuple[float, int, int]] = []
+    if len(token_sets) < 2:
+        return edges
+    duplicates, buckets = lsh_candidates(token_sets, threshold, num_perm)
+    if max_candidates is not None:
+        # Bucket sizes give the pair count before any pair is compared
+        buckets = list(buckets)
+        pairs = len(duplicates)
+        for members in buckets:
+            n_heads = len(members) if len(members) <= MAX_BUCKET_SIZE else MAX_BUCKET_HEADS
+            pairs += sum(len(members) - 1 - x for x in range(n_heads))
+        if pairs > max_candidates:
+            raise TooManyEdges(f"More than {max_candidates} candidate pairs at threshold {threshold}.")
+    checked: Set[Tuple[int, int]] = set(duplicates)
+    for i, j in duplicates:
+        sim = jaccard(token_sets[i], token_sets[j])
+        if sim >= threshold:
+            edges.append((sim, i, j))
+    for members in buckets:
+        for i, j in bucket_pairs(members):
+            if (i, j) in checked:
+                continue
+            checked.add((i, j))
+            sim = jaccard(token_sets[i], token_sets[j])
+            if sim >= threshold:
+                edges.append((sim, i, j))
+                if max_edges is not None and len(edges) > max_edges:
+                    raise TooManyEdges(f"More than {max_edges} similar pairs at threshold {threshold}.")
+    return edges
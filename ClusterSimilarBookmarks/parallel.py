@@ -0,0 +1,186 @@
+"""
+Sharded multi-core clustering for ClusterSimilarBookmarks ("engine": "sharded").
+
+Bookmarks are split into a fixed number of shards by domain, so pages
+from one site (the likeliest near-duplicates) are clustered together.
+Each shard is clustered with the exact greedy engine on the app's shared
+process pool (shared_code.process_pool), which also sketches each shard
+cluster's representative (its first bookmark). The merge then joins
+shard clusters whose representatives match: pool tasks, each taking a
+slice of the LSH bands, find the similar representative pairs, and a
+greedy pass over the representatives in input order puts each into the
+earliest group whose own representative it is similar to. Only that
+pass, linear in the pairs found, runs serially.
+
+The shard a bookmark lands in depends only on its URL, never on the
+number of workers, each shard and the merge are deterministic, and the
+pairs found don't depend on how the bands are split, so the output is
+the same whatever CLUSTER_WORKERS is. It differs from the
+single-pass greedy scan where a bookmark's match sits in another shard
+and the representative merge (or its LSH lookup) doesn't catch it.
+"""
+import hashlib
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+from urllib.parse import urlparse
+
+from shared_code import process_pool
+
+from .exact import cluster_exact
+from .incremental import sketches
+from .minhash import NUM_PERM, band_buckets, bucket_pairs, jaccard, lsh_params
+
+# Worker processes to spread a request over (0 = the whole shared pool)
+CLUSTER_WORKERS = int(os.environ.get("CLUSTER_WORKERS", "0"))
+
+# Logical shards; fixed so results don't depend on the worker count
+CLUSTER_SHARDS = int(os.environ.get("CLUSTER_SHARDS", "64"))
+
+# Below this many bookmarks the pool's overhead isn't worth it
+PARALLEL_MIN_ITEMS = 5000
+
+
+def worker_count() -> int:
+    return CLUSTER_WORKERS if CLUSTER_WORKERS > 0 else process_pool.pool_size()
+
+
+def shard_key(bookmark: Dict) -> str:
+    """
+    Domain without "www."; bookmarks without a usable URL are spread by
+    their text instead.
+    """
+    host = urlparse(str(bookmark.get("url") or "")).hostname or ""
+    if host.startswith("www."):
+        host = host[4:]
+    return host or "text:" + str(bookmark.get("url_content", ""))
+
+
+def shard_of(bookmark: Dict, n_shards: int) -> int:
+    digest = hashlib.blake2b(shard_key(bookmark).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % n_shards
+
+
+def _cluster_shard(job) -> Tuple[List[int], List[Optional[tuple]]]:
+    """
+    Pool task: greedy labels (local index of each cluster's first member)
+    for one shard's texts, and the MinHash sketch of each cluster's
+    representative, in label order.
+    """
+    texts, threshold, tokenize = job
+    token_sets = [tokenize(text) for text in texts]
+    labels = cluster_exact(token_sets, threshold)
+    return labels, sketches([token_sets[i] for i in sorted(set(labels))])
+
+
+def _similar_reps(job) -> List[Tuple[int, int]]:
+    """
+    Pool task: (i, j) pairs of representatives, i < j, that share a bucket
+    in this job's LSH bands and have Jaccard >= threshold. Texts are only
+    tokenized once they're in a candidate pair.
+    """
+    sigs, bands, rows, texts, threshold, tokenize = job
+    token_sets: Dict[int, Set[str]] = {}
+
+    def tokens(i: int) -> Set[str]:
+        if i not in token_sets:
+            token_sets[i] = tokenize(texts[i])
+        return token_sets[i]
+
+    checked: Set[Tuple[int, int]] = set()
+    similar: List[Tuple[int, int]] = []
+    for members in band_buckets(sigs, bands, rows):
+        for pair in bucket_pairs(members):
+            if pair not in checked:
+                checked.add(pair)
+                if jaccard(tokens(pair[0]), tokens(pair[1])) >= threshold:
+                    similar.append(pair)
+    return similar
+
+
+def _run_tasks(task: Callable, jobs: List[tuple], sizes: List[int], workers: int) -> List[Any]:
+    """
+    task(job) for every job, in job order: on the shared pool with at most
+    `workers` in flight, largest first, or inline for workers <= 1.
+    """
+    pool = process_pool.get_pool() if workers > 1 else None
+    if pool is None:
+        return [task(job) for job in jobs]
+
+    # Largest first so a big one doesn't start last; at most `workers` in
+    # flight, as the pool is shared with other requests
+    order = sorted(range(len(jobs)), key=lambda i: -sizes[i])
+    out: List[Any] = [None] * len(jobs)
+    pending: Dict[Future, int] = {}
+    try:
+        for i in order:
+            if len(pending) >= workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    out[pending.pop(future)] = future.result()
+            pending[pool.submit(task, jobs[i])] = i
+        for future, i in pending.items():
+            out[i] = future.result()
+    except (*process_pool.POOL_FAILURES, RuntimeError):
+        # A dead worker takes the whole pool with it; finish the rest here
+        process_pool.reset_pool(pool)
+    return [result if result is not None else task(job) for result, job in zip(out, jobs)]
+
+
+def cluster_sharded(bookmarks: Sequence[Dict], threshold: float,
+                    tokenize: Callable[[str], Set[str]],
+                    workers: Optional[int] = None) -> List[int]:
+    """
+    Cluster id per bookmark (index of the cluster's first bookmark).
+    `tokenize` must be a picklable module-level function.
+    """
+    if workers is None:
+        workers = worker_count()
+    if len(bookmarks) < PARALLEL_MIN_ITEMS:
+        workers = 1
+    texts = [bookmark.get("url_content", "") or "" for bookmark in bookmarks]
+
+    n_shards = max(1, CLUSTER_SHARDS)
+    members: List[List[int]] = [[] for _ in range(n_shards)]
+    for i, bookmark in enumerate(bookmarks):
+        members[shard_of(bookmark, n_shards)].append(i)
+    members = [m for m in members if m]
+    jobs = [([texts[i] for i in m], threshold, tokenize) for m in members]
+    shard_results = _run_tasks(_cluster_shard, jobs, [len(m) for m in members], workers)
+
+    # Shard-local labels -> global index of each shard cluster's first
+    # member (its representative)
+    labels: List[int] = [0] * len(bookmarks)
+    rep_sketches: Dict[int, Optional[tuple]] = {}
+    for m, (local, local_sketches) in zip(members, shard_results):
+        for i, first in zip(m, local):
+            labels[i] = m[first]
+        for first, sketch in zip(sorted(set(local)), local_sketches):
+            rep_sketches[m[first]] = sketch
+
+    # Merge, step 1: similar representative pairs that collide under LSH,
+    # the bands split between pool tasks
+    reps = sorted(rep_sketches)
+    sigs = [rep_sketches[r] for r in reps]
+    rep_texts = [texts[r] for r in reps]
+    bands, rows = lsh_params(threshold, NUM_PERM)
+    n_groups = max(1, min(bands, workers))
+    bounds = [bands * g // n_groups for g in range(n_groups + 1)]
+    jobs = [([sig[lo * rows:hi * rows] if sig is not None else None for sig in sigs],
+             hi - lo, rows, rep_texts, threshold, tokenize)
+            for lo, hi in zip(bounds, bounds[1:])]
+    earlier: Dict[int, Set[int]] = {}
+    for pairs in _run_tasks(_similar_reps, jobs, [hi - lo for lo, hi in zip(bounds, bounds[1:])], workers):
+        for i, j in pairs:
+            earlier.setdefault(j, set()).add(i)
+
+    # Step 2: greedy over representatives in input order, each joining the
+    # earliest group whose own representative it is similar to
+    leader = list(range(len(reps)))
+    for j in range(len(reps)):
+        for i in sorted(earlier.get(j, ())):
+            if leader[i] == i:
+                leader[j] = i
+                break
+    merged = {r: reps[leader[j]] for j, r in enumerate(reps)}
+    return [merged[label] for label in labels]
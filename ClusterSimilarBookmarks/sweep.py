@@ -0,0 +1,129 @@
+"""
+Threshold sweep for ClusterSimilarBookmarks ("thresholds": [...]).
+
+The similarity graph (one weighted edge per pair of bookmarks with
+Jaccard >= the smallest requested threshold) is built once. Edges are
+then added in descending weight order to a union-find, and the
+components are read off each time the sweep passes a threshold, so
+every extra granularity costs one O(n) labelling instead of a re-cluster.
+
+Groups are connected components, as with the minhash engine: at each
+threshold, two bookmarks share a group when a chain of pairs at or above
+that threshold links them.
+
+Low thresholds make the graph dense (most pairs share a common word), so
+thresholds below MIN_SWEEP_THRESHOLD are rejected and the graph is capped
+at SWEEP_MAX_EDGES edges. The work to find it is capped too, at
+SWEEP_MAX_CANDIDATES candidate pairs: low thresholds make prefixes long
+enough to hold common words, so the exact join would compare most pairs
+even when few of them are similar. Its candidate count is known from the
+prefixes before any pair is compared, so an exact join over the cap is
+skipped outright for LSH candidate edges, which stop once they have
+checked that many pairs. If LSH is over either cap too, the request is
+refused.
+"""
+import logging
+import os
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from .exact import prefix_length, token_ranks
+from .minhash import TooManyEdges, UnionFind, candidate_edges, jaccard
+
+# Thresholds accepted per request
+MAX_SWEEP_THRESHOLDS = 20
+
+# Lowest threshold accepted
+MIN_SWEEP_THRESHOLD = 0.05
+
+# Most similarity edges kept in memory for one sweep
+SWEEP_MAX_EDGES = int(os.environ.get("SWEEP_MAX_EDGES", "1000000"))
+
+# Most candidate pairs looked at while building one sweep's graph
+SWEEP_MAX_CANDIDATES = int(os.environ.get("SWEEP_MAX_CANDIDATES", "5000000"))
+
+# Slack on the length filter bounds, so float error can't drop a pair
+_EPS = 1e-9
+
+
+def exact_edges(token_sets: Sequence[Set[str]], threshold: float,
+                max_edges: Optional[int] = None,
+                max_candidates: Optional[int] = None) -> List[Tuple[float, int, int]]:
+    """
+    (jaccard, i, j) for every pair i < j with jaccard >= threshold
+    (threshold > 0), using the same rarest-first prefix filter as the
+    exact engine, with every bookmark indexed. Raises TooManyEdges past
+    max_edges, or before comparing anything if the prefixes would yield
+    more than max_candidates candidate pairs.
+    """
+    rank = token_ranks(token_sets)
+    prefixes = [sorted(tokens, key=rank.__getitem__)[:prefix_length(threshold, len(tokens))]
+                for tokens in token_sets]
+    if max_candidates is not None:
+        # Postings entries each bookmark's prefix will scan, counted
+        # without building the postings
+        indexed: Dict[str, int] = {}
+        scanned = 0
+        for prefix in prefixes:
+            for t in prefix:
+                scanned += indexed.get(t, 0)
+                indexed[t] = indexed.get(t, 0) + 1
+            if scanned > max_candidates:
+                raise TooManyEdges(f"More than {max_candidates} candidate pairs at threshold {threshold}.")
+
+    postings: Dict[str, List[int]] = {}
+    edges: List[Tuple[float, int, int]] = []
+    for j, (tokens, prefix) in enumerate(zip(token_sets, prefixes)):
+        size = len(tokens)
+        candidates: Set[int] = set()
+        for t in prefix:
+            candidates.update(postings.get(t, ()))
+        lo, hi = threshold * size - _EPS, size / threshold + _EPS
+        for i in candidates:
+            if lo <= len(token_sets[i]) <= hi:
+                sim = jaccard(tokens, token_sets[i])
+                if sim >= threshold:
+                    edges.append((sim, i, j))
+        if max_edges is not None and len(edges) > max_edges:
+            raise TooManyEdges(f"More than {max_edges} similar pairs at threshold {threshold}.")
+
+        for t in prefix:
+            postings.setdefault(t, []).append(j)
+    return edges
+
+
+def sweep(n: int, edges: List[Tuple[float, int, int]], thresholds: Sequence[float]) -> Dict[float, List[int]]:
+    """
+    Component id (index of the first member) per bookmark for each
+    threshold, from one pass over the edges in descending weight order.
+    """
+    uf = UnionFind(n)
+    ordered = sorted(edges, key=lambda e: -e[0])
+    labels: Dict[float, List[int]] = {}
+    k = 0
+    for threshold in sorted(set(thresholds), reverse=True):
+        while k < len(ordered) and ordered[k][0] >= threshold:
+            uf.union(ordered[k][1], ordered[k][2])
+            k += 1
+        labels[threshold] = [uf.find(i) for i in range(n)]
+    return labels
+
+
+def sweep_clusters(token_sets: Sequence[Set[str]], thresholds: Sequence[float],
+                   engine: str = "exact") -> Tuple[Dict[float, List[int]], str]:
+    """
+    (labels per threshold, engine used) for thresholds in
+    [MIN_SWEEP_THRESHOLD, 1]. The graph is built once, at the lowest
+    threshold, from the exact prefix-filtered join, or from LSH
+    candidates with engine="minhash" or when the exact join is over
+    SWEEP_MAX_EDGES edges or SWEEP_MAX_CANDIDATES candidates. Raises
+    TooManyEdges if LSH is over either cap as well.
+    """
+    lowest = min(thresholds)
+    if engine != "minhash":
+        try:
+            edges = exact_edges(token_sets, lowest, SWEEP_MAX_EDGES, SWEEP_MAX_CANDIDATES)
+            return sweep(len(token_sets), edges, thresholds), "exact"
+        except TooManyEdges as e:
+            logging.warning("ClusterSimilarBookmarks: exact sweep graph too large (%s), using LSH", e)
+    edges = candidate_edges(token_sets, lowest, max_edges=SWEEP_MAX_EDGES, max_candidates=SWEEP_MAX_CANDIDATES)
+    return sweep(len(token_sets), edges, thresholds), "minhash"
@@ -1,13 +1,23 @@
+import base64
 import logging
 import json
 import http.client
+import time
 import urllib.parse
-from concurrent.futures import ThreadPoolExecutor
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from threading import Lock
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import azure.functions as func
 
+from .async_engine import KEPT_HEADERS, AsyncProber, ProbeSkipped, run_async_checks
+from .circuit_breaker import DomainCircuitBreaker, is_fatal_error
+from .connection_pool import HostConnectionPool
+from .dns_resolver import DNS_STAGE_TIMEOUT, UNRESOLVABLE, resolve_hosts
+from .status_store import get_status_store
+from .tls import ResumingHTTPSConnection
+
 # --- Config -------------------------------------------------------------------
 
 # Max time we allow for a single HTTP HEAD call
@@ -36,6 +46,47 @@ logger = logging.getLogger(__name__)
 # --- Helpers ------------------------------------------------------------------
 
 
+class DeadlineReached(Exception):
+    """
+    The request's time budget ran out before this URL was probed.
+    """
+
+
+# Returned by a check that was not started because of the time budget
+DEFERRED = object()
+
+
+def encode_continuation(keys: List[str]) -> str:
+    """
+    Opaque, URL-safe token listing the normalized keys still to check.
+    """
+    raw = json.dumps({"v": 1, "keys": keys}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(zlib.compress(raw)).decode("ascii")
+
+
+def decode_continuation(token: str) -> List[str]:
+    """
+    Inverse of encode_continuation(). Raises ValueError on a bad token.
+    """
+    try:
+        raw = zlib.decompress(base64.urlsafe_b64decode(token.encode("ascii")))
+        payload = json.loads(raw.decode("utf-8"))
+        keys = payload["keys"]
+    except Exception as e:
+        raise ValueError("Invalid continuation token") from e
+    if payload.get("v") != 1 or not isinstance(keys, list):
+        raise ValueError("Invalid continuation token")
+    return [str(k) for k in keys]
+
+
+def parse_bool(value: Any, default: bool) -> bool:
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "y")
+
+
 def normalize_url(raw: str) -> str:
     """
     Normalise input URL:
@@ -62,54 +113,170 @@ def normalize_url(raw: str) -> str:
     return url
 
 
-def head_status_with_redirects(url: str,
-                               timeout: float,
-                               max_redirects: int) -> Optional[int]:
+def conditional_headers(etag: Optional[str], last_modified: Optional[str]) -> Dict[str, str]:
+    """
+    Request headers that let the server answer 304 if nothing changed.
+    """
+    headers: Dict[str, str] = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+def _head_pooled(pool: HostConnectionPool,
+                 scheme: str,
+                 host: str,
+                 path: str,
+                 headers: Dict[str, str],
+                 gate: Optional[Callable[[], bool]] = None,
+                 on_error: Optional[Callable[[Exception], None]] = None) -> Tuple[int, Dict[str, str]]:
+    """
+    HEAD `path` on a pooled keep-alive connection.
+    Returns (status, KEPT_HEADERS found). If a reused socket turns out to have
+    been closed by the server, retry once on a fresh connection.
+
+    `gate` and `on_error` run while the per-host slot is held (see
+    head_with_redirects()); a gate refusal raises ProbeSkipped, and errors
+    raised by the gate itself give the slot back too.
+    """
+    conn, reused = pool.acquire(scheme, host)
+    try:
+        if gate is not None and not gate():
+            raise ProbeSkipped(path)
+    except Exception:
+        pool.release(scheme, host, conn, reused)
+        raise
+    reusable = False
+    try:
+        while True:
+            try:
+                conn.request("HEAD", path, headers=headers)
+                resp = conn.getresponse()
+                # HEAD has no body, but the response must be drained before
+                # the connection can carry another request.
+                resp.read()
+                break
+            except (ConnectionError, http.client.HTTPException):
+                if not reused:
+                    raise
+                conn.close()
+                conn, reused = pool.new_connection(scheme, host), False
+
+        reusable = not resp.will_close
+        return resp.status, _kept_headers(resp)
+    except Exception as e:
+        if on_error is not None:
+            on_error(e)
+        raise
+    finally:
+        pool.release(scheme, host, conn, reusable)
+
+
+def _kept_headers(resp: http.client.HTTPResponse) -> Dict[str, str]:
+    kept: Dict[str, str] = {}
+    for name in KEPT_HEADERS:
+        value = resp.getheader(name)
+        if value:
+            kept[name] = value
+    return kept
+
+
+def head_with_redirects(url: str,
+                        timeout: float,
+                        max_redirects: int,
+                        pool: Optional[HostConnectionPool] = None,
+                        headers: Optional[Dict[str, str]] = None,
+                        gate: Optional[Callable[[], bool]] = None,
+                        on_error: Optional[Callable[[Exception], None]] = None) -> Tuple[Optional[int], Dict[str, str]]:
     """
     Perform a cheap HEAD request with a small number of redirects.
-    Returns the final HTTP status code, or None on error.
+    Returns (final HTTP status code or None, validators). `validators` holds
+    the ETag / Last-Modified of the response when no redirect was followed,
+    since only then do they describe `url` itself.
+
+    `headers` (e.g. conditional_headers()) are sent on the first request only.
+    With a `pool`, connections are kept alive and shared per host, so the
+    TCP/TLS handshake is paid once per host instead of once per URL.
+
+    `gate` is consulted right before the first request goes out, i.e. after
+    waiting for a pooled connection slot, so decisions such as "is this
+    domain still worth probing" see what happened while we waited. A
+    refusal raises ProbeSkipped. `on_error(exc)` is called for a failed
+    request before its slot is released (the error is still raised), so
+    the next waiter's gate already knows about the failure.
     """
     current = url
     last_status: Optional[int] = None
+    request_headers = dict(headers or {})
 
-    for _ in range(max_redirects + 1):
+    for hop in range(max_redirects + 1):
         parsed = urllib.parse.urlparse(current)
         scheme = (parsed.scheme or "https").lower()
         if scheme not in ("http", "https"):
-            return None
+            return None, {}
 
         host = parsed.netloc
         if not host:
-            return None
+            return None, {}
 
         path = parsed.path or "/"
         if parsed.query:
             path += "?" + parsed.query
 
-        conn_cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
-        conn = conn_cls(host, timeout=timeout)
-        try:
-            conn.request("HEAD", path)
-            resp = conn.getresponse()
-            status = resp.status
-            last_status = status
-
-            # Follow a few redirects, then stop
-            if status in (301, 302, 303, 307, 308):
-                location = resp.getheader("Location")
-                if not location:
-                    return status
-                current = urllib.parse.urljoin(current, location)
-                continue
-
-            return status
-        finally:
+        if pool is not None:
+            status, kept = _head_pooled(pool, scheme, host, path, request_headers, gate, on_error)
+        else:
+            if gate is not None and not gate():
+                raise ProbeSkipped(current)
+            conn_cls = ResumingHTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            conn = conn_cls(host, timeout=timeout)
             try:
-                conn.close()
-            except Exception:
-                pass
+                conn.request("HEAD", path, headers=request_headers)
+                resp = conn.getresponse()
+                status = resp.status
+                kept = _kept_headers(resp)
+                if isinstance(conn, ResumingHTTPSConnection):
+                    conn.save_session()
+            except Exception as e:
+                if on_error is not None:
+                    on_error(e)
+                raise
+            finally:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+        last_status = status
+        request_headers = {}
+        gate = None
+
+        # Follow a few redirects, then stop
+        if status in (301, 302, 303, 307, 308):
+            location = kept.get("location")
+            if not location:
+                return status, {}
+            current = urllib.parse.urljoin(current, location)
+            continue
+
+        if hop:
+            return status, {}
+        return status, {k: v for k, v in kept.items() if k != "location"}
+
+    return last_status, {}
+
 
-    return last_status
+def head_status_with_redirects(url: str,
+                               timeout: float,
+                               max_redirects: int,
+                               pool: Optional[HostConnectionPool] = None) -> Optional[int]:
+    """
+    Perform a cheap HEAD request with a small number of redirects.
+    Returns the final HTTP status code, or None on error.
+    """
+    return head_with_redirects(url, timeout, max_redirects, pool=pool)[0]
 
 
 def build_result(original_item: Any,
@@ -133,10 +300,31 @@ def build_result(original_item: Any,
     return result
 
 
+def row_for(original_item: Any,
+            raw_url_str: str,
+            base: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Result row for one input row, reusing the check of its normalized URL
+    but keeping the row's own url/title/folder.
+    """
+    if not base:
+        return build_result(original_item, raw_url_str, None, False)
+
+    row = dict(base)
+    row["url"] = raw_url_str
+
+    if isinstance(original_item, dict):
+        row["title"] = original_item.get("title", "") or ""
+        row["folder_name"] = original_item.get("folder_name", "") or ""
+
+    return row
+
+
 # --- Azure entrypoint --------------------------------------------------------
 
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
+    started = time.monotonic()
     try:
         data = req.get_json()
     except ValueError:
@@ -150,11 +338,94 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     if not isinstance(input_items, list):
         input_items = [input_items]
 
-    # Per-invocation cache of clearly unreachable domains
-    domain_failures: Dict[str, bool] = {}
-    lock = Lock()
+    # "continuation": token from a previous partial run -> only check what it lists.
+    # The bookmarks may be re-sent (to keep title/folder) or omitted.
+    pending_keys: Optional[set] = None
+    if data.get("continuation"):
+        try:
+            keys = decode_continuation(str(data["continuation"]))
+        except ValueError as e:
+            return func.HttpResponse(
+                json.dumps({"error": str(e)}),
+                mimetype="application/json",
+                status_code=400,
+            )
+        pending_keys = set(keys)
+        if not input_items:
+            input_items = keys
 
-    def process_one(item: Any) -> Optional[Dict[str, Any]]:
+    # "time_budget": seconds -> stop starting probes in time to answer before
+    # the host timeout, and hand back a continuation token for the rest.
+    deadline: Optional[float] = None
+    try:
+        time_budget = float(data.get("time_budget") or 0)
+    except (TypeError, ValueError):
+        time_budget = 0.0
+    if time_budget > 0:
+        # A probe admitted at the deadline must still finish within budget.
+        # Admission happens once the probe holds its connection slot, so
+        # time spent queueing for a slot is not part of this.
+        probe_time = PER_URL_TIMEOUT * (MAX_REDIRECTS + 1)
+        min_budget = 2 * probe_time
+        if time_budget < min_budget:
+            return func.HttpResponse(
+                json.dumps({"error": f"time_budget must be at least {min_budget:g} seconds"}),
+                mimetype="application/json",
+                status_code=400,
+            )
+        deadline = started + time_budget - probe_time
+
+    def past_deadline() -> bool:
+        return deadline is not None and time.monotonic() >= deadline
+
+    # Should the stage before probing run long, one probe still starts past
+    # the deadline, so every call makes progress and following the
+    # continuation tokens ends
+    admitted = 0
+    admitted_lock = Lock()
+
+    def budget_exhausted() -> bool:
+        return past_deadline() and admitted >= 1
+
+    def breaker_wait() -> float:
+        # How long a probe may hold off for a failing domain (see
+        # DomainCircuitBreaker.allow) without starting past the deadline
+        if deadline is None:
+            return PER_URL_TIMEOUT
+        return max(0.0, min(PER_URL_TIMEOUT, deadline - time.monotonic()))
+
+    def admit_probe() -> bool:
+        nonlocal admitted
+        with admitted_lock:
+            if budget_exhausted():
+                return False
+            admitted += 1
+            return True
+
+    # Cross-invocation status cache (opt-out with "use_cache": false)
+    store = get_status_store() if parse_bool(data.get("use_cache"), True) else None
+
+    # "stream": true -> NDJSON, one line per URL in completion order, then a summary.
+    # The v1 programming model buffers the HttpResponse body, so the client
+    # still gets every line at once when the slowest URL is done; the lines
+    # are serialized as URLs settle and result dicts aren't kept around.
+    stream = parse_bool(data.get("stream"), False)
+
+    # Probe engine: "threads" (default) or "async" for very large libraries
+    engine = str(data.get("engine") or "threads").strip().lower()
+
+    # Keep-alive connections shared by all workers of this invocation
+    pool = HostConnectionPool(timeout=PER_URL_TIMEOUT)
+
+    # Per-invocation circuit breaker so dead domains are skipped quickly
+    breaker = DomainCircuitBreaker()
+
+    def plan_one(item: Any) -> Optional[Tuple[Optional[Dict[str, Any]], str, str, str]]:
+        """
+        Decide whether an item needs a network probe.
+        Returns (early_result, url, normalized, domain); early_result is set
+        when the item can be answered without probing.
+        """
         url = item.get("url") if isinstance(item, dict) else item
         if not url:
             return None
@@ -169,103 +440,343 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
 
         # Skip non-web / malformed URLs early
         if scheme in SKIP_SCHEMES or not host:
-            return build_result(item, str(url), None, False)
+            return build_result(item, str(url), None, False), str(url), normalized, ""
+
+        return None, str(url), normalized, host.lower()
+
+    # norm_key -> (status, etag, last_modified) of the last good answer, for
+    # stale cache entries we can revalidate conditionally
+    stored_validators: Dict[str, Tuple[int, Optional[str], Optional[str]]] = {}
+
+    def probe_headers(normalized: str) -> Optional[Dict[str, str]]:
+        prior = stored_validators.get(normalized)
+        return conditional_headers(prior[1], prior[2]) if prior else None
+
+    def finish_probe(item: Any,
+                     url: str,
+                     normalized: str,
+                     status: Optional[int],
+                     validators: Dict[str, str]) -> Tuple[Dict[str, Any], bool, Dict[str, str]]:
+        """
+        Turn a probe's answer into (result_row, probed, validators). A 304 to
+        a conditional probe means "unchanged": report the stored status and
+        mark the row as revalidated.
+        """
+        prior = stored_validators.get(normalized)
+        revalidated = prior is not None and status == 304
+        if revalidated:
+            status = prior[0]
+            validators = {"etag": prior[1] or "", "last-modified": prior[2] or ""}
+
+        # "Ultra-lean" rule: only flag as expired on clear 404/410.
+        expired = bool(status in (404, 410))
+        row = build_result(item, url, status, expired)
+        if revalidated:
+            row["revalidated"] = True
+        return row, True, validators
+
+    def process_one(item: Any) -> Optional[Tuple[Dict[str, Any], bool, Dict[str, str]]]:
+        """
+        Check one item. Returns (result_row, probed, validators) where probed
+        is True only when we actually went to the network for this URL, or
+        DEFERRED if the time budget ran out first.
+        """
+        if budget_exhausted():
+            return DEFERRED
+
+        plan = plan_one(item)
+        if plan is None:
+            return None
+        early, url, normalized, domain = plan
+        if early is not None:
+            return early, False, {}
+
+        def gate() -> bool:
+            # Workers may wait a while for a pooled slot; admit the probe
+            # only then. Same for the breaker, and failures are recorded
+            # before the slot is given back: workers queued behind a
+            # hanging host must see its circuit open.
+            if not admit_probe():
+                raise DeadlineReached(url)
+            return breaker.allow(domain, wait=breaker_wait())
 
-        domain = host.lower()
+        try:
+            status, validators = head_with_redirects(
+                normalized,
+                timeout=PER_URL_TIMEOUT,
+                max_redirects=MAX_REDIRECTS,
+                pool=pool,
+                headers=probe_headers(normalized),
+                gate=gate,
+                on_error=lambda e: breaker.record_failure(domain, fatal=is_fatal_error(e)),
+            )
+            breaker.record_success(domain)
+        except DeadlineReached:
+            return DEFERRED
+        except ProbeSkipped:
+            return build_result(item, url, None, False), False, {}
+        except Exception:
+            return build_result(item, url, None, False), True, {}
+
+        return finish_probe(item, url, normalized, status, validators)
+
+    async def process_one_async(prober: AsyncProber,
+                                item: Any) -> Optional[Tuple[Dict[str, Any], bool, Dict[str, str]]]:
+        """
+        process_one() for the asyncio engine. The breaker is checked only when
+        the probe actually gets its turn, not when it is scheduled.
+        """
+        if budget_exhausted():
+            return DEFERRED
 
-        # If we already know this domain is unreachable, skip the network call
-        with lock:
-            if domain_failures.get(domain):
-                return build_result(item, str(url), None, False)
+        plan = plan_one(item)
+        if plan is None:
+            return None
+        early, url, normalized, domain = plan
+        if early is not None:
+            return early, False, {}
 
-        status: Optional[int] = None
-        expired = False
+        def gate() -> bool:
+            # Probes may wait a while for a slot; re-check the budget then
+            if not admit_probe():
+                raise DeadlineReached(url)
+            return breaker.allow(domain)
 
         try:
-            status = head_status_with_redirects(
+            status, validators = await prober.head_with_redirects(
                 normalized,
                 timeout=PER_URL_TIMEOUT,
                 max_redirects=MAX_REDIRECTS,
+                headers=probe_headers(normalized),
+                gate=gate,
             )
-            # "Ultra-lean" rule: only flag as expired on clear 404/410.
-            expired = bool(status in (404, 410))
-        except Exception:
-            # Mark domain as unreachable for the rest of this invocation
-            with lock:
-                domain_failures[domain] = True
-
-        return build_result(item, str(url), status, expired)
+            breaker.record_success(domain)
+        except DeadlineReached:
+            return DEFERRED
+        except ProbeSkipped:
+            return build_result(item, url, None, False), False, {}
+        except Exception as e:
+            breaker.record_failure(domain, fatal=is_fatal_error(e))
+            return build_result(item, url, None, False), True, {}
 
-    results: List[Dict[str, Any]] = []
+        return finish_probe(item, url, normalized, status, validators)
 
     try:
         # --- DEDUPE: check each normalized URL once per invocation --------------------
         order: List[tuple] = []          # (raw_url_str, norm_key, original_item)
         seen: Dict[str, Any] = {}        # norm_key -> representative_item
         unique_items: List[Any] = []
-        
+
         for item in input_items:
             raw_url = item.get("url") if isinstance(item, dict) else item
             if not raw_url:
                 continue
-        
+
             raw_url_str = str(raw_url)
             norm = normalize_url(raw_url_str)
             norm_key = norm or raw_url_str  # fallback
-        
+
+            if pending_keys is not None and norm_key not in pending_keys:
+                continue
+
             order.append((raw_url_str, norm_key, item))
-        
+
             if norm_key not in seen:
                 seen[norm_key] = item
                 unique_items.append(item)
-        
+
         # Run checks only on unique_items
         key_to_result: Dict[str, Dict[str, Any]] = {}
-        
-        def process_one_keyed(item: Any) -> Optional[tuple]:
-            url = item.get("url") if isinstance(item, dict) else item
-            if not url:
-                return None
-            raw_url_str = str(url)
-            norm = normalize_url(raw_url_str)
-            norm_key = norm or raw_url_str
-        
-            res = process_one(item)  # your existing logic
-            if res is None:
-                return None
-            return (norm_key, res)
-        
-        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(unique_items) or 1)) as executor:
-            futures = [executor.submit(process_one_keyed, item) for item in unique_items]
-            for fut in futures:
-                try:
-                    out = fut.result()
-                except Exception:
-                    logger.exception("Error processing URL in ExpiredLinkChecker")
-                    out = None
-                if out:
-                    k, r = out
-                    key_to_result[k] = r
-        
-        # Rebuild full results list in original order, preserving title/folder per row
-        for raw_url_str, norm_key, original_item in order:
-            base = key_to_result.get(norm_key)
-            if not base:
-                results.append(build_result(original_item, raw_url_str, None, False))
-                continue
-        
-            row = dict(base)
-            row["url"] = raw_url_str
-        
-            if isinstance(original_item, dict):
-                row["title"] = original_item.get("title", "") or ""
-                row["folder_name"] = original_item.get("folder_name", "") or ""
-        
-            results.append(row)
+        probed: List[Tuple[str, Optional[int], bool, Optional[str], Optional[str]]] = []
+
+        # NDJSON mode: one line per input row as soon as its URL is settled;
+        # only the serialized lines are kept, not key_to_result
+        stream_lines: List[str] = []
+        key_to_indices: Dict[str, List[int]] = {}
+        if stream:
+            for idx, (_, norm_key, _) in enumerate(order):
+                key_to_indices.setdefault(norm_key, []).append(idx)
+
+        def emit(norm_key: str, res: Optional[Dict[str, Any]] = None) -> None:
+            for idx in key_to_indices.pop(norm_key, ()):
+                raw_url_str, _, original_item = order[idx]
+                row = {"index": idx}
+                row.update(row_for(original_item, raw_url_str, res))
+                stream_lines.append(json.dumps(row, ensure_ascii=False))
+
+        revalidated = 0
+
+        def settle(norm_key: str, res: Dict[str, Any], was_probed: bool,
+                   validators: Optional[Dict[str, str]] = None) -> None:
+            nonlocal revalidated
+            if not stream:
+                key_to_result[norm_key] = res
+            if was_probed:
+                validators = validators or {}
+                probed.append((
+                    norm_key,
+                    res["status_code"],
+                    res["expired_link"],
+                    validators.get("etag") or None,
+                    validators.get("last-modified") or None,
+                ))
+            if res.get("revalidated"):
+                revalidated += 1
+            if stream:
+                emit(norm_key, res)
+
+        unique_keys: List[str] = list(seen.keys())  # parallel to unique_items
+
+        # Answer fresh entries from the status cache without touching the network
+        cache_hits = 0
+        if store is not None and unique_items:
+            cached = store.get_many(unique_keys)
+            to_probe: List[Any] = []
+            to_probe_keys: List[str] = []
+            for key, item in zip(unique_keys, unique_items):
+                if key in cached:
+                    status, expired = cached[key]
+                    url = item.get("url") if isinstance(item, dict) else item
+                    settle(key, build_result(item, str(url), status, expired), False)
+                    cache_hits += 1
+                else:
+                    to_probe.append(item)
+                    to_probe_keys.append(key)
+            unique_items, unique_keys = to_probe, to_probe_keys
+
+            # Stale entries with validators are re-checked conditionally
+            stored_validators.update(store.get_validators(unique_keys))
+
+        cache_misses = len(unique_items)
+
+        # --- DNS: resolve each unique host once, before probing ---------------------
+        hostnames: Dict[str, str] = {}   # norm_key -> hostname
+        for key in unique_keys:
+            parsed = urllib.parse.urlparse(key)
+            if (parsed.scheme or "").lower() in ("http", "https") and parsed.hostname:
+                hostnames[key] = parsed.hostname
+
+        # Under a time budget the DNS stage may use at most half of what is
+        # left before the deadline, so probing still gets its turn
+        dns_timeout = DNS_STAGE_TIMEOUT
+        if deadline is not None:
+            dns_timeout = max(0.0, min(dns_timeout, (deadline - time.monotonic()) / 2))
+        addresses, dns_cache_hits = (
+            resolve_hosts(hostnames.values(), stage_timeout=dns_timeout) if hostnames else ({}, 0)
+        )
+        pool.addresses = addresses
+
+        # Hosts that don't exist are answered right away: one lookup, no probes
+        unresolvable = 0
+        if any(addr == UNRESOLVABLE for addr in addresses.values()):
+            to_probe, to_probe_keys = [], []
+            for key, item in zip(unique_keys, unique_items):
+                if addresses.get(hostnames.get(key, "")) == UNRESOLVABLE:
+                    url = item.get("url") if isinstance(item, dict) else item
+                    settle(key, build_result(item, str(url), None, False), True)
+                    unresolvable += 1
+                else:
+                    to_probe.append(item)
+                    to_probe_keys.append(key)
+            unique_items, unique_keys = to_probe, to_probe_keys
+
+        deferred: List[str] = []
+
+        def on_outcome(norm_key: str, out: Any) -> None:
+            if out is DEFERRED:
+                deferred.append(norm_key)
+                key_to_indices.pop(norm_key, None)
+                return
+            if isinstance(out, Exception):
+                logger.error("Error processing URL in ExpiredLinkChecker", exc_info=out)
+                return
+            if out:
+                settle(norm_key, *out)
+
+        prober = AsyncProber(addresses=addresses) if engine == "async" else None
+        if prober is not None:
+            run_async_checks(
+                unique_items,
+                process_one_async,
+                on_result=lambda i, out: on_outcome(unique_keys[i], out),
+                prober=prober,
+            )
+        else:
+            try:
+                with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(unique_items) or 1)) as executor:
+                    futures = {
+                        executor.submit(process_one, item): key
+                        for key, item in zip(unique_keys, unique_items)
+                    }
+                    for fut in as_completed(futures):
+                        try:
+                            out = fut.result()
+                        except Exception as e:
+                            out = e
+                        on_outcome(futures[fut], out)
+            finally:
+                pool.close_all()
+
+        if store is not None:
+            try:
+                store.put_many(probed)
+            except Exception:
+                logger.warning("ExpiredLinkChecker: could not update status cache", exc_info=True)
+
+        # Keep the token's key order stable: original request order
+        deferred_set = set(deferred)
+        deferred_keys = [k for k in seen if k in deferred_set]
+
+        stats = {
+            "complete": not deferred_keys,
+            "continuation": encode_continuation(deferred_keys) if deferred_keys else None,
+            "remaining": len(deferred_keys),
+            "cache": {
+                "enabled": store is not None,
+                "hits": cache_hits,
+                "misses": cache_misses,
+                "revalidated": revalidated,
+            },
+            "dns": {
+                "hosts": len(set(hostnames.values())),
+                "cache_hits": dns_cache_hits,
+                "unresolvable_urls": unresolvable,
+            },
+            "tls": {
+                "full_handshakes": pool.tls_full + (prober.tls_full if prober else 0),
+                "resumed_handshakes": pool.tls_resumed,
+            },
+            "circuit_breaker": {
+                "skipped": breaker.skipped,
+                "open_domains": breaker.open_domains(),
+            },
+        }
+
+        if stream:
+            # Rows whose check failed outright still get their line
+            for norm_key in list(key_to_indices):
+                emit(norm_key)
+            summary = {"summary": True, "total": len(order)}
+            summary.update(stats)
+            stream_lines.append(json.dumps(summary, ensure_ascii=False))
+            return func.HttpResponse(
+                "\n".join(stream_lines) + "\n",
+                mimetype="application/x-ndjson",
+                status_code=200,
+            )
 
+        # Rebuild full results list in original order, preserving title/folder per row.
+        # Rows left for a continuation call are omitted rather than reported as unknown.
+        results: List[Dict[str, Any]] = [
+            row_for(original_item, raw_url_str, key_to_result.get(norm_key))
+            for raw_url_str, norm_key, original_item in order
+            if norm_key not in deferred_set
+        ]
 
+        body: Dict[str, Any] = {"results": results}
+        body.update(stats)
         return func.HttpResponse(
-            json.dumps({"results": results}, ensure_ascii=False),
+            json.dumps(body, ensure_ascii=False),
             mimetype="application/json",
             status_code=200,
         )
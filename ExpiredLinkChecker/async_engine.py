@@ -0,0 +1,290 @@
+import asyncio
+import time
+import urllib.parse
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .connection_pool import POOL_IDLE_TIMEOUT
+from .tls import shared_ssl_context
+
+# --- Config -------------------------------------------------------------------
+
+# Response headers a probe keeps: redirect target and cache validators
+KEPT_HEADERS = ("location", "etag", "last-modified")
+
+# Max HEAD requests in flight at once across all hosts
+ASYNC_MAX_IN_FLIGHT = 300
+
+# Max HEAD requests in flight to any single host
+ASYNC_MAX_PER_HOST = 6
+
+
+class ProbeSkipped(Exception):
+    """
+    Raised when a probe's gate refuses it once it reaches the front of the
+    queue (e.g. the domain's circuit opened while it was waiting).
+    """
+
+
+class AsyncProber:
+    """
+    Single-threaded HEAD prober built on asyncio streams.
+
+    Keeps up to `max_in_flight` probes running at once, but never more than
+    `max_per_host` against the same host. Connections are kept alive and
+    reused per host (like HostConnectionPool), so a host's handshake is paid
+    once per slot rather than once per URL. Hosts found in `addresses`
+    connect to their pre-resolved addresses, tried in order. All use must happen on one event
+    loop (see run_async_checks), which must call aclose() before it ends.
+    """
+
+    def __init__(self,
+                 max_in_flight: int = ASYNC_MAX_IN_FLIGHT,
+                 max_per_host: int = ASYNC_MAX_PER_HOST,
+                 addresses: Optional[Dict[str, Tuple[str, ...]]] = None,
+                 idle_timeout: float = POOL_IDLE_TIMEOUT):
+        self._addresses = addresses or {}
+        self._global = asyncio.Semaphore(max_in_flight)
+        self._max_per_host = max_per_host
+        self._per_host: Dict[str, asyncio.Semaphore] = {}
+        self._idle_timeout = idle_timeout
+        # (scheme, netloc) -> idle (reader, writer, last_used); never more
+        # than max_per_host per host, since only slot holders add to it
+        self._idle: Dict[Tuple[str, str], List[Tuple[asyncio.StreamReader, asyncio.StreamWriter, float]]] = {}
+        # asyncio can't offer a saved TLS session when connecting, so this
+        # engine only shares the context; keep-alive avoids most handshakes
+        self._ssl_context = shared_ssl_context()
+        self.created = 0
+        self.reused = 0
+        self.tls_full = 0
+
+    def _host_slot(self, host: str) -> asyncio.Semaphore:
+        sem = self._per_host.get(host)
+        if sem is None:
+            sem = asyncio.Semaphore(self._max_per_host)
+            self._per_host[host] = sem
+        return sem
+
+    def _take_idle(self, key: Tuple[str, str]) -> Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]:
+        idle = self._idle.get(key)
+        now = time.monotonic()
+        while idle:
+            reader, writer, last_used = idle.pop()
+            if now - last_used > self._idle_timeout or reader.at_eof() or writer.is_closing():
+                writer.close()
+                continue
+            self.reused += 1
+            return reader, writer
+        return None
+
+    async def _connect(self, hostname: str, port: int,
+                       use_tls: bool) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        # Like socket.create_connection(), try every address before giving up
+        err: Optional[OSError] = None
+        for target in self._addresses.get(hostname) or (hostname,):
+            try:
+                reader, writer = await asyncio.open_connection(
+                    target,
+                    port,
+                    ssl=self._ssl_context if use_tls else None,
+                    server_hostname=hostname if use_tls else None,
+                )
+                break
+            except OSError as e:
+                err = e
+        else:
+            raise err or OSError(f"no addresses for {hostname}")
+        self.created += 1
+        if use_tls:
+            self.tls_full += 1
+        return reader, writer
+
+    async def _head_once(self, parsed: urllib.parse.ParseResult,
+                         scheme: str,
+                         headers: Dict[str, str]) -> Tuple[int, Dict[str, str]]:
+        hostname = parsed.hostname or ""
+        port = parsed.port or (443 if scheme == "https" else 80)
+        host_header = parsed.netloc.rsplit("@", 1)[-1]
+
+        path = parsed.path or "/"
+        if parsed.query:
+            path += "?" + parsed.query
+
+        request = (
+            f"HEAD {path} HTTP/1.1\r\n"
+            f"Host: {host_header}\r\n"
+            "Accept-Encoding: identity\r\n"
+            + "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+            + "\r\n"
+        ).encode("latin-1")
+
+        key = (scheme, parsed.netloc.lower())
+        conn = self._take_idle(key)
+        reused = conn is not None
+        while True:
+            if conn is None:
+                conn = await self._connect(hostname, port, scheme == "https")
+            reader, writer = conn
+            try:
+                status, kept, keep_alive = await _exchange(reader, writer, request)
+                break
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                # A reused socket may have been closed by the server while
+                # idle: retry once on a fresh connection
+                if not reused:
+                    raise
+                conn, reused = None, False
+            except BaseException:
+                # Timeouts cancel us mid-response; the socket can't be reused
+                writer.close()
+                raise
+
+        if keep_alive:
+            self._idle.setdefault(key, []).append((reader, writer, time.monotonic()))
+        else:
+            writer.close()
+        return status, kept
+
+    async def aclose(self) -> None:
+        idle, self._idle = self._idle, {}
+        writers = [writer for conns in idle.values() for _, writer, _ in conns]
+        for writer in writers:
+            writer.close()
+        for writer in writers:
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def head_with_redirects(self, url: str,
+                                  timeout: float,
+                                  max_redirects: int,
+                                  headers: Optional[Dict[str, str]] = None,
+                                  gate: Optional[Callable[[], bool]] = None) -> Tuple[Optional[int], Dict[str, str]]:
+        """
+        Async counterpart of head_with_redirects(): (final status code or
+        None for non-web URLs, validators), and raises on network
+        errors/timeouts.
+
+        `gate` is consulted once the first request holds its concurrency
+        slots; hundreds of probes are queued at once, so decisions such as
+        "is this domain still worth probing" must be made at that point
+        rather than when the probe was scheduled. A refusal raises
+        ProbeSkipped.
+        """
+        current = url
+        last_status: Optional[int] = None
+        request_headers = dict(headers or {})
+
+        for hop in range(max_redirects + 1):
+            parsed = urllib.parse.urlparse(current)
+            scheme = (parsed.scheme or "https").lower()
+            if scheme not in ("http", "https"):
+                return None, {}
+            if not parsed.netloc:
+                return None, {}
+
+            async with self._global, self._host_slot(parsed.netloc.lower()):
+                if gate is not None:
+                    if not gate():
+                        raise ProbeSkipped(current)
+                    gate = None
+                status, kept = await asyncio.wait_for(
+                    self._head_once(parsed, scheme, request_headers), timeout
+                )
+            last_status = status
+            request_headers = {}
+
+            if status in (301, 302, 303, 307, 308):
+                location = kept.get("location")
+                if not location:
+                    return status, {}
+                current = urllib.parse.urljoin(current, location)
+                continue
+
+            if hop:
+                return status, {}
+            return status, {k: v for k, v in kept.items() if k != "location"}
+
+        return last_status, {}
+
+
+def run_async_checks(items: List[Any],
+                     check_one: Callable[[AsyncProber, Any], Awaitable[Any]],
+                     addresses: Optional[Dict[str, Tuple[str, ...]]] = None,
+                     on_result: Optional[Callable[[int, Any], None]] = None,
+                     prober: Optional[AsyncProber] = None) -> List[Any]:
+    """
+    Run `check_one(prober, item)` for every item on one event loop and return
+    the outcomes in input order. An exception from one item is returned in its
+    slot instead of cancelling the rest.
+
+    `on_result(index, outcome)` is called as each item finishes, in
+    completion order. Pass a `prober` (created with no running loop is
+    fine) to read its counters afterwards.
+    """
+    async def _one(prober: AsyncProber, index: int, item: Any) -> Any:
+        try:
+            outcome = await check_one(prober, item)
+        except Exception as e:
+            outcome = e
+        if on_result is not None:
+            on_result(index, outcome)
+        return outcome
+
+    if prober is None:
+        prober = AsyncProber(addresses=addresses)
+
+    async def _run() -> List[Any]:
+        try:
+            return await asyncio.gather(
+                *(_one(prober, i, item) for i, item in enumerate(items))
+            )
+        finally:
+            await prober.aclose()
+
+    if not items:
+        return []
+    return asyncio.run(_run())
+
+
+async def _exchange(reader: asyncio.StreamReader,
+                    writer: asyncio.StreamWriter,
+                    request: bytes) -> Tuple[int, Dict[str, str], bool]:
+    """
+    Send one HEAD request and read its response head.
+    Returns (status, KEPT_HEADERS found, connection can be reused).
+    """
+    writer.write(request)
+    await writer.drain()
+
+    status_line = (await reader.readline()).decode("latin-1").strip()
+    if not status_line:
+        raise ConnectionError("Connection closed before a response")
+    parts = status_line.split(None, 2)
+    if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+        raise ConnectionError(f"Bad status line: {status_line[:80]!r}")
+    status = int(parts[1])
+
+    kept: Dict[str, str] = {}
+    connection_tokens: List[str] = []
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed in response headers")
+        if line in (b"\r\n", b"\n"):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.strip().lower()
+        if name in KEPT_HEADERS and value.strip():
+            kept[name] = value.strip()
+        elif name == "connection":
+            connection_tokens += [t.strip().lower() for t in value.split(",")]
+
+    # HEAD responses have no body, so the socket is ready for the next
+    # request as soon as the headers are read
+    if parts[0] == "HTTP/1.0":
+        keep_alive = "keep-alive" in connection_tokens
+    else:
+        keep_alive = "close" not in connection_tokens
+    return status, kept, keep_alive
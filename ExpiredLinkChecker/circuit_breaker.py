@@ -0,0 +1,150 @@
+import socket
+import time
+from threading import Condition
+from typing import Dict, Optional
+
+# --- Config -------------------------------------------------------------------
+
+# Consecutive failures before a domain's circuit opens
+BREAKER_FAILURE_THRESHOLD = 3
+
+# How long an open circuit skips a domain before allowing a trial probe.
+# Doubles every time a trial fails, up to the max.
+BREAKER_BASE_COOLDOWN = 2.0   # seconds
+BREAKER_MAX_COOLDOWN = 60.0   # seconds
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def is_fatal_error(exc: BaseException) -> bool:
+    """
+    Errors that say the host is dead rather than slow: DNS failures and
+    refused connections. These open the circuit straight away.
+    """
+    return isinstance(exc, (socket.gaierror, ConnectionRefusedError))
+
+
+class _DomainState:
+    __slots__ = ("state", "failures", "cooldown", "open_until", "trial_in_flight", "in_flight")
+
+    def __init__(self, cooldown: float):
+        self.state = CLOSED
+        self.failures = 0
+        self.cooldown = cooldown
+        self.open_until = 0.0
+        self.trial_in_flight = False
+        self.in_flight = 0
+
+
+class DomainCircuitBreaker:
+    """
+    Per-domain circuit breaker for one link-check run.
+
+    closed    -> probes go through; consecutive failures are counted and the
+                 circuit opens at the threshold (or at once on a fatal error).
+    open      -> probes are skipped until the cooldown expires.
+    half_open -> exactly one trial probe is let through. Success closes the
+                 circuit; failure re-opens it with a doubled cooldown.
+
+    Every probe allowed through must report its outcome, so the breaker
+    knows how many are in flight per domain. Thread-safe, and cheap enough
+    to call from the event loop as well.
+    """
+
+    def __init__(self,
+                 failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 base_cooldown: float = BREAKER_BASE_COOLDOWN,
+                 max_cooldown: float = BREAKER_MAX_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = Condition()
+        self._domains: Dict[str, _DomainState] = {}
+        self.skipped = 0
+
+    def _get(self, domain: str) -> _DomainState:
+        st = self._domains.get(domain)
+        if st is None:
+            st = _DomainState(self.base_cooldown)
+            self._domains[domain] = st
+        return st
+
+    def allow(self, domain: str, now: Optional[float] = None, wait: float = 0.0) -> bool:
+        """
+        Should we probe this domain now? A True answer must be followed by
+        record_success() or record_failure(); from a half-open circuit it
+        also reserves the trial.
+
+        With `wait`, a caller arriving while the domain has failures and
+        other probes still in flight holds off (up to `wait` seconds) until
+        those settle. A hanging host times out all its concurrent probes at
+        about the same moment, and a probe let in between the first and the
+        threshold-th timeout would hang as well.
+        """
+        with self._lock:
+            st = self._get(domain)
+            if wait > 0 and st.state == CLOSED and st.failures and st.in_flight:
+                until = time.monotonic() + wait
+                while st.state == CLOSED and st.failures and st.in_flight:
+                    remaining = until - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._lock.wait(remaining)
+
+            now = time.monotonic() if now is None else now
+            if st.state == OPEN and now >= st.open_until:
+                st.state = HALF_OPEN
+                st.trial_in_flight = False
+            if st.state == CLOSED:
+                st.in_flight += 1
+                return True
+            if st.state == HALF_OPEN and not st.trial_in_flight:
+                st.trial_in_flight = True
+                st.in_flight += 1
+                return True
+            self.skipped += 1
+            return False
+
+    def _settled(self, st: _DomainState) -> None:
+        st.in_flight = max(0, st.in_flight - 1)
+        self._lock.notify_all()
+
+    def record_success(self, domain: str) -> None:
+        with self._lock:
+            st = self._get(domain)
+            self._settled(st)
+            st.state = CLOSED
+            st.failures = 0
+            st.cooldown = self.base_cooldown
+            st.trial_in_flight = False
+
+    def record_failure(self, domain: str, fatal: bool = False,
+                       now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            st = self._get(domain)
+            self._settled(st)
+            if st.state == HALF_OPEN:
+                # Trial failed: back off harder before the next one
+                st.cooldown = min(self.max_cooldown, st.cooldown * 2)
+                self._open(st, now)
+                return
+            if st.state == OPEN:
+                # Late result from a probe started before the circuit opened
+                return
+
+            st.failures += 1
+            if fatal or st.failures >= self.failure_threshold:
+                self._open(st, now)
+
+    @staticmethod
+    def _open(st: _DomainState, now: float) -> None:
+        st.state = OPEN
+        st.open_until = now + st.cooldown
+        st.trial_in_flight = False
+
+    def open_domains(self) -> int:
+        with self._lock:
+            return sum(1 for st in self._domains.values() if st.state != CLOSED)
@@ -0,0 +1,137 @@
+import http.client
+import time
+from threading import BoundedSemaphore, Lock
+from typing import Dict, List, Optional, Tuple
+
+from .dns_resolver import pin_address
+from .tls import ResumingHTTPSConnection
+
+# --- Config -------------------------------------------------------------------
+
+# Max open connections we keep to any single host
+MAX_CONNECTIONS_PER_HOST = 6
+
+# Idle connections older than this are closed instead of reused; most servers
+# drop keep-alive sockets after 5-15s anyway.
+POOL_IDLE_TIMEOUT = 10.0  # seconds
+
+HostKey = Tuple[str, str]  # (scheme, netloc)
+
+
+class HostConnectionPool:
+    """
+    Per-host pool of keep-alive HTTP(S) connections shared by the worker
+    threads of one link-check run.
+
+    - At most `max_per_host` connections per host are open at once; extra
+      workers wait for one to be released.
+    - Idle connections are evicted after `idle_timeout` seconds.
+    - Callers report whether a connection is still usable on release; broken
+      ones are closed and the slot is freed.
+    """
+
+    def __init__(self,
+                 timeout: float,
+                 max_per_host: int = MAX_CONNECTIONS_PER_HOST,
+                 idle_timeout: float = POOL_IDLE_TIMEOUT):
+        self.timeout = timeout
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+
+        self._lock = Lock()
+        self._idle: Dict[HostKey, List[Tuple[http.client.HTTPConnection, float]]] = {}
+        self._slots: Dict[HostKey, BoundedSemaphore] = {}
+
+        # hostname -> pre-resolved addresses, filled in by the DNS stage
+        self.addresses: Optional[Dict[str, Tuple[str, ...]]] = None
+
+        self.created = 0
+        self.reused = 0
+        self.tls_full = 0
+        self.tls_resumed = 0
+
+    def _slot(self, key: HostKey) -> BoundedSemaphore:
+        with self._lock:
+            sem = self._slots.get(key)
+            if sem is None:
+                sem = BoundedSemaphore(self.max_per_host)
+                self._slots[key] = sem
+            return sem
+
+    def _count_handshake(self, resumed: bool) -> None:
+        with self._lock:
+            if resumed:
+                self.tls_resumed += 1
+            else:
+                self.tls_full += 1
+
+    def new_connection(self, scheme: str, host: str) -> http.client.HTTPConnection:
+        with self._lock:
+            self.created += 1
+        if scheme == "https":
+            conn = ResumingHTTPSConnection(host, timeout=self.timeout,
+                                           on_handshake=self._count_handshake)
+        else:
+            conn = http.client.HTTPConnection(host, timeout=self.timeout)
+        pin_address(conn, self.addresses)
+        return conn
+
+    def acquire(self, scheme: str, host: str) -> Tuple[http.client.HTTPConnection, bool]:
+        """
+        Take a connection for (scheme, host). Returns (conn, reused); reused
+        connections may have been closed by the server in the meantime, so
+        callers should retry once on a fresh connection if they fail.
+        """
+        key = (scheme, host)
+        self._slot(key).acquire()
+
+        now = time.monotonic()
+        stale: List[http.client.HTTPConnection] = []
+        conn = None
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                candidate, last_used = idle.pop()
+                if now - last_used > self.idle_timeout:
+                    stale.append(candidate)
+                    continue
+                conn = candidate
+                self.reused += 1
+                break
+
+        for old in stale:
+            _close_quietly(old)
+
+        if conn is not None:
+            return conn, True
+        try:
+            return self.new_connection(scheme, host), False
+        except Exception:
+            self._slot(key).release()
+            raise
+
+    def release(self, scheme: str, host: str,
+                conn: http.client.HTTPConnection, reusable: bool) -> None:
+        key = (scheme, host)
+        if isinstance(conn, ResumingHTTPSConnection):
+            conn.save_session()
+        if reusable:
+            with self._lock:
+                self._idle.setdefault(key, []).append((conn, time.monotonic()))
+        else:
+            _close_quietly(conn)
+        self._slot(key).release()
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn, _ in conns:
+                _close_quietly(conn)
+
+
+def _close_quietly(conn: http.client.HTTPConnection) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
@@ -0,0 +1,135 @@
+import logging
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import Lock
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+# --- Config -------------------------------------------------------------------
+
+# Parallel lookups during the pre-resolution stage
+DNS_MAX_WORKERS = 16
+
+# Wall-clock budget for the whole pre-resolution stage. Hosts still pending
+# afterwards are left to the normal per-connection lookup.
+DNS_STAGE_TIMEOUT = 2.0  # seconds
+
+# getaddrinfo() doesn't expose record TTLs, so cache for a fixed time
+DNS_POSITIVE_TTL = 300.0  # seconds
+DNS_NEGATIVE_TTL = 60.0   # seconds
+
+# Marker for hosts that definitely don't resolve (NXDOMAIN etc.): no addresses
+UNRESOLVABLE: Tuple[str, ...] = ()
+
+# getaddrinfo errors meaning "this name does not exist", as opposed to
+# transient resolver trouble (EAI_AGAIN) we shouldn't cache
+_NXDOMAIN_ERRNOS = {
+    code for code in (
+        getattr(socket, "EAI_NONAME", None),
+        getattr(socket, "EAI_NODATA", None),
+    ) if code is not None
+}
+
+logger = logging.getLogger(__name__)
+
+# hostname -> (addresses or UNRESOLVABLE, expires_at); shared across invocations
+_dns_cache: Dict[str, Tuple[Tuple[str, ...], float]] = {}
+_dns_lock = Lock()
+
+
+def _lookup(hostname: str) -> Tuple[str, ...]:
+    """
+    Every address of `hostname`, in getaddrinfo() order (which already
+    prefers the addresses this machine can route), without duplicates.
+    """
+    try:
+        infos = socket.getaddrinfo(hostname, None, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        if e.errno in _NXDOMAIN_ERRNOS:
+            return UNRESOLVABLE
+        raise
+    return tuple(dict.fromkeys(info[4][0] for info in infos))
+
+
+def resolve_hosts(hostnames: Iterable[str],
+                  max_workers: int = DNS_MAX_WORKERS,
+                  stage_timeout: float = DNS_STAGE_TIMEOUT) -> Tuple[Dict[str, Tuple[str, ...]], int]:
+    """
+    Resolve many hostnames concurrently, using the in-process TTL cache.
+
+    Returns ({hostname: addresses or UNRESOLVABLE}, cache_hits). Hostnames
+    whose lookup failed for a transient reason or didn't finish in time are
+    left out, so callers fall back to resolving them at connect time.
+    """
+    now = time.monotonic()
+    resolved: Dict[str, Tuple[str, ...]] = {}
+    pending = []
+
+    with _dns_lock:
+        for hostname in set(hostnames):
+            entry = _dns_cache.get(hostname)
+            if entry and entry[1] > now:
+                resolved[hostname] = entry[0]
+            else:
+                pending.append(hostname)
+    cache_hits = len(resolved)
+
+    if not pending:
+        return resolved, cache_hits
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(pending)))
+    try:
+        futures = {executor.submit(_lookup, h): h for h in pending}
+        done, _ = wait(futures, timeout=stage_timeout)
+        now = time.monotonic()
+        with _dns_lock:
+            for fut in done:
+                hostname = futures[fut]
+                try:
+                    found = fut.result()
+                except Exception:
+                    logger.debug("DNS lookup failed for %s", hostname, exc_info=True)
+                    continue
+                ttl = DNS_NEGATIVE_TTL if found == UNRESOLVABLE else DNS_POSITIVE_TTL
+                _dns_cache[hostname] = (found, now + ttl)
+                resolved[hostname] = found
+    finally:
+        # Don't block on stragglers; they finish in the background
+        executor.shutdown(wait=False)
+
+    return resolved, cache_hits
+
+
+def connect_in_order(ips: Sequence[str], port: int, *args, **kwargs) -> socket.socket:
+    """
+    socket.create_connection() over pre-resolved addresses: try each one in
+    order and return the first socket that connects, else raise the last
+    error (e.g. an IPv6-first host seen from a machine with no v6 route).
+    """
+    err: Optional[OSError] = None
+    for ip in ips:
+        try:
+            return socket.create_connection((ip, port), *args, **kwargs)
+        except OSError as e:
+            err = e
+    if err is None:
+        raise OSError("no addresses to connect to")
+    raise err
+
+
+def pin_address(conn, addresses: Optional[Dict[str, Tuple[str, ...]]]) -> None:
+    """
+    Make an http.client connection connect to its pre-resolved addresses.
+    Only the TCP connect target changes: the Host header, TLS SNI and
+    certificate checks still use the real hostname.
+    """
+    if not addresses:
+        return
+    ips = addresses.get((conn.host or "").lower())
+    if not ips:
+        return
+
+    def _create_connection(addr, *args, **kwargs):
+        return connect_in_order(ips, addr[1], *args, **kwargs)
+
+    conn._create_connection = _create_connection
@@ -0,0 +1,182 @@
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# --- Config -------------------------------------------------------------------
+
+# Where the cross-invocation status cache lives. The Functions sandbox only
+# guarantees a writable temp dir, so that is the default.
+STATUS_DB_PATH = os.environ.get(
+    "LINK_STATUS_DB_PATH",
+    os.path.join(tempfile.gettempdir(), "bookmarkgenie_link_status.sqlite3"),
+)
+
+# How long a stored result is trusted before we probe again
+HEALTHY_TTL = 7 * 24 * 3600   # 2xx/3xx/4xx other than 404/410
+EXPIRED_TTL = 24 * 3600       # 404/410
+ERROR_TTL = 3600              # no status / 5xx
+
+# SQLite's default host-parameter limit is 999; stay well below it
+_LOOKUP_CHUNK = 500
+
+logger = logging.getLogger(__name__)
+
+
+def classify_status(status: Optional[int], expired: bool) -> str:
+    """
+    Bucket a probe outcome so each bucket can have its own TTL.
+    """
+    if expired:
+        return "expired"
+    if status is None or status >= 500:
+        return "error"
+    return "healthy"
+
+
+def ttl_for(outcome: str) -> float:
+    if outcome == "expired":
+        return EXPIRED_TTL
+    if outcome == "error":
+        return ERROR_TTL
+    return HEALTHY_TTL
+
+
+class LinkStatusStore:
+    """
+    Small SQLite-backed cache of link check results, keyed by the
+    normalize_url() key. Safe to share across threads; all access is
+    serialised by a lock.
+    """
+
+    def __init__(self, path: str = STATUS_DB_PATH):
+        self.path = path
+        self._lock = Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS link_status (
+                url_key    TEXT PRIMARY KEY,
+                status     INTEGER,
+                expired    INTEGER NOT NULL,
+                outcome    TEXT NOT NULL,
+                checked_at REAL NOT NULL
+            )
+            """
+        )
+        # Validators for conditional revalidation (added after the first
+        # release), and the status they were served with
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(link_status)")}
+        for column, sql_type in (("etag", "TEXT"), ("last_modified", "TEXT"), ("validated_status", "INTEGER")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE link_status ADD COLUMN {column} {sql_type}")
+        self._conn.commit()
+
+    def _select(self, keys: List[str], columns: str) -> List[Tuple[Any, ...]]:
+        rows: List[Tuple[Any, ...]] = []
+        for i in range(0, len(keys), _LOOKUP_CHUNK):
+            chunk = keys[i:i + _LOOKUP_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows.extend(self._conn.execute(
+                f"SELECT {columns} FROM link_status WHERE url_key IN ({placeholders})",
+                chunk,
+            ).fetchall())
+        return rows
+
+    def get_many(self, keys: Iterable[str],
+                 now: Optional[float] = None) -> Dict[str, Tuple[Optional[int], bool]]:
+        """
+        Return {key: (status, expired)} for every key with a fresh entry.
+        Stale or missing keys are simply absent from the result.
+        """
+        now = time.time() if now is None else now
+        keys = list(keys)
+        fresh: Dict[str, Tuple[Optional[int], bool]] = {}
+
+        with self._lock:
+            rows = self._select(keys, "url_key, status, expired, outcome, checked_at")
+
+        for url_key, status, expired, outcome, checked_at in rows:
+            if now - checked_at <= ttl_for(outcome):
+                fresh[url_key] = (status, bool(expired))
+
+        return fresh
+
+    def get_validators(self, keys: Iterable[str]) -> Dict[str, Tuple[int, Optional[str], Optional[str]]]:
+        """
+        Return {key: (status, etag, last_modified)} for keys whose last good
+        (2xx) answer carried an ETag or Last-Modified, whatever its age.
+        """
+        keys = list(keys)
+        with self._lock:
+            rows = self._select(keys, "url_key, COALESCE(validated_status, status), etag, last_modified")
+
+        return {
+            url_key: (status, etag, last_modified)
+            for url_key, status, etag, last_modified in rows
+            if status is not None and 200 <= status < 300 and (etag or last_modified)
+        }
+
+    def put_many(self, entries: Iterable[Tuple[str, Optional[int], bool, Optional[str], Optional[str]]],
+                 now: Optional[float] = None) -> None:
+        """
+        Upsert (key, status, expired, etag, last_modified) rows stamped with
+        the current time. An errored probe (no status) keeps the validators
+        of the previous good answer, and the status they came with.
+        """
+        now = time.time() if now is None else now
+        rows: List[Tuple[Any, ...]] = [
+            (key, status, int(bool(expired)), classify_status(status, expired), now,
+             etag, last_modified, status)
+            for key, status, expired, etag, last_modified in entries
+        ]
+        if not rows:
+            return
+
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT INTO link_status
+                    (url_key, status, expired, outcome, checked_at, etag, last_modified,
+                     validated_status)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url_key) DO UPDATE SET
+                    status = excluded.status,
+                    expired = excluded.expired,
+                    outcome = excluded.outcome,
+                    checked_at = excluded.checked_at,
+                    etag = CASE WHEN excluded.status IS NULL
+                                THEN link_status.etag ELSE excluded.etag END,
+                    last_modified = CASE WHEN excluded.status IS NULL
+                                         THEN link_status.last_modified ELSE excluded.last_modified END,
+                    validated_status = CASE WHEN excluded.status IS NULL
+                                            THEN link_status.validated_status ELSE excluded.status END
+                """,
+                rows,
+            )
+            self._conn.commit()
+
+
+_store: Optional[LinkStatusStore] = None
+_store_lock = Lock()
+
+
+def get_status_store() -> Optional[LinkStatusStore]:
+    """
+    Lazily open the process-wide store. Returns None (cache disabled) if the
+    database can't be opened, so link checks never fail because of it.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            try:
+                _store = LinkStatusStore()
+            except Exception:
+                logger.warning("ExpiredLinkChecker: status cache unavailable at %s",
+                               STATUS_DB_PATH, exc_info=True)
+                return None
+        return _store
@@ -0,0 +1,93 @@
+import http.client
+import ssl
+from threading import Lock
+from typing import Callable, Dict, Optional, Tuple
+
+# Max hosts we remember a TLS session for (oldest dropped first)
+MAX_TLS_SESSIONS = 2048
+
+_context: Optional[ssl.SSLContext] = None
+_context_lock = Lock()
+
+
+def shared_ssl_context() -> ssl.SSLContext:
+    """
+    One client SSLContext per process. Building a context loads the system
+    CA bundle, which is far too slow to repeat for every connection, and
+    TLS sessions can only be resumed through the context that made them.
+    """
+    global _context
+    with _context_lock:
+        if _context is None:
+            ctx = ssl.create_default_context()
+            ctx.set_alpn_protocols(["http/1.1"])
+            _context = ctx
+        return _context
+
+
+class TLSSessionStore:
+    """
+    Last TLS session seen per (hostname, port), so the next connection to
+    the same site can do an abbreviated (resumed) handshake. Thread-safe.
+    """
+
+    def __init__(self, max_sessions: int = MAX_TLS_SESSIONS):
+        self.max_sessions = max_sessions
+        self._lock = Lock()
+        self._sessions: Dict[Tuple[str, int], ssl.SSLSession] = {}
+
+    def get(self, key: Tuple[str, int]) -> Optional[ssl.SSLSession]:
+        with self._lock:
+            return self._sessions.get(key)
+
+    def put(self, key: Tuple[str, int], session: Optional[ssl.SSLSession]) -> None:
+        if session is None:
+            return
+        with self._lock:
+            self._sessions.pop(key, None)
+            self._sessions[key] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.pop(next(iter(self._sessions)))
+
+
+# Shared across invocations: session tickets usually outlive one request
+tls_sessions = TLSSessionStore()
+
+
+class ResumingHTTPSConnection(http.client.HTTPSConnection):
+    """
+    HTTPSConnection on the shared context that offers the host's last TLS
+    session when connecting. `on_handshake(resumed)` is called after every
+    handshake. Call save_session() once a response has been read: TLS 1.3
+    only delivers the session ticket after the handshake.
+    """
+
+    def __init__(self, host: str, port: Optional[int] = None, *,
+                 on_handshake: Optional[Callable[[bool], None]] = None,
+                 **kwargs):
+        kwargs.setdefault("context", shared_ssl_context())
+        super().__init__(host, port, **kwargs)
+        self._on_handshake = on_handshake
+
+    def _session_key(self) -> Tuple[str, int]:
+        return (self._tunnel_host or self.host).lower(), self._tunnel_port or self.port
+
+    def connect(self):
+        # Plain TCP (and proxy tunnel) first, then TLS with our session
+        http.client.HTTPConnection.connect(self)
+        key = self._session_key()
+        self.sock = self._context.wrap_socket(
+            self.sock,
+            server_hostname=key[0],
+            session=tls_sessions.get(key),
+        )
+        if self._on_handshake is not None:
+            self._on_handshake(bool(self.sock.session_reused))
+
+    def save_session(self) -> None:
+        sock = self.sock
+        if isinstance(sock, ssl.SSLSocket):
+            try:
+                tls_sessions.put(self._session_key(), sock.session)
+            except Exception:
+                pass
@@ -1,6 +1,10 @@
 import logging
 import azure.functions as func
 import json
+import re
+from contextlib import nullcontext
+
+from .learned_model import FolderModel, FolderModelCache, is_unfiled, tokenize, train
 
 CATEGORY_KEYWORDS = {
     "Finance": ["investment", "investments", "stocks", "stock", "etf", "crypto", "bitcoin", "nft", "budgeting", "tax", "retirement", "saving", "interest", "credit", "loan", "mortgage", "debt", "bank", "wallet", "salary", "freelance"],
@@ -29,20 +33,65 @@ CATEGORY_KEYWORDS = {
 }
 
 
-def suggest_category(title, description):
-    text = f"{title} {description}".lower()
-    match_counts = {}
+# Words are runs of letters/digits, so "cat" no longer matches "category"
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+class KeywordMatcher:
+    """
+    Word-aware matcher over a {category: [keywords]} map, compiled once.
+    A keyword matches whole words only; multi-word keywords match the same
+    words in a row. One pass over the text's words finds every category.
+    """
+
+    def __init__(self, category_keywords):
+        self.categories = list(category_keywords)
+        # first word -> [(remaining words, category index, keyword position, keyword)]
+        self.index = {}
+        for cat_idx, keywords in enumerate(category_keywords.values()):
+            for pos, kw in enumerate(keywords):
+                words = _WORD_RE.findall(kw.lower())
+                if words:
+                    self.index.setdefault(words[0], []).append((tuple(words[1:]), cat_idx, pos, kw))
+
+    def match(self, text):
+        """
+        Return {category: [matched keywords in list order]} for every
+        category with at least one match, in CATEGORY_KEYWORDS order.
+        Each keyword counts once however often it appears.
+        """
+        words = _WORD_RE.findall(text.lower())
+        index = self.index
+        found = set()
+        for i, word in enumerate(words):
+            entries = index.get(word)
+            if not entries:
+                continue
+            for rest, cat_idx, pos, kw in entries:
+                if not rest or tuple(words[i + 1:i + 1 + len(rest)]) == rest:
+                    found.add((cat_idx, pos, kw))
+
+        matches = {}
+        for cat_idx, _, kw in sorted(found):
+            matches.setdefault(self.categories[cat_idx], []).append(kw)
+        return matches
+
 
-    for category, keywords in CATEGORY_KEYWORDS.items():
-        count = sum(1 for kw in keywords if kw in text)
-        if count > 0:
-            match_counts[category] = count
+_MATCHER = KeywordMatcher(CATEGORY_KEYWORDS)
 
-    if not match_counts:
+# Learned models per user_key ("mode": "learned")
+_MODELS = FolderModelCache()
+
+
+def suggest_category(title, description):
+    matches = _MATCHER.match(f"{title} {description}")
+
+    if not matches:
         return "Uncategorized", "No keyword match"
 
-    best_match = max(match_counts, key=match_counts.get)
-    reason = ", ".join([kw for kw in CATEGORY_KEYWORDS[best_match] if kw in text])
+    # most matched keywords wins; ties go to the earlier category
+    best_match = max(matches, key=lambda cat: len(matches[cat]))
+    reason = ", ".join(matches[best_match])
     return best_match, reason
 
 
@@ -51,20 +100,64 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         data = req.get_json()
         bookmarks = data.get("bookmarks", [])
 
-        results = []
-        for bm in bookmarks:
-            title = bm.get("title", "")
-            description = bm.get("description", "")
+        # "mode": "learned" -> learn folders from the user's filed bookmarks
+        # and suggest one for the unfiled ones (keywords as the fallback)
+        learned = str(data.get("mode") or "").strip().lower() == "learned"
+        model = None
+        model_lock = nullcontext()
+        model_info = None
+        if learned:
+            user_key = str(data.get("user_key") or "").strip()
+            reset = str(data.get("retrain", "")).strip().lower() in ("1", "true", "yes", "y")
+            if user_key:
+                model, model_lock, cached = _MODELS.get(user_key, reset=reset)
+            else:
+                # no key: train a throwaway model for this request only
+                model, cached = FolderModel(), False
+
+        # a cached model is shared: train and score under its lock
+        with model_lock:
+            scorer = None
+            if model is not None:
+                rows = [
+                    (str(bm.get("url") or bm.get("title") or ""), str(bm.get("folder_name")).strip(),
+                     bm.get("title", ""), bm.get("description", ""), bm.get("url", ""))
+                    for bm in bookmarks if not is_unfiled(bm.get("folder_name"))
+                ]
+                model_info = train(model, rows, _WORD_RE)
+                model_info.update(model.stats(), user_key=user_key or None, cached=cached)
+                scorer = model.scorer()
+
+            results = []
+            for bm in bookmarks:
+                title = bm.get("title", "")
+                description = bm.get("description", "")
+
+                prediction = None
+                if scorer is not None and is_unfiled(bm.get("folder_name")):
+                    prediction = scorer.predict(tokenize(_WORD_RE, title, description, bm.get("url", "")))
+
+                if prediction is not None:
+                    folder, conf, evidence = prediction
+                    bm.update({
+                        "ai_folder_suggestion": folder,
+                        "reason": "learned from your folders: " + ", ".join(evidence),
+                        "ai_folder_conf": round(conf, 4)
+                    })
+                else:
+                    suggestion, reason = suggest_category(title, description)
+                    bm.update({
+                        "ai_folder_suggestion": suggestion,
+                        "reason": reason
+                    })
+                results.append(bm)
 
-            suggestion, reason = suggest_category(title, description)
-            bm.update({
-                "ai_folder_suggestion": suggestion,
-                "reason": reason
-            })
-            results.append(bm)
+        payload = {"results": results}
+        if model_info is not None:
+            payload["model"] = model_info
 
         return func.HttpResponse(
-            json.dumps({"results": results}, ensure_ascii=False),
+            json.dumps(payload, ensure_ascii=False),
             mimetype="application/json",
             status_code=200
         )
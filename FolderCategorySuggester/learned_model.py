@@ -0,0 +1,328 @@
+"""
+Multinomial naive Bayes over the user's own folders.
+
+Bookmarks the user already filed (non-empty folder_name) are the training
+set; unfiled ones are scored against it. Counts are kept in flat arrays
+indexed by token id and class id, so a model is compact, cheap to keep in
+memory between calls and can be updated one bookmark at a time.
+"""
+import hashlib
+import math
+import os
+import time
+from array import array
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# Models kept per worker, keyed by the request's user_key
+FOLDER_MODEL_CACHE_SIZE = int(os.environ.get("FOLDER_MODEL_CACHE_SIZE", "64"))
+
+# Laplace smoothing
+ALPHA = 1.0
+
+# Words that say nothing about a folder
+STOPWORDS = frozenset(
+    "the and for with from your you how what why this that are was were www com "
+    "org net http https html php index of to in on at by an or is it be as".split()
+)
+
+# Browser default folders count as "not filed"
+UNFILED_FOLDERS = frozenset(["", "unsorted", "unsorted bookmarks", "other bookmarks", "uncategorized"])
+
+
+def is_unfiled(folder_name) -> bool:
+    return str(folder_name or "").strip().lower() in UNFILED_FOLDERS
+
+
+def tokenize(word_re, title, description, url) -> List[str]:
+    """
+    Words of title + description + the URL's host name, lowercased,
+    without stopwords and single characters.
+    """
+    host = ""
+    if url:
+        try:
+            host = urlparse(str(url)).hostname or ""
+        except ValueError:
+            host = ""
+    text = f"{title or ''} {description or ''} {host}".lower()
+    return [w for w in word_re.findall(text) if len(w) > 1 and w not in STOPWORDS]
+
+
+def content_hash(parts) -> bytes:
+    """
+    Digest of one document's (title, description, url) rows, so an
+    unchanged bookmark can be recognised without tokenizing it again.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for title, description, url in parts:
+        h.update("\x1f".join((str(title or ""), str(description or ""), str(url or ""))).encode("utf-8"))
+        h.update(b"\x1e")
+    return h.digest()
+
+
+class FolderModel:
+    """
+    Token/class count tables for multinomial naive Bayes.
+
+    Per token id, `post_classes[t]` / `post_counts[t]` are parallel arrays
+    of the classes the token was seen in and how often. Per class id,
+    `class_docs` and `class_tokens` hold document and token totals;
+    `token_totals` and `live_vocab` track which tokens are still counted
+    anywhere, so un-counted words drop out of the smoothing vocabulary.
+    `docs` remembers what each (bookmark, folder) pair contributed, so an
+    edited bookmark, or one moved to another folder, is un-counted before
+    being re-added; `doc_hashes` the content_hash() it was counted from.
+    """
+
+    def __init__(self, alpha: float = ALPHA):
+        self.alpha = alpha
+        self.token_ids: Dict[str, int] = {}
+        self.tokens: List[str] = []
+        self.post_classes: List[array] = []
+        self.post_counts: List[array] = []
+        self.class_ids: Dict[str, int] = {}
+        self.classes: List[str] = []
+        self.class_docs = array("d")
+        self.class_tokens = array("d")
+        self.token_totals = array("d")
+        self.live_vocab = 0
+        self.docs: Dict[Tuple[str, int], Tuple[int, ...]] = {}
+        self.doc_hashes: Dict[Tuple[str, int], bytes] = {}
+        self.doc_folders: Dict[str, set] = {}
+
+    # --- training -------------------------------------------------------------
+
+    def _class_id(self, label: str) -> int:
+        cid = self.class_ids.get(label)
+        if cid is None:
+            cid = self.class_ids[label] = len(self.classes)
+            self.classes.append(label)
+            self.class_docs.append(0.0)
+            self.class_tokens.append(0.0)
+        return cid
+
+    def _token_id(self, token: str) -> int:
+        tid = self.token_ids.get(token)
+        if tid is None:
+            tid = self.token_ids[token] = len(self.tokens)
+            self.tokens.append(token)
+            self.post_classes.append(array("i"))
+            self.post_counts.append(array("d"))
+            self.token_totals.append(0.0)
+        return tid
+
+    def _bump(self, tid: int, cid: int, delta: float) -> None:
+        before = self.token_totals[tid]
+        self.token_totals[tid] = before + delta
+        if before <= 0 < before + delta:
+            self.live_vocab += 1
+        elif before + delta <= 0 < before:
+            self.live_vocab -= 1
+
+        classes, counts = self.post_classes[tid], self.post_counts[tid]
+        for i, c in enumerate(classes):
+            if c == cid:
+                counts[i] += delta
+                return
+        classes.append(cid)
+        counts.append(delta)
+
+    def _apply(self, cid: int, token_ids: Tuple[int, ...], sign: float) -> None:
+        self.class_docs[cid] += sign
+        self.class_tokens[cid] += sign * len(token_ids)
+        for tid in token_ids:
+            self._bump(tid, cid, sign)
+
+    def is_current(self, doc_key: str, label: str, digest: bytes) -> bool:
+        """
+        Was (doc_key, label) last counted from content with this digest?
+        """
+        cid = self.class_ids.get(label)
+        return cid is not None and self.doc_hashes.get((doc_key, cid)) == digest
+
+    def add(self, doc_key: str, label: str, tokens: List[str], digest: Optional[bytes] = None) -> str:
+        """
+        Count one filed bookmark. Returns "added", "updated" (text changed
+        since last seen; old counts removed first) or "unchanged".
+        """
+        cid = self._class_id(label)
+        token_ids = tuple(self._token_id(t) for t in tokens)
+        if digest is not None:
+            self.doc_hashes[(doc_key, cid)] = digest
+
+        previous = self.docs.get((doc_key, cid))
+        if previous == token_ids:
+            return "unchanged"
+        if previous is not None:
+            self._apply(cid, previous, -1.0)
+
+        self._apply(cid, token_ids, 1.0)
+        self.docs[(doc_key, cid)] = token_ids
+        self.doc_folders.setdefault(doc_key, set()).add(cid)
+        return "added" if previous is None else "updated"
+
+    def forget_other_folders(self, doc_key: str, labels: set) -> int:
+        """
+        Un-count doc_key in any folder not in `labels` (it was moved).
+        Returns how many (bookmark, folder) pairs were removed.
+        """
+        keep = {self.class_ids[label] for label in labels if label in self.class_ids}
+        stale = self.doc_folders.get(doc_key, set()) - keep
+        for cid in stale:
+            self._apply(cid, self.docs.pop((doc_key, cid)), -1.0)
+            self.doc_hashes.pop((doc_key, cid), None)
+            self.doc_folders[doc_key].discard(cid)
+        if doc_key in self.doc_folders and not self.doc_folders[doc_key]:
+            del self.doc_folders[doc_key]
+        return len(stale)
+
+    # --- scoring --------------------------------------------------------------
+
+    def scorer(self) -> "FolderScorer":
+        """
+        Frozen log-probability tables for scoring; rebuild after training.
+        """
+        return FolderScorer(self)
+
+    def stats(self) -> dict:
+        return {
+            "folders": sum(1 for d in self.class_docs if d > 0),
+            "vocab": self.live_vocab,
+            "docs": len(self.docs),
+        }
+
+
+class FolderScorer:
+    """
+    Log-space view of a FolderModel at one point in time. Per folder,
+    log P(c) and log(N_c + alpha V); per token (filled on first use), the
+    folders it was seen in with log((count + alpha) / alpha). A token the
+    folder never saw contributes log(alpha) - log(N_c + alpha V), so
+    scoring only touches the folders each token was actually seen in.
+    """
+
+    def __init__(self, model: FolderModel):
+        self.model = model
+        n_classes = len(model.classes)
+        self.live = [c for c in range(n_classes) if model.class_docs[c] > 0]
+        total_docs = sum(model.class_docs[c] for c in self.live)
+        vocab = model.live_vocab
+        log_alpha = math.log(model.alpha)
+
+        self.log_prior = [float("-inf")] * n_classes
+        self.log_miss = [0.0] * n_classes
+        for c in self.live:
+            self.log_prior[c] = math.log(model.class_docs[c] / total_docs)
+            self.log_miss[c] = log_alpha - math.log(model.class_tokens[c] + model.alpha * vocab)
+        self._postings: Dict[int, Tuple[Tuple[int, float], ...]] = {}
+
+    def _posting(self, tid: int) -> Tuple[Tuple[int, float], ...]:
+        posting = self._postings.get(tid)
+        if posting is None:
+            alpha = self.model.alpha
+            posting = self._postings[tid] = tuple(
+                (c, math.log1p(count / alpha))
+                for c, count in zip(self.model.post_classes[tid], self.model.post_counts[tid])
+                if count > 0
+            )
+        return posting
+
+    def predict(self, tokens: List[str]) -> Optional[Tuple[str, float, List[str]]]:
+        """
+        Most likely folder for a bookmark's tokens: (folder, posterior,
+        top evidence tokens). Cost is O(tokens x folders sharing them +
+        folders). None when the model can't discriminate (under two
+        folders, or no known tokens).
+        """
+        if len(self.live) < 2:
+            return None
+        token_ids, totals = self.model.token_ids, self.model.token_totals
+        known = [token_ids[t] for t in tokens if t in token_ids and totals[token_ids[t]] > 0]
+        if not known:
+            return None
+
+        n = len(known)
+        scores = [p + n * m for p, m in zip(self.log_prior, self.log_miss)]
+        postings = [self._posting(tid) for tid in known]
+        for posting in postings:
+            for c, weight in posting:
+                scores[c] += weight
+
+        best = max(self.live, key=scores.__getitem__)
+        top = scores[best]
+        posterior = 1.0 / sum(math.exp(scores[c] - top) for c in self.live)
+
+        evidence = {}
+        for tid, posting in zip(known, postings):
+            for c, weight in posting:
+                if c == best:
+                    evidence[self.model.tokens[tid]] = weight
+        top_tokens = sorted(evidence, key=lambda t: (-evidence[t], t))[:3]
+        return self.model.classes[best], posterior, top_tokens
+
+
+class FolderModelCache:
+    """
+    LRU of FolderModel by user key. Thread-safe for lookups; a model
+    itself is updated by one request at a time (per-model lock).
+    """
+
+    def __init__(self, max_entries: int = FOLDER_MODEL_CACHE_SIZE):
+        self.max_entries = max(1, max_entries)
+        self._lock = Lock()
+        self._models: "OrderedDict[str, Tuple[FolderModel, Lock]]" = OrderedDict()
+
+    def get(self, user_key: str, reset: bool = False) -> Tuple[FolderModel, Lock, bool]:
+        """
+        Return (model, model_lock, was_cached).
+        """
+        with self._lock:
+            entry = None if reset else self._models.get(user_key)
+            cached = entry is not None
+            if entry is None:
+                entry = (FolderModel(), Lock())
+                self._models[user_key] = entry
+            self._models.move_to_end(user_key)
+            while len(self._models) > self.max_entries:
+                self._models.popitem(last=False)
+        return entry[0], entry[1], cached
+
+
+def train(model: FolderModel, rows, word_re) -> Dict[str, float]:
+    """
+    Sync the model with the user's filed bookmarks, given as
+    (doc_key, folder_name, title, description, url) rows. The rows are a
+    full snapshot: a bookmark filed elsewhere earlier is un-counted there,
+    one missing from the rows (deleted, or moved back to an unfiled
+    folder) is un-counted everywhere, and duplicates within one folder
+    are merged into one document. Documents whose content_hash() matches
+    what was last counted are skipped before tokenizing, so a snapshot
+    that barely changed costs one hash per row. Returns counts of
+    added/updated/unchanged/moved/removed documents and the time taken.
+    """
+    t0 = time.perf_counter()
+    counts = {"added": 0, "updated": 0, "unchanged": 0, "moved": 0, "removed": 0}
+
+    documents: Dict[Tuple[str, str], List[Tuple]] = {}
+    folders_by_key: Dict[str, set] = {}
+    for doc_key, folder, title, description, url in rows:
+        documents.setdefault((doc_key, folder), []).append((title, description, url))
+        folders_by_key.setdefault(doc_key, set()).add(folder)
+
+    for doc_key in [k for k in model.doc_folders if k not in folders_by_key]:
+        counts["removed"] += model.forget_other_folders(doc_key, set())
+    for doc_key, folders in folders_by_key.items():
+        counts["moved"] += model.forget_other_folders(doc_key, folders)
+    for (doc_key, folder), parts in documents.items():
+        digest = content_hash(parts)
+        if model.is_current(doc_key, folder, digest):
+            counts["unchanged"] += 1
+            continue
+        tokens = [t for part in parts for t in tokenize(word_re, *part)]
+        counts[model.add(doc_key, folder, tokens, digest)] += 1
+
+    counts["train_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+    return counts
@@ -4,6 +4,12 @@ import json
 import string
 import time
 from collections import defaultdict
+from functools import lru_cache
+
+from .batch import rarity_outliers
+from .centroid import centroid_outliers
+from .incremental import MIN_FOLDER_ITEMS, OutlierStateUnavailable, get_state_store, text_hash
+from .parallel import TIMED_OUT, run_jobs
 
 # Synonym normalization map from categories/subcategories
 SYNONYM_MAP = {
@@ -70,7 +76,7 @@ STOPWORDS = {
     "more", "some", "any",
 }
 
-MAX_PROCESSING_SECONDS = 10.0  # hard cap per request
+MAX_PROCESSING_SECONDS = 10.0  # last-resort cap per request; folders run in parallel
 
 
 def tokenize(text: str) -> set:
@@ -82,16 +88,26 @@ def tokenize(text: str) -> set:
     - crude stemming (ing/ed/s)
     - map synonyms to canonical buckets
     """
-    words = text.lower().translate(str.maketrans("", "", string.punctuation)).split()
-    tokens = set()
+    tokens = {_word_token(word) for word in normalize_words(text).split()}
+    tokens.discard(None)
+    return tokens
 
-    for word in words:
-        if word in STOPWORDS:
-            continue
-        base = word.rstrip("ing").rstrip("ed").rstrip("s")
-        tokens.add(SYNONYM_MAP.get(base, base))
 
-    return tokens
+_STRIP_PUNCTUATION = str.maketrans("", "", string.punctuation)
+
+
+def normalize_words(text: str) -> str:
+    # Per-character only, so it can run on many texts joined together
+    return text.lower().translate(_STRIP_PUNCTUATION)
+
+
+@lru_cache(maxsize=65536)
+def _word_token(word: str):
+    # Same word -> same token; libraries repeat the same vocabulary a lot
+    if word in STOPWORDS:
+        return None
+    base = word.rstrip("ing").rstrip("ed").rstrip("s")
+    return SYNONYM_MAP.get(base, base)
 
 
 def build_token_frequencies(tokenized_lists):
@@ -137,6 +153,149 @@ def find_outlier_quick(items):
     return outlier_index, rarity_scores
 
 
+def evaluate_folders(texts_per_folder):
+    """
+    Process-pool entry point: outlier index (or None) for each folder's
+    list of texts. Module-level so it can be pickled by reference.
+    """
+    return [
+        find_outlier_quick([{"text": text} for text in texts])[0]
+        for texts in texts_per_folder
+    ]
+
+
+def evaluate_folders_centroid(jobs):
+    """
+    Process-pool entry point for "mode": "centroid". Each job is
+    (texts, top_k, z_threshold); returns centroid_outliers() per job.
+    """
+    return [
+        centroid_outliers(texts, tokenize, top_k=top_k, z_threshold=z_threshold)
+        for texts, top_k, z_threshold in jobs
+    ]
+
+
+def label_folder(items, outcome):
+    """
+    (outlier_score, outlier_score_reason) per item, given the folder's
+    evaluation outcome: an outlier index, a centroid_outliers() result,
+    None, or TIMED_OUT.
+    """
+    if outcome is TIMED_OUT:
+        return [("✅ Normal", "Time limit reached; treated as normal")] * len(items)
+    if len(items) < 3:
+        # Not enough data to make a judgement
+        return [("✅ Normal", "Not enough data to evaluate")] * len(items)
+    if outcome is None:
+        return [("✅ Normal", "Could not compute outlier")] * len(items)
+    if isinstance(outcome, tuple):
+        flagged = outcome[0]
+        return [
+            ("🌠 Outlier", "Far from the folder's centroid (TF-IDF cosine)") if idx in flagged
+            else ("✅ Normal", "Close to the folder's centroid (TF-IDF cosine)")
+            for idx in range(len(items))
+        ]
+    return [
+        ("🌠 Outlier", "Least similar to others (heuristic)") if idx == outcome
+        else ("✅ Normal", "Similar to others (heuristic)")
+        for idx in range(len(items))
+    ]
+
+
+def item_id_for(item) -> str:
+    return str(item.get("id") or item.get("url") or item.get("title") or "")
+
+
+def folder_for(item) -> str:
+    # Stored folder key: null/empty folder names share "Unknown"
+    return str(item.get("folder_name") or "Unknown")
+
+
+def item_text(item) -> str:
+    title = item.get("title", "") or ""
+    description = item.get("description", "") or ""
+    return f"{title} {description}".strip()
+
+
+def apply_outlier_delta(user_key, add, remove, snapshot=None):
+    """
+    "mode": "incremental": update the stored per-folder rarity state with
+    added/edited bookmarks (`add`) and removed ones (`remove`, items with
+    folder_name + id/url). `snapshot`, if given, is the user's full list:
+    anything stored but missing from it is removed, and unchanged
+    bookmarks cost a hash, not a re-tokenize.
+    Returns (changed labels, removed ids, stats).
+    """
+    store = get_state_store()
+    upserts = defaultdict(dict)   # folder -> {id: text}
+    removals = defaultdict(set)   # folder -> {ids}
+
+    for item in add:
+        upserts[folder_for(item)][item_id_for(item)] = item_text(item)
+    for item in remove:
+        removals[folder_for(item)].add(item_id_for(item))
+
+    with store.transaction(user_key):
+        if snapshot is not None:
+            for item in snapshot:
+                upserts[folder_for(item)][item_id_for(item)] = item_text(item)
+            for folder in store.folders(user_key):
+                present = upserts.get(folder, {})
+                removals[folder].update(i for i in store.get(user_key, folder).items if i not in present)
+
+        changed, removed = [], []
+        tokenized = 0
+        touched = 0
+        for folder in list(dict.fromkeys(list(upserts) + list(removals))):
+            state = store.get(user_key, folder)
+            old_enough = len(state.items) >= MIN_FOLDER_ITEMS
+            old_outlier = state.outlier() if old_enough else None
+
+            changed_tokens = set()
+            new_ids = []
+            n_removed = 0
+            for item_id in removals.get(folder, ()):
+                if item_id in state.items and item_id not in upserts.get(folder, {}):
+                    changed_tokens |= state.remove(item_id)
+                    removed.append({"folder_name": folder, "id": item_id})
+                    n_removed += 1
+            for item_id, text in upserts.get(folder, {}).items():
+                digest = text_hash(text)
+                previous = state.items.get(item_id)
+                if previous is not None and previous[1] == digest:
+                    continue
+                changed_tokens |= state.upsert(item_id, digest, tokenize(text))
+                new_ids.append(item_id)
+                tokenized += 1
+
+            if not new_ids and not n_removed:
+                continue
+            touched += 1
+            state.refresh(changed_tokens, new_ids)
+            store.save(user_key, folder, state)
+
+            # Only these labels can have moved: old/new outlier, new or
+            # edited bookmarks, or everything if the folder crossed the
+            # minimum size
+            enough = len(state.items) >= MIN_FOLDER_ITEMS
+            new_outlier = state.outlier() if enough else None
+            report = set(new_ids) | {i for i in (old_outlier, new_outlier) if i is not None}
+            if enough != old_enough:
+                report = set(state.items)
+            labels = state.labels() if report else {}
+            for item_id in sorted(i for i in report if i in state.items):
+                score_label, reason_label = labels[item_id]
+                changed.append({
+                    "folder_name": folder,
+                    "id": item_id,
+                    "outlier_score": score_label,
+                    "outlier_score_reason": reason_label,
+                })
+
+    stats = {"folders_touched": touched, "items_tokenized": tokenized}
+    return changed, removed, stats
+
+
 def main(req: func.HttpRequest) -> func.HttpResponse:
     start_time = time.monotonic()
     try:
@@ -156,6 +315,36 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
 
         logging.info("OutlierFinder: received %d bookmarks", len(bookmarks))
 
+        # "mode": "incremental" -> apply add/remove deltas to the stored
+        # per-folder state and return only the labels that changed
+        if str(req_body.get("mode") or "").strip().lower() == "incremental":
+            user_key = str(req_body.get("user_key") or "").strip()
+            if not user_key:
+                return func.HttpResponse(
+                    json.dumps({"error": "user_key is required in incremental mode"}),
+                    mimetype="application/json",
+                    status_code=400,
+                )
+            snapshot = req_body.get("bookmarks") or req_body.get("urls")
+            try:
+                changed, removed, stats = apply_outlier_delta(
+                    user_key,
+                    req_body.get("add") or [],
+                    req_body.get("remove") or [],
+                    snapshot if isinstance(snapshot, list) else None,
+                )
+            except OutlierStateUnavailable as e:
+                return func.HttpResponse(
+                    json.dumps({"error": str(e)}),
+                    mimetype="application/json",
+                    status_code=503,
+                )
+            return func.HttpResponse(
+                json.dumps({"changed": changed, "removed": removed, **stats}, ensure_ascii=False),
+                mimetype="application/json",
+                status_code=200,
+            )
+
         folder_groups = defaultdict(list)
         for item in bookmarks:
             folder = item.get("folder_name", "Unknown")
@@ -166,69 +355,64 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             item["text"] = combined
             folder_groups[folder].append(item)
 
-        results = []
+        # Folders are independent: evaluate the ones big enough to judge
+        # concurrently, sharded by size. The time cap is a last resort.
+        folders = list(folder_groups.items())
+        todo = [i for i, (_, items) in enumerate(folders) if len(items) >= 3]
+        texts_per_folder = [[item["text"] for item in folders[i][1]] for i in todo]
+
+        # "mode": "centroid" -> cosine distance to the folder's TF-IDF
+        # centroid, flagging the top_k and/or those past z_threshold
+        mode = str(req_body.get("mode") or "").strip().lower()
+        top_k = req_body.get("top_k")
+        z_threshold = req_body.get("z_threshold")
+        try:
+            top_k = None if top_k is None else int(top_k)
+            z_threshold = None if z_threshold is None else float(z_threshold)
+        except (TypeError, ValueError):
+            return func.HttpResponse(
+                json.dumps({"error": "top_k must be an integer and z_threshold a number"}),
+                mimetype="application/json",
+                status_code=400,
+            )
+
+        # "engine": "batch" -> score all folders together with NumPy
+        # (falls back to the per-folder path if NumPy is missing)
+        engine = str(req_body.get("engine") or "").strip().lower()
+        batch_outcomes = None
+        if mode == "centroid":
+            batch_outcomes = run_jobs(
+                evaluate_folders_centroid,
+                [(texts, top_k, z_threshold) for texts in texts_per_folder],
+                [len(texts) for texts in texts_per_folder],
+                deadline=start_time + MAX_PROCESSING_SECONDS,
+            )
+        elif engine == "batch":
+            batch_outcomes = rarity_outliers(texts_per_folder, normalize_words, _word_token)
+        if batch_outcomes is None:
+            batch_outcomes = run_jobs(
+                evaluate_folders,
+                texts_per_folder,
+                [len(texts) for texts in texts_per_folder],
+                deadline=start_time + MAX_PROCESSING_SECONDS,
+            )
+        outcomes = dict(zip(todo, batch_outcomes))
+
+        timed_out = [folders[i][0] for i in todo if outcomes[i] is TIMED_OUT]
+        if timed_out:
+            logging.warning(
+                "OutlierFinder: time limit reached, %d folder(s) treated as normal: %s",
+                len(timed_out), ", ".join(map(str, timed_out[:10])),
+            )
 
-        for folder, items in folder_groups.items():
-            # Time safety: if we've already spent too long, just mark remaining as normal
-            if time.monotonic() - start_time > MAX_PROCESSING_SECONDS:
-                logging.warning(
-                    "OutlierFinder: time limit reached, marking remaining folder '%s' items as normal",
-                    folder,
-                )
-                for item in items:
-                    item.pop("text", None)
-                    item.update(
-                        {
-                            "outlier_score": "✅ Normal",
-                            "outlier_score_reason": "Time limit reached; treated as normal",
-                        }
-                    )
-                    results.append(item)
-                continue
-
-            n_items = len(items)
-            logging.info("OutlierFinder: processing folder '%s' with %d items", folder, n_items)
-
-            if n_items < 3:
-                # Not enough data to make a judgement
-                for item in items:
-                    item.pop("text", None)
-                    item.update(
-                        {
-                            "outlier_score": "✅ Normal",
-                            "outlier_score_reason": "Not enough data to evaluate",
-                        }
-                    )
-                    results.append(item)
-                continue
-
-            outlier_index, scores = find_outlier_quick(items)
-
-            if outlier_index is None:
-                # Fallback: treat everything as normal
+        results = []
+        for i, (folder, items) in enumerate(folders):
+            outcome = outcomes.get(i)
+            if outcome is None and i in outcomes:
                 logging.warning(
                     "OutlierFinder: could not compute outlier for folder '%s'", folder
                 )
-                for item in items:
-                    item.pop("text", None)
-                    item.update(
-                        {
-                            "outlier_score": "✅ Normal",
-                            "outlier_score_reason": "Could not compute outlier",
-                        }
-                    )
-                    results.append(item)
-                continue
-
-            for idx, item in enumerate(items):
-                is_outlier = idx == outlier_index
-                score_label = "🌠 Outlier" if is_outlier else "✅ Normal"
-                reason_label = (
-                    "Least similar to others (heuristic)"
-                    if is_outlier
-                    else "Similar to others (heuristic)"
-                )
-
+            for idx, (item, (score_label, reason_label)) in enumerate(zip(items, label_folder(items, outcome))):
                 item.pop("text", None)
                 item.update(
                     {
@@ -236,10 +420,21 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                         "outlier_score_reason": reason_label,
                     }
                 )
+                if isinstance(outcome, tuple):
+                    item["outlier_distance"] = round(outcome[1][idx], 4)
+                    item["outlier_z"] = round(outcome[2][idx], 3)
                 results.append(item)
 
         return func.HttpResponse(
-            json.dumps({"results": results}, ensure_ascii=False),
+            json.dumps(
+                {
+                    "results": results,
+                    "folders_total": len(folders),
+                    "folders_evaluated": len(todo) - len(timed_out),
+                    "time_limit_reached": bool(timed_out),
+                },
+                ensure_ascii=False,
+            ),
             mimetype="application/json",
             status_code=200,
         )
@@ -0,0 +1,99 @@
+"""
+Rarity scoring for every folder of a request at once.
+
+Tokens are interned to integer ids and each (bookmark, token) pair becomes
+one entry of a sparse bookmark x token matrix, with a folder id per
+bookmark as the segment index. Per-folder document frequencies, the
+sum(1/freq) rarity per bookmark and the per-folder argmax are then
+computed with NumPy segment operations instead of per-folder dicts.
+
+NumPy is optional: without it, rarity_outliers() returns None and the
+caller uses the per-folder path.
+"""
+from typing import Callable, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the deployment
+    np = None
+
+# Scores are rounded to this many decimals before picking the maximum, so
+# bookmarks whose rarity sums are equal but were added up in a different
+# order still tie and the first one wins, as with max() in
+# find_outlier_quick().
+SCORE_DECIMALS = 9
+
+
+def rarity_outliers(texts_per_folder: Sequence[Sequence[str]],
+                    normalize: Callable[[str], str],
+                    word_token: Callable[[str], Optional[str]]) -> Optional[List[Optional[int]]]:
+    """
+    Outlier index per folder (None for an empty folder), matching
+    find_outlier_quick() on each folder. `normalize` and `word_token` are
+    the two halves of tokenize(): text -> lowercase words without
+    punctuation, and word -> token (None for stopwords). Returns None
+    without NumPy.
+    """
+    if np is None:
+        return None
+
+    texts = [text for folder in texts_per_folder for text in folder]
+    folder_sizes = [len(folder) for folder in texts_per_folder]
+    if not texts:
+        # "".split("\x00") below would make up one empty text
+        return [None] * len(texts_per_folder)
+
+    # normalize is per-character, so run it once over all texts
+    blob = "\x00".join(texts)
+    if blob.count("\x00") != max(0, len(texts) - 1):
+        normalized = [normalize(text) for text in texts]
+    else:
+        normalized = normalize(blob).split("\x00")
+
+    # word -> token id straight away (-1 for stopwords), one lookup per word
+    word_ids: dict = {}
+    token_ids: dict = {}
+    cols: List[int] = []
+    lengths: List[int] = []
+    for text in normalized:
+        ids = set()
+        for word in text.split():
+            tid = word_ids.get(word)
+            if tid is None:
+                token = word_token(word)
+                tid = word_ids[word] = -1 if token is None else token_ids.setdefault(token, len(token_ids))
+            ids.add(tid)
+        ids.discard(-1)
+        cols.extend(ids)
+        lengths.append(len(ids))
+
+    n_items, n_folders = len(lengths), len(texts_per_folder)
+    if n_items == 0:
+        return [None] * n_folders
+
+    sizes = np.asarray(folder_sizes, dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    item_folder = np.repeat(np.arange(n_folders, dtype=np.int64), sizes)
+    rows_a = np.repeat(np.arange(n_items, dtype=np.int64), np.asarray(lengths, dtype=np.int64))
+    cols_a = np.asarray(cols, dtype=np.int64)
+
+    # Document frequency of each token within its folder: tokens are sets,
+    # so every (folder, token) entry is one document containing it
+    pair_keys = item_folder[rows_a] * max(1, len(token_ids)) + cols_a
+    _, pair_inverse, pair_counts = np.unique(pair_keys, return_inverse=True, return_counts=True)
+    inv_freq = 1.0 / pair_counts[pair_inverse].astype(np.float64)
+
+    scores = np.bincount(rows_a, weights=inv_freq, minlength=n_items)
+
+    # Per-folder argmax, first index on ties: order by folder, then
+    # descending (rounded) score, then position, and take each segment head
+    rounded = np.round(scores, SCORE_DECIMALS)
+    order = np.lexsort((np.arange(n_items), -rounded, item_folder))
+
+    # Segment heads in the sorted order sit at the same offsets as the
+    # folders' first items, since both are grouped by folder
+    heads = order[np.minimum(starts, n_items - 1)]
+    return [
+        int(heads[f] - starts[f]) if sizes[f] > 0 else None
+        for f in range(n_folders)
+    ]
@@ -0,0 +1,133 @@
+"""
+Similarity-to-centroid outlier scoring for one folder.
+
+Each bookmark is a binary TF-IDF vector over its tokens (idf taken within
+the folder), L2-normalised. Its outlier score is the cosine distance to
+the folder centroid (the mean of those vectors). Bookmarks are flagged as
+the top-k most distant and/or when their robust z-score (median/MAD) is
+past a threshold, so a dumping-ground folder can have many outliers.
+
+Everything is linear in the folder's total token count: one pass for
+document frequencies, one to build the centroid, one to score. Top-k uses
+a heap and the medians use quickselect, never a full sort.
+"""
+import heapq
+import math
+import random
+from typing import Callable, Iterable, List, Optional, Set, Tuple
+
+# Default robust z-score threshold (Iglewicz & Hoaglin's 3.5)
+DEFAULT_Z_THRESHOLD = 3.5
+
+# Scales MAD to the standard deviation for normally distributed scores
+_MAD_SCALE = 0.6745
+_MEAN_AD_SCALE = 1.253314
+
+
+def _kth_smallest(values: List[float], k: int) -> float:
+    """
+    k-th smallest value (0-based) by quickselect, expected O(n).
+    """
+    items = list(values)
+    rng = random.Random(len(items))
+    lo, hi = 0, len(items) - 1
+    while True:
+        if lo == hi:
+            return items[lo]
+        pivot = items[rng.randint(lo, hi)]
+        lows = [v for v in items[lo:hi + 1] if v < pivot]
+        highs = [v for v in items[lo:hi + 1] if v > pivot]
+        n_pivots = (hi - lo + 1) - len(lows) - len(highs)
+        rel = k - lo
+        if rel < len(lows):
+            items[lo:lo + len(lows)] = lows
+            hi = lo + len(lows) - 1
+        elif rel < len(lows) + n_pivots:
+            return pivot
+        else:
+            start = lo + len(lows) + n_pivots
+            items[start:start + len(highs)] = highs
+            lo = start
+            hi = start + len(highs) - 1
+
+
+def median(values: List[float]) -> float:
+    n = len(values)
+    if n % 2:
+        return _kth_smallest(values, n // 2)
+    return (_kth_smallest(values, n // 2 - 1) + _kth_smallest(values, n // 2)) / 2.0
+
+
+def centroid_distances(token_sets: List[Set[str]]) -> List[float]:
+    """
+    Cosine distance of each bookmark's TF-IDF vector to the folder centroid.
+    A bookmark with no tokens is at distance 1.
+    """
+    n = len(token_sets)
+    df: dict = {}
+    for tokens in token_sets:
+        for t in tokens:
+            df[t] = df.get(t, 0) + 1
+    idf = {t: math.log((1.0 + n) / (1.0 + f)) + 1.0 for t, f in df.items()}
+
+    # centroid = mean of unit vectors; keep each item's norm for scoring
+    norms = []
+    centroid: dict = {}
+    for tokens in token_sets:
+        norm = math.sqrt(sum(idf[t] * idf[t] for t in tokens))
+        norms.append(norm)
+        if norm:
+            for t in tokens:
+                centroid[t] = centroid.get(t, 0.0) + idf[t] / norm
+    centroid_norm = math.sqrt(sum(v * v for v in centroid.values()))
+
+    distances = []
+    for tokens, norm in zip(token_sets, norms):
+        if not norm or not centroid_norm:
+            distances.append(1.0)
+            continue
+        dot = sum(idf[t] * centroid[t] for t in tokens) / norm
+        distances.append(max(0.0, 1.0 - dot / centroid_norm))
+    return distances
+
+
+def robust_z_scores(values: List[float]) -> List[float]:
+    """
+    Modified z-score (x - median) / (1.4826 * MAD). When more than half the
+    values are identical the MAD is zero, so the mean absolute deviation
+    (scaled by 1.2533) stands in; all zeros if that is zero too.
+    """
+    med = median(values)
+    deviations = [abs(v - med) for v in values]
+    mad = median(deviations)
+    if mad:
+        return [_MAD_SCALE * (v - med) / mad for v in values]
+    mean_ad = sum(deviations) / len(deviations)
+    if mean_ad:
+        return [(v - med) / (_MEAN_AD_SCALE * mean_ad) for v in values]
+    return [0.0] * len(values)
+
+
+def centroid_outliers(texts: Iterable[str], tokenize: Callable[[str], set],
+                      top_k: Optional[int] = None,
+                      z_threshold: Optional[float] = None) -> Tuple[Set[int], List[float], List[float]]:
+    """
+    Returns (flagged indexes, distances, robust z-scores) for one folder.
+    With z_threshold, only bookmarks at or past it qualify; with top_k,
+    at most the k most distant qualifying ones are flagged. With neither,
+    DEFAULT_Z_THRESHOLD applies.
+    """
+    token_sets = [tokenize(text) for text in texts]
+    distances = centroid_distances(token_sets)
+    zscores = robust_z_scores(distances)
+
+    if top_k is None and z_threshold is None:
+        z_threshold = DEFAULT_Z_THRESHOLD
+
+    candidates = range(len(distances))
+    if z_threshold is not None:
+        candidates = [i for i in candidates if zscores[i] >= z_threshold]
+    if top_k is not None:
+        # ties go to the earlier bookmark
+        candidates = heapq.nlargest(max(0, top_k), candidates, key=lambda i: (distances[i], -i))
+    return set(candidates), distances, zscores
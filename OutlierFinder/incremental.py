@@ -0,0 +1,348 @@
+"""
+Incremental rarity outliers for OutlierFinder ("mode": "incremental").
+
+Per (user, folder) we keep what find_outlier_quick() would otherwise
+rebuild on every call: each bookmark's token set, the folder's token
+document frequencies, token -> bookmark postings and every bookmark's
+sum(1/freq) score. Adding or removing a bookmark only re-scores the
+bookmarks that share a token with it, and the outlier comes off a lazy
+max-heap, so a delta costs what it touches rather than the folder size.
+
+States are written to SQLite (OUTLIER_STATE_DB_PATH, shared by every
+instance) as one row per bookmark holding its tokens and current score,
+plus a versioned row per folder, so a delta writes only the bookmarks it
+added, removed or re-scored, and loading a folder needs no re-scoring.
+Loaded states stay in a small in-process LRU, used only while their
+version still matches the stored one. Versions come from one counter for
+the whole database, so a folder that is deleted and re-created never
+gets a version some cached copy of the old folder already has.
+"""
+import hashlib
+import heapq
+import json
+import logging
+import os
+import sqlite3
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# Required for "mode": "incremental": every instance and worker process
+# must see the same database (e.g. a file on an Azure Files mount), so
+# there is deliberately no per-instance default.
+OUTLIER_STATE_DB_PATH = os.environ.get("OUTLIER_STATE_DB_PATH", "")
+
+# Folder states kept in memory per worker
+OUTLIER_STATE_CACHE_SIZE = int(os.environ.get("OUTLIER_STATE_CACHE_SIZE", "512"))
+
+# Same tie rule as the batch engine: equal sums tie, earliest bookmark wins
+SCORE_DECIMALS = 9
+
+# Folders smaller than this are "Not enough data", as in main()
+MIN_FOLDER_ITEMS = 3
+
+logger = logging.getLogger(__name__)
+
+
+def text_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class FolderState:
+    """
+    Rarity inputs for one folder. Bookmarks are ordered by `seq` (first
+    time seen), which stands in for list position when breaking ties.
+    """
+
+    def __init__(self):
+        self.next_seq = 0
+        self.version = 0  # stored version this state matches (0: not stored)
+        self.items: Dict[str, Tuple[int, str, Tuple[str, ...]]] = {}  # id -> (seq, hash, tokens)
+        self.df: Dict[str, int] = {}
+        self.postings: Dict[str, Set[str]] = {}
+        self.scores: Dict[str, float] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self.dirty_items: Set[str] = set()  # rows to write (or delete) on save
+
+    # --- updates --------------------------------------------------------------
+
+    def _rescore(self, item_ids: Iterable[str]) -> None:
+        for item_id in item_ids:
+            seq, _, tokens = self.items[item_id]
+            score = 0.0
+            for t in tokens:
+                score += 1.0 / float(self.df[t])
+            self.scores[item_id] = score
+            self.dirty_items.add(item_id)
+            heapq.heappush(self._heap, (-round(score, SCORE_DECIMALS), seq, item_id))
+
+    def _unlink(self, item_id: str) -> Set[str]:
+        """
+        Drop an item's token counts; returns the tokens whose df changed.
+        """
+        _, _, tokens = self.items.pop(item_id)
+        self.scores.pop(item_id, None)
+        self.dirty_items.add(item_id)
+        for t in tokens:
+            self.df[t] -= 1
+            self.postings[t].discard(item_id)
+            if not self.df[t]:
+                del self.df[t]
+                del self.postings[t]
+        return set(tokens)
+
+    def upsert(self, item_id: str, digest: str, tokens: Iterable[str]) -> Set[str]:
+        """
+        Add a bookmark or replace its text. Returns the tokens whose
+        document frequency changed (empty if the text is unchanged).
+        """
+        previous = self.items.get(item_id)
+        if previous is not None and previous[1] == digest:
+            return set()
+
+        changed: Set[str] = set()
+        if previous is not None:
+            seq = previous[0]
+            changed |= self._unlink(item_id)
+        else:
+            seq = self.next_seq
+            self.next_seq += 1
+
+        tokens = tuple(sorted(set(tokens)))
+        self.items[item_id] = (seq, digest, tokens)
+        self.dirty_items.add(item_id)
+        for t in tokens:
+            self.df[t] = self.df.get(t, 0) + 1
+            self.postings.setdefault(t, set()).add(item_id)
+        changed.update(tokens)
+        return changed
+
+    def remove(self, item_id: str) -> Set[str]:
+        if item_id not in self.items:
+            return set()
+        return self._unlink(item_id)
+
+    def refresh(self, changed_tokens: Set[str], extra_ids: Iterable[str] = ()) -> None:
+        """
+        Re-score every bookmark holding a changed token (plus extra_ids).
+        """
+        affected = set(i for i in extra_ids if i in self.items)
+        for t in changed_tokens:
+            affected |= self.postings.get(t, set())
+        self._rescore(affected)
+        if len(self._heap) > 4 * len(self.items) + 64:
+            self._heap = [(-round(self.scores[i], SCORE_DECIMALS), self.items[i][0], i) for i in self.items]
+            heapq.heapify(self._heap)
+
+    # --- queries --------------------------------------------------------------
+
+    def outlier(self) -> Optional[str]:
+        """
+        Id of the highest-scoring bookmark (earliest on ties), skipping
+        heap entries made stale by later updates.
+        """
+        heap = self._heap
+        while heap:
+            neg_score, seq, item_id = heap[0]
+            item = self.items.get(item_id)
+            if (item is not None and item[0] == seq
+                    and -neg_score == round(self.scores[item_id], SCORE_DECIMALS)):
+                return item_id
+            heapq.heappop(heap)
+        return None
+
+    def labels(self) -> Dict[str, Tuple[str, str]]:
+        if len(self.items) < MIN_FOLDER_ITEMS:
+            return {i: ("✅ Normal", "Not enough data to evaluate") for i in self.items}
+        outlier = self.outlier()
+        return {
+            i: ("🌠 Outlier", "Least similar to others (heuristic)") if i == outlier
+            else ("✅ Normal", "Similar to others (heuristic)")
+            for i in self.items
+        }
+
+    # --- persistence ----------------------------------------------------------
+
+    @classmethod
+    def from_rows(cls, next_seq: int, rows: Iterable[Tuple[str, int, str, Tuple[str, ...], Optional[float]]]
+                  ) -> "FolderState":
+        """
+        Rebuild a state from stored (id, seq, hash, tokens, score) rows.
+        Stored scores are used as they are; only rows without one are
+        scored (and marked for writing).
+        """
+        state = cls()
+        state.next_seq = next_seq
+        unscored = []
+        for item_id, seq, digest, tokens, score in rows:
+            state.items[item_id] = (seq, digest, tokens)
+            for t in tokens:
+                state.df[t] = state.df.get(t, 0) + 1
+                state.postings.setdefault(t, set()).add(item_id)
+            if score is None:
+                unscored.append(item_id)
+            else:
+                state.scores[item_id] = score
+        state._heap = [(-round(score, SCORE_DECIMALS), state.items[i][0], i) for i, score in state.scores.items()]
+        heapq.heapify(state._heap)
+        state._rescore(unscored)
+        return state
+
+
+class OutlierStateUnavailable(Exception):
+    """
+    No shared outlier state database is configured or it can't be opened.
+    """
+
+
+class OutlierStateStore:
+    """
+    (user_key, folder) -> FolderState in SQLite, with an in-process LRU of
+    loaded states. Folders carry a version: a cached state is reused only
+    while it matches the stored one, so a folder changed by another
+    process or instance is reloaded rather than overwritten.
+    """
+
+    def __init__(self, path: str, max_cached: int = OUTLIER_STATE_CACHE_SIZE):
+        self.lock = Lock()
+        self.max_cached = max(1, max_cached)
+        self._cache: "OrderedDict[Tuple[str, str], FolderState]" = OrderedDict()
+        # autocommit; transactions are opened explicitly in transaction()
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False, isolation_level=None)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS outlier_folder (
+                user_key TEXT NOT NULL,
+                folder   TEXT NOT NULL,
+                next_seq INTEGER NOT NULL,
+                version  INTEGER NOT NULL,
+                PRIMARY KEY (user_key, folder)
+            );
+            CREATE TABLE IF NOT EXISTS outlier_item (
+                user_key TEXT NOT NULL,
+                folder   TEXT NOT NULL,
+                item_id  TEXT NOT NULL,
+                seq      INTEGER NOT NULL,
+                digest   TEXT NOT NULL,
+                tokens   TEXT NOT NULL,
+                score    REAL,
+                PRIMARY KEY (user_key, folder, item_id)
+            );
+            CREATE TABLE IF NOT EXISTS outlier_clock (
+                id      INTEGER PRIMARY KEY CHECK (id = 0),
+                version INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO outlier_clock (id, version) VALUES (0, 0);
+            """
+        )
+
+    def _remember(self, key: Tuple[str, str], state: FolderState) -> None:
+        self._cache[key] = state
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+    @contextmanager
+    def transaction(self, user_key: str) -> Iterator[None]:
+        """
+        Hold the database write lock for one delta, so concurrent deltas
+        (other threads, processes or instances) are serialized. On error
+        nothing is written and the user's cached states are dropped.
+        """
+        with self.lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                for key in [key for key in self._cache if key[0] == user_key]:
+                    del self._cache[key]
+                raise
+
+    def folders(self, user_key: str) -> List[str]:
+        return sorted((row[0] for row in self._conn.execute(
+            "SELECT folder FROM outlier_folder WHERE user_key = ?", (user_key,))), key=str)
+
+    def _load(self, user_key: str, folder: str, next_seq: int, version: int) -> FolderState:
+        state = FolderState.from_rows(next_seq, (
+            (item_id, seq, digest, tuple(json.loads(tokens)), score)
+            for item_id, seq, digest, tokens, score in self._conn.execute(
+                "SELECT item_id, seq, digest, tokens, score FROM outlier_item WHERE user_key = ? AND folder = ?",
+                (user_key, folder),
+            )
+        ))
+        state.version = version
+        return state
+
+    def get(self, user_key: str, folder: str) -> FolderState:
+        key = (user_key, folder)
+        row = self._conn.execute(
+            "SELECT next_seq, version FROM outlier_folder WHERE user_key = ? AND folder = ?", key
+        ).fetchone()
+        state = self._cache.get(key)
+        if row is None:
+            state = FolderState()
+        elif state is None or state.version != row[1]:
+            state = self._load(user_key, folder, *row)
+        self._remember(key, state)
+        return state
+
+    def save(self, user_key: str, folder: str, state: FolderState) -> None:
+        """
+        Write the bookmarks added, removed or re-scored since the last save
+        and give the folder the next version from the database-wide clock.
+        """
+        key = (user_key, folder)
+        for item_id in state.dirty_items:
+            item = state.items.get(item_id)
+            if item is None:
+                self._conn.execute(
+                    "DELETE FROM outlier_item WHERE user_key = ? AND folder = ? AND item_id = ?",
+                    (user_key, folder, item_id),
+                )
+            else:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO outlier_item (user_key, folder, item_id, seq, digest, tokens, score) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (user_key, folder, item_id, item[0], item[1], json.dumps(item[2]), state.scores.get(item_id)),
+                )
+        state.dirty_items = set()
+
+        self._conn.execute("UPDATE outlier_clock SET version = version + 1 WHERE id = 0")
+        state.version = self._conn.execute("SELECT version FROM outlier_clock WHERE id = 0").fetchone()[0]
+        if state.items:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO outlier_folder (user_key, folder, next_seq, version) VALUES (?, ?, ?, ?)",
+                (user_key, folder, state.next_seq, state.version),
+            )
+        else:
+            self._conn.execute("DELETE FROM outlier_folder WHERE user_key = ? AND folder = ?", key)
+        self._remember(key, state)
+
+
+_store: Optional[OutlierStateStore] = None
+_store_lock = Lock()
+
+
+def get_state_store() -> OutlierStateStore:
+    """
+    The process-wide store. Raises OutlierStateUnavailable when
+    OUTLIER_STATE_DB_PATH isn't set or can't be opened.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            if not OUTLIER_STATE_DB_PATH:
+                raise OutlierStateUnavailable(
+                    "Incremental mode needs OUTLIER_STATE_DB_PATH set to a database on "
+                    "storage shared by every instance."
+                )
+            try:
+                _store = OutlierStateStore(OUTLIER_STATE_DB_PATH)
+            except sqlite3.Error as e:
+                logger.warning("OutlierFinder: outlier state db unavailable at %s",
+                               OUTLIER_STATE_DB_PATH, exc_info=True)
+                raise OutlierStateUnavailable("Outlier state database is unavailable.") from e
+        return _store
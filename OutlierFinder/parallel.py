@@ -0,0 +1,97 @@
+"""
+Run independent per-folder jobs on a process pool.
+
+Folders are sharded by size (largest first, each onto the least loaded
+shard) so one huge folder doesn't sit behind a queue of small ones, and
+results come back in job order whatever order the shards finish in.
+Shards run on the app's shared process pool (shared_code.process_pool).
+"""
+import heapq
+import os
+import time
+from concurrent.futures import TimeoutError as FuturesTimeout, wait
+from typing import Any, Callable, List, Sequence
+
+from shared_code import process_pool
+
+# Worker processes to spread a request over (0 = the whole shared pool)
+OUTLIER_WORKERS = int(os.environ.get("OUTLIER_WORKERS", "0"))
+
+# Below this many items in total the pool's overhead isn't worth it
+PARALLEL_MIN_ITEMS = 5000
+
+# Shards per worker: a few more than workers evens out uneven shards
+SHARDS_PER_WORKER = 4
+
+# Returned for jobs that were still running when the deadline passed
+TIMED_OUT = object()
+
+
+def worker_count() -> int:
+    return OUTLIER_WORKERS if OUTLIER_WORKERS > 0 else process_pool.pool_size()
+
+
+def shard_by_size(sizes: Sequence[int], n_shards: int) -> List[List[int]]:
+    """
+    Greedy longest-processing-time split of job indexes into n_shards
+    lists with roughly equal total size. Empty shards are dropped.
+    """
+    heap = [(0, s) for s in range(max(1, n_shards))]
+    shards: List[List[int]] = [[] for _ in heap]
+    for idx in sorted(range(len(sizes)), key=lambda i: -sizes[i]):
+        load, s = heapq.heappop(heap)
+        shards[s].append(idx)
+        heapq.heappush(heap, (load + sizes[idx], s))
+    return [sorted(shard) for shard in shards if shard]
+
+
+def _run_inline(shard_fn: Callable, jobs: Sequence[Any], deadline: float) -> List[Any]:
+    results: List[Any] = []
+    for job in jobs:
+        if time.monotonic() > deadline:
+            results.append(TIMED_OUT)
+        else:
+            results.extend(shard_fn([job]))
+    return results
+
+
+def run_jobs(shard_fn: Callable, jobs: Sequence[Any], sizes: Sequence[int], deadline: float) -> List[Any]:
+    """
+    Apply `shard_fn(list_of_jobs) -> list_of_results` to every job and
+    return one result per job, in job order. shard_fn must be a picklable
+    module-level function. Jobs not finished by `deadline` (a
+    time.monotonic() value) get TIMED_OUT, and any shard still running
+    then is killed along with its pool. Small workloads, and hosts
+    without a usable pool, run inline.
+    """
+    if not jobs:
+        return []
+    pool = process_pool.get_pool() if sum(sizes) >= PARALLEL_MIN_ITEMS and worker_count() > 1 else None
+    if pool is None:
+        return _run_inline(shard_fn, jobs, deadline)
+
+    shards = shard_by_size(sizes, worker_count() * SHARDS_PER_WORKER)
+    try:
+        futures = {pool.submit(shard_fn, [jobs[i] for i in shard]): shard for shard in shards}
+    except (*process_pool.POOL_FAILURES, RuntimeError):
+        process_pool.reset_pool(pool)
+        return _run_inline(shard_fn, jobs, deadline)
+
+    results: List[Any] = [TIMED_OUT] * len(jobs)
+    done, not_done = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+    # cancel() only drops shards still queued; one already on a worker
+    # would keep it busy for the next request, so the pool goes with it
+    if [future for future in not_done if not future.cancel()]:
+        process_pool.reset_pool(pool)
+
+    for future in done:
+        shard = futures[future]
+        try:
+            shard_results = future.result()
+        except (*process_pool.POOL_FAILURES, FuturesTimeout):
+            # A dead worker takes the whole pool with it; redo this shard here
+            process_pool.reset_pool(pool)
+            shard_results = _run_inline(shard_fn, [jobs[i] for i in shard], deadline)
+        for i, result in zip(shard, shard_results):
+            results[i] = result
+    return results
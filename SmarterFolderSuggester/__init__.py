@@ -2,6 +2,11 @@ import logging
 import azure.functions as func
 import json
 import re
+from typing import NamedTuple
+
+from .batch import batch_backend, classify_batch
+from .result_cache import classification_key, get_classification_cache
+from .taxonomy_cache import TaxonomyCache, TaxonomyEntry, TaxonomyError, taxonomy_key
 
 # Full category map (preserved from original Flask source)
 CATEGORIES = {
@@ -113,6 +118,13 @@ CATEGORIES = {
 # allow 2+ chars so "ai", "ev" etc survive
 _TOKEN_RE = re.compile(r"[a-z0-9]{2,}", re.I)
 
+def parse_bool(value, default: bool) -> bool:
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "y")
+
 def normalize_text(*parts: str) -> str:
     raw = " ".join([p for p in parts if p])
     raw = raw.lower()
@@ -120,6 +132,19 @@ def normalize_text(*parts: str) -> str:
     raw = re.sub(r"[^a-z0-9]+", " ", raw)
     return " ".join(raw.split())
 
+def normalize_texts(rows: list) -> list:
+    """
+    normalize_text(*parts) for every row of parts, with one lower() and one
+    substitution over all rows joined by NUL instead of one per row.
+    """
+    raws = [" ".join([p for p in parts if p]) for parts in rows]
+    blob = "\0".join(raws)
+    if not raws or blob.count("\0") != len(raws) - 1:
+        # no rows, or a NUL inside the text itself: go row by row
+        return [normalize_text(*parts) for parts in rows]
+    blob = re.sub(r"[^a-z0-9\0]+", " ", blob.lower())
+    return [text.strip() for text in blob.split("\0")]
+
 def score_match(text_norm: str, tokens: set[str], keywords: list[str]) -> tuple[int, list[str]]:
     """
     Score:
@@ -143,26 +168,117 @@ def score_match(text_norm: str, tokens: set[str], keywords: list[str]) -> tuple[
                 hits.append(kw)
     return score, hits
 
-def match_folder_category_scored(text_norm: str, hint_category: str | None = None):
-    tokens = set(_TOKEN_RE.findall(text_norm))
+class CompiledTaxonomy(NamedTuple):
+    """
+    CATEGORIES-shaped taxonomy compiled for fast scoring.
+
+    labels:      [(parent, subcat)] in taxonomy order; index = subcat id
+    token_index: single-word keyword -> [(subcat id, keyword position, kw)]
+    phrases:     [(phrase, [(subcat id, keyword position, kw)])], each
+                 distinct phrase once even if several subcats list it
+    parents:     parent -> [subcat ids]
+    """
+    labels: list
+    token_index: dict
+    phrases: list
+    parents: dict
 
-    best = (None, None, 0, [])   # (parent, subcat, score, hits)
-    second_score = 0
 
-    cats = CATEGORIES.items()
-    if hint_category and hint_category in CATEGORIES:
-        cats = [(hint_category, CATEGORIES[hint_category])]
+def compile_taxonomy(categories: dict) -> CompiledTaxonomy:
+    """
+    Build the inverted index used by match_folder_category_scored(), with the
+    same keyword rules as score_match(): lowercase + strip, skip empties,
+    keywords containing a space are phrases (+2), the rest tokens (+1).
+    """
+    labels = []
+    token_index: dict = {}
+    phrase_index: dict = {}
+    parents: dict = {}
 
-    for parent, subcats in cats:
+    for parent, subcats in categories.items():
+        parents.setdefault(parent, [])
         for subcat, keywords in subcats.items():
-            score, hits = score_match(text_norm, tokens, keywords)
-            if score > best[2]:
-                second_score = best[2]
-                best = (parent, subcat, score, hits)
-            elif score > second_score:
-                second_score = score
-
-    parent, subcat, score, hits = best
+            sid = len(labels)
+            labels.append((parent, subcat))
+            parents[parent].append(sid)
+            for pos, kw in enumerate(keywords):
+                kw = kw.lower().strip()
+                if not kw:
+                    continue
+                index = phrase_index if " " in kw else token_index
+                index.setdefault(kw, []).append((sid, pos, kw))
+
+    return CompiledTaxonomy(labels, token_index, list(phrase_index.items()), parents)
+
+
+_COMPILED = compile_taxonomy(CATEGORIES)
+
+# Keyed by content, so editing CATEGORIES also invalidates memoized results
+_DEFAULT_TAXONOMY = TaxonomyEntry(taxonomy_key(CATEGORIES), _COMPILED, _TOKEN_RE)
+
+# Tenant taxonomies sent with the request, compiled once per worker
+_TAXONOMY_CACHE = TaxonomyCache(compile_taxonomy, _TOKEN_RE)
+
+
+def score_compiled(compiled: CompiledTaxonomy, text_norm: str, tokens: set[str],
+                   hint_category: str | None = None):
+    """
+    Score every subcategory at once from the inverted index: cost grows with
+    the bookmark's tokens (plus one substring scan per distinct phrase), not
+    with the total number of keywords.
+    Returns (parent, subcat, score, hits, second_score) exactly as the
+    per-subcategory score_match() loop would pick them.
+    """
+    allowed = None
+    if hint_category and hint_category in compiled.parents:
+        allowed = compiled.parents[hint_category]
+
+    scores: dict = {}
+    hits: dict = {}
+
+    for tok in tokens:
+        for sid, pos, kw in compiled.token_index.get(tok, ()):
+            scores[sid] = scores.get(sid, 0) + 1
+            hits.setdefault(sid, []).append((pos, kw))
+
+    for phrase, entries in compiled.phrases:
+        if phrase in text_norm:
+            for sid, pos, kw in entries:
+                scores[sid] = scores.get(sid, 0) + 2
+                hits.setdefault(sid, []).append((pos, kw))
+
+    if allowed is not None:
+        allowed_set = set(allowed)
+        candidates = sorted(sid for sid in scores if sid in allowed_set)
+    else:
+        candidates = sorted(scores)
+
+    # Same strict ">" walk in taxonomy order as the original loop, so ties
+    # still go to the first subcategory; zero-score subcats never change it.
+    best_sid, best_score, second_score = None, 0, 0
+    for sid in candidates:
+        score = scores[sid]
+        if score > best_score:
+            second_score = best_score
+            best_sid, best_score = sid, score
+        elif score > second_score:
+            second_score = score
+
+    if best_sid is None:
+        return None, None, 0, [], second_score
+
+    parent, subcat = compiled.labels[best_sid]
+    best_hits = [kw for _, kw in sorted(hits[best_sid])]
+    return parent, subcat, best_score, best_hits, second_score
+
+
+def match_folder_category_scored(text_norm: str, hint_category: str | None = None,
+                                 compiled: CompiledTaxonomy | None = None):
+    tokens = set(_TOKEN_RE.findall(text_norm))
+
+    parent, subcat, score, hits, second_score = score_compiled(
+        compiled or _COMPILED, text_norm, tokens, hint_category
+    )
     if score <= 0:
         return None, "", 0.0, "No strong match"
 
@@ -215,18 +331,37 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             )
 
         # --- parse flags and params ---
-        only_outliers_raw = data.get("only_outliers", True)
-        if isinstance(only_outliers_raw, bool):
-            only_outliers = only_outliers_raw
-        else:
-            only_outliers = str(only_outliers_raw).strip().lower() in ("1", "true", "yes", "y")
+        only_outliers = parse_bool(data.get("only_outliers"), True)
 
         try:
             min_conf = float(data.get("min_conf", 0.70))
         except Exception:
             min_conf = 0.70
 
-        # --- main loop ---
+        # "engine": "batch" -> classify the whole request as one matrix product
+        engine = str(data.get("engine") or "loop").strip().lower()
+
+        # optional tenant taxonomy, same shape as CATEGORIES
+        custom_taxonomy = data.get("taxonomy")
+        taxonomy_hit = None
+        if custom_taxonomy is None:
+            taxonomy = _DEFAULT_TAXONOMY
+        else:
+            try:
+                taxonomy, taxonomy_hit = _TAXONOMY_CACHE.get(custom_taxonomy)
+            except TaxonomyError as e:
+                logging.error(f"Bad payload: {e}")
+                return func.HttpResponse(
+                    json.dumps({"error": str(e)}),
+                    mimetype="application/json",
+                    status_code=400
+                )
+
+        # memoized results for unchanged bookmarks (opt-out with "use_cache": false)
+        cache = get_classification_cache() if parse_bool(data.get("use_cache"), True) else None
+
+        # --- pick rows to classify ---
+        pending = []   # (bookmark, title, desc, url, hint)
         for bm in bookmarks:
             # ✅ schema-flexible (works with your Flask rows too)
             url = bm.get("url", "")
@@ -240,11 +375,44 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 bm["smarter_folder_conf"] = 0.0
                 continue
 
-            text_norm = normalize_text(title, desc, url)
-            parent, subcat, conf, reason = match_folder_category_scored(
-                text_norm, hint_category=hint_cat or None
+            pending.append((bm, title, desc, url, hint_cat))
+
+        # --- memo lookup ---
+        keys = []
+        memo = {}
+        if cache is not None:
+            # Key on what the classifier sees: normalize_texts() drops empty
+            # parts, so a missing field and "" are the same input
+            keys = [classification_key(title or "", desc or "", url or "", hint, taxonomy.key)
+                    for _, title, desc, url, hint in pending]
+            memo = cache.get_many(keys)
+        todo = [i for i in range(len(pending)) if not keys or keys[i] not in memo]
+
+        # --- classify the rest ---
+        texts = normalize_texts([pending[i][1:4] for i in todo])
+        hints = [pending[i][4] or None for i in todo]
+        if engine == "batch":
+            fresh = classify_batch(
+                taxonomy.keyword_matrix(),
+                texts,
+                hints,
+                fallback=lambda t, h: match_folder_category_scored(
+                    t, hint_category=h, compiled=taxonomy.compiled
+                ),
             )
+        else:
+            fresh = [
+                match_folder_category_scored(text_norm, hint_category=hint, compiled=taxonomy.compiled)
+                for text_norm, hint in zip(texts, hints)
+            ]
 
+        classified = [memo.get(key) for key in keys] if keys else [None] * len(pending)
+        for i, result in zip(todo, fresh):
+            classified[i] = result
+        if cache is not None:
+            cache.put_many((keys[i], result) for i, result in zip(todo, fresh))
+
+        for (bm, *_), (parent, subcat, conf, reason) in zip(pending, classified):
             if conf >= min_conf and subcat:
                 # ✅ keep existing field for merging
                 bm["smarter_folder"] = f"{parent} > {subcat}" if parent else subcat
@@ -255,8 +423,25 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 bm["smarter_folder_reason"] = f"Below min_conf ({conf:.2f} < {min_conf:.2f})"
                 bm["smarter_folder_conf"] = conf
 
+        payload = {"results": bookmarks}
+        if engine == "batch":
+            payload["engine"] = f"batch:{batch_backend(taxonomy.keyword_matrix())}"
+        if cache is not None:
+            payload["cache"] = {
+                "hits": len(pending) - len(todo),
+                "misses": len(todo),
+                "process": cache.stats(),
+            }
+        if custom_taxonomy is not None:
+            payload["taxonomy"] = {
+                "key": taxonomy.key[:16],
+                "cache_hit": taxonomy_hit,
+                "compile_ms": 0.0 if taxonomy_hit else round(taxonomy.compile_ms, 3),
+                "cache": _TAXONOMY_CACHE.stats(),
+            }
+
         return func.HttpResponse(
-            json.dumps({"results": bookmarks}),
+            json.dumps(payload),
             mimetype="application/json",
             status_code=200
         )
@@ -0,0 +1,192 @@
+"""
+Memo of per-bookmark classification results for SmarterFolderSuggester.
+
+Users re-run Smarter Folder on libraries that barely change between runs,
+so (parent, subcat, conf, reason) is remembered per bookmark content and
+taxonomy. Entries live in a bounded in-process LRU; if
+CLASSIFICATION_CACHE_DB_PATH is set they are also written to SQLite so a
+fresh worker starts warm.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Bump when scoring or confidence rules change: old entries stop matching
+CLASSIFIER_VERSION = "1"
+
+# In-process entries kept per worker
+CLASSIFICATION_CACHE_SIZE = int(os.environ.get("CLASSIFICATION_CACHE_SIZE", "200000"))
+
+# Optional on-disk copy (unset = memory only)
+CLASSIFICATION_CACHE_DB_PATH = os.environ.get("CLASSIFICATION_CACHE_DB_PATH", "")
+
+# Rows kept on disk; the least recently written are pruned beyond this
+CLASSIFICATION_DB_MAX_ROWS = int(os.environ.get("CLASSIFICATION_DB_MAX_ROWS", "1000000"))
+
+# Prune the file only after this many writes (the prune query scans the index)
+_PRUNE_EVERY = 10000
+
+# SQLite's default host-parameter limit is 999; stay well below it
+_LOOKUP_CHUNK = 500
+
+Result = Tuple[Optional[str], str, float, str]
+
+logger = logging.getLogger(__name__)
+
+
+def classification_key(title: str, desc: str, url: str, hint: str, taxonomy_version: str) -> str:
+    """
+    Hash of everything a classification depends on. Pass the fields as the
+    classifier gets them (a missing one as "", never str(None)). They are
+    separated by a control character so ("ab", "c") and ("a", "bc") differ.
+    """
+    blob = "\x1f".join((CLASSIFIER_VERSION, taxonomy_version, title, desc, url, hint))
+    return hashlib.blake2b(blob.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ClassificationCache:
+    """
+    LRU of key -> (parent, subcat, conf, reason) with an optional SQLite
+    backing file. Thread-safe. Disk failures only disable persistence.
+    """
+
+    def __init__(self, max_entries: int = CLASSIFICATION_CACHE_SIZE,
+                 db_path: str = CLASSIFICATION_CACHE_DB_PATH):
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._entries: "OrderedDict[str, Result]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes_since_prune = 0
+        if db_path:
+            try:
+                self._conn = self._open(db_path)
+            except Exception:
+                logger.warning("SmarterFolderSuggester: classification cache file unavailable at %s",
+                               db_path, exc_info=True)
+
+    @staticmethod
+    def _open(path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS classification (
+                cache_key  TEXT PRIMARY KEY,
+                parent     TEXT,
+                subcat     TEXT NOT NULL,
+                conf       REAL NOT NULL,
+                reason     TEXT NOT NULL,
+                written_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS classification_written ON classification (written_at)")
+        conn.commit()
+        return conn
+
+    def _remember(self, key: str, result: Result) -> None:
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Result]:
+        """
+        Return {key: result} for every cached key; misses are absent.
+        """
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, Result] = {}
+
+        with self._lock:
+            missing: List[str] = []
+            for key in keys:
+                result = self._entries.get(key)
+                if result is None:
+                    missing.append(key)
+                else:
+                    self._entries.move_to_end(key)
+                    found[key] = result
+
+            if missing and self._conn is not None:
+                try:
+                    for i in range(0, len(missing), _LOOKUP_CHUNK):
+                        chunk = missing[i:i + _LOOKUP_CHUNK]
+                        placeholders = ",".join("?" * len(chunk))
+                        for key, parent, subcat, conf, reason in self._conn.execute(
+                            "SELECT cache_key, parent, subcat, conf, reason FROM classification "
+                            f"WHERE cache_key IN ({placeholders})",
+                            chunk,
+                        ):
+                            found[key] = (parent, subcat, conf, reason)
+                            self._remember(key, found[key])
+                except sqlite3.Error:
+                    logger.warning("SmarterFolderSuggester: classification cache read failed", exc_info=True)
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, entries: Iterable[Tuple[str, Result]]) -> None:
+        entries = list(entries)
+        if not entries:
+            return
+
+        with self._lock:
+            for key, result in entries:
+                self._remember(key, result)
+
+            if self._conn is None:
+                return
+            now = time.time()
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO classification "
+                    "(cache_key, parent, subcat, conf, reason, written_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(key, parent, subcat, conf, reason, now)
+                     for key, (parent, subcat, conf, reason) in entries],
+                )
+                # Entries for an old taxonomy never match again; age them out
+                self._writes_since_prune += len(entries)
+                if self._writes_since_prune >= _PRUNE_EVERY:
+                    self._writes_since_prune = 0
+                    self._conn.execute(
+                        "DELETE FROM classification WHERE cache_key IN ("
+                        " SELECT cache_key FROM classification ORDER BY written_at DESC LIMIT -1 OFFSET ?)",
+                        (CLASSIFICATION_DB_MAX_ROWS,),
+                    )
+                self._conn.commit()
+            except sqlite3.Error:
+                logger.warning("SmarterFolderSuggester: classification cache write failed", exc_info=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "persistent": self._conn is not None,
+            }
+
+
+_cache: Optional[ClassificationCache] = None
+_cache_lock = Lock()
+
+
+def get_classification_cache() -> ClassificationCache:
+    """
+    Lazily create the process-wide cache.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ClassificationCache()
+        return _cache
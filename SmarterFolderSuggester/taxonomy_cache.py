@@ -0,0 +1,123 @@
+"""
+Per-request custom taxonomies for SmarterFolderSuggester.
+
+A tenant can send its own CATEGORIES-shaped tree (parent -> subcat ->
+[keywords]). Compiling it costs far more than scoring a handful of
+bookmarks, so compiled taxonomies are kept in a small in-process LRU keyed
+by a hash of their content.
+"""
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Optional, Tuple
+
+from .batch import KeywordMatrix
+
+# Compiled taxonomies kept per worker process
+TAXONOMY_CACHE_SIZE = int(os.environ.get("TAXONOMY_CACHE_SIZE", "32"))
+
+# Upper bound on keywords in one request taxonomy (keeps compile time sane)
+MAX_TAXONOMY_KEYWORDS = 20000
+
+
+class TaxonomyError(ValueError):
+    """
+    The request's taxonomy is not parent -> subcat -> [keywords].
+    """
+
+
+def validate_taxonomy(taxonomy) -> None:
+    if not isinstance(taxonomy, dict) or not taxonomy:
+        raise TaxonomyError("taxonomy must be a non-empty object of parent -> subcategories")
+
+    total = 0
+    for parent, subcats in taxonomy.items():
+        if not isinstance(subcats, dict):
+            raise TaxonomyError(f"taxonomy[{parent!r}] must be an object of subcategory -> keywords")
+        for subcat, keywords in subcats.items():
+            if not isinstance(keywords, list) or not all(isinstance(k, str) for k in keywords):
+                raise TaxonomyError(f"taxonomy[{parent!r}][{subcat!r}] must be a list of strings")
+            total += len(keywords)
+
+    if total > MAX_TAXONOMY_KEYWORDS:
+        raise TaxonomyError(f"taxonomy has {total} keywords (max {MAX_TAXONOMY_KEYWORDS})")
+
+
+def taxonomy_key(taxonomy: dict) -> str:
+    """
+    Content hash of a taxonomy. Key order is kept, not sorted: it decides
+    which subcategory wins a tie, so reordered trees are different taxonomies.
+    """
+    blob = json.dumps(taxonomy, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class TaxonomyEntry:
+    """
+    One compiled taxonomy plus its batch weight matrix (built on first use).
+    """
+
+    def __init__(self, key: str, compiled, token_re, compile_ms: float = 0.0):
+        self.key = key
+        self.compiled = compiled
+        self.token_re = token_re
+        self.compile_ms = compile_ms
+        self._matrix: Optional[KeywordMatrix] = None
+        self._lock = Lock()
+
+    def keyword_matrix(self) -> KeywordMatrix:
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = KeywordMatrix(self.compiled, self.token_re)
+            return self._matrix
+
+
+class TaxonomyCache:
+    """
+    LRU of TaxonomyEntry by taxonomy_key(). Thread-safe; compilation runs
+    outside the lock, so two requests racing on a new taxonomy may both
+    compile it and the last one wins.
+    """
+
+    def __init__(self, compile_fn: Callable, token_re, max_entries: int = TAXONOMY_CACHE_SIZE):
+        self.compile_fn = compile_fn
+        self.token_re = token_re
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._entries: "OrderedDict[str, TaxonomyEntry]" = OrderedDict()
+
+    def get(self, taxonomy: dict) -> Tuple[TaxonomyEntry, bool]:
+        """
+        Return (entry, cache_hit). Raises TaxonomyError for a malformed tree.
+        """
+        validate_taxonomy(taxonomy)
+        key = taxonomy_key(taxonomy)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry, True
+            self.misses += 1
+
+        t0 = time.perf_counter()
+        compiled = self.compile_fn(taxonomy)
+        entry = TaxonomyEntry(key, compiled, self.token_re,
+                              compile_ms=(time.perf_counter() - t0) * 1000)
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
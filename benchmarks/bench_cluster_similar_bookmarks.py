@@ -0,0 +1,106 @@
+"""
+Benchmark ClusterSimilarBookmarks' sharded engine across worker counts.
+
+Builds synthetic bookmarks: topics with their own vocabulary, each
+hosted on a handful of domains, plus Zipf-distributed common words.
+Times the single-process exact engine, then cluster_sharded() with 1, 2,
+4, ... workers up to the CPU count (or --workers). It checks that every
+worker count returns the same labels and reports how often the sharded
+grouping agrees with the single pass on whether two sampled bookmarks
+share a group.
+
+Example:
+    python benchmarks/bench_cluster_similar_bookmarks.py --rows 50000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import ClusterSimilarBookmarks as clusterer  # noqa: E402
+from ClusterSimilarBookmarks import parallel  # noqa: E402
+from ClusterSimilarBookmarks.exact import cluster_exact  # noqa: E402
+from shared_code import process_pool  # noqa: E402
+
+
+def build_payload(n: int, rng: random.Random):
+    common = ["common%03d" % i for i in range(500)]
+    weights = [1.0 / (i + 1) for i in range(len(common))]
+    n_topics = max(1, n // 50)
+    topics = [["topic%d_%d" % (k, i) for i in range(120)] for k in range(n_topics)]
+    domains = [["site%d.example.com" % rng.randrange(n_topics * 2) for _ in range(3)] for _ in range(n_topics)]
+    bookmarks = []
+    for i in range(n):
+        k = rng.randrange(n_topics)
+        words = rng.sample(topics[k], 30) + rng.choices(common, weights, k=30)
+        bookmarks.append({
+            "url": "https://%s/page/%d" % (rng.choice(domains[k]), i),
+            "url_content": " ".join(words),
+        })
+    return bookmarks
+
+
+def pair_agreement(a, b, rng: random.Random, samples: int = 200000) -> float:
+    n = len(a)
+    agree = 0
+    for _ in range(samples):
+        i, j = rng.randrange(n), rng.randrange(n)
+        agree += (a[i] == a[j]) == (b[i] == b[j])
+    return agree / samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark sharded ClusterSimilarBookmarks clustering.")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="largest worker count to time")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    bookmarks = build_payload(args.rows, random.Random(args.seed))
+    threshold = clusterer.CLUSTER_THRESHOLD
+
+    t0 = time.perf_counter()
+    single = cluster_exact([clusterer.tokenize(bm["url_content"]) for bm in bookmarks], threshold)
+    single_s = time.perf_counter() - t0
+
+    counts, w = [], 1
+    while w < args.workers:
+        counts.append(w)
+        w *= 2
+    counts.append(args.workers)
+
+    # One shared pool big enough for the largest count; each run caps
+    # how many of its workers it uses
+    process_pool.PROCESS_POOL_WORKERS = args.workers
+    process_pool.reset_pool()
+
+    print("rows:              %d" % args.rows)
+    print("shards:            %d" % parallel.CLUSTER_SHARDS)
+    print("single process:    %.3fs  (%d groups)" % (single_s, len(set(single))))
+
+    baseline_s, reference = None, None
+    for workers in counts:
+        # warm the pool so worker start-up isn't timed
+        parallel.cluster_sharded(bookmarks[:parallel.PARALLEL_MIN_ITEMS], threshold, clusterer.tokenize, workers)
+        t0 = time.perf_counter()
+        labels = parallel.cluster_sharded(bookmarks, threshold, clusterer.tokenize, workers)
+        elapsed = time.perf_counter() - t0
+        if reference is None:
+            baseline_s, reference = elapsed, labels
+        elif labels != reference:
+            raise RuntimeError("labels differ with %d workers" % workers)
+        print("sharded, %2d workers: %.3fs  (%.1fx vs 1 worker, %d groups)"
+              % (workers, elapsed, baseline_s / elapsed, len(set(labels))))
+
+    print("same labels for every worker count")
+    print("pair agreement with single process: %.2f%%"
+          % (100.0 * pair_agreement(single, reference, random.Random(args.seed))))
+    process_pool.get_pool().shutdown()
+
+
+if __name__ == "__main__":
+    main()
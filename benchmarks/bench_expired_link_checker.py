@@ -0,0 +1,318 @@
+"""
+Offline throughput benchmark for ExpiredLinkChecker.main.
+
+Starts benchmarks/stub_server.py in a subprocess (so its threads and memory
+don't pollute the measurements), builds synthetic bookmark payloads against
+its virtual hosts and drives main() in-process with each engine.
+
+Reports per run: URLs/sec, p50/p99 per-URL probe latency (timed around the
+probe call, so it includes waiting for a per-host/global slot), peak thread
+count and peak memory (tracemalloc peak if --tracemalloc, else the process RSS
+high-water mark, which never goes down between runs).
+
+Examples:
+    python benchmarks/bench_expired_link_checker.py --sizes 1000,10000
+    python benchmarks/bench_expired_link_checker.py --sizes 100000 \\
+        --engines threads,async --latency lognormal:40,0.8 --hosts 200 \\
+        --mix ok=0.85,404=0.05,410=0.01,500=0.03,redirect=0.03,hang=0.01,reset=0.02
+"""
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import azure.functions as func  # noqa: E402
+
+import ExpiredLinkChecker as checker  # noqa: E402
+from ExpiredLinkChecker import async_engine, status_store, tls  # noqa: E402
+
+DEFAULT_MIX = "ok=0.90,404=0.04,410=0.01,500=0.02,redirect=0.02,reset=0.01"
+
+
+# --- Stub server ----------------------------------------------------------------
+
+
+def make_self_signed_cert(workdir: str) -> Tuple[str, str]:
+    """
+    Self-signed cert for 127.0.0.1 via the openssl CLI.
+    """
+    certfile = os.path.join(workdir, "stub-cert.pem")
+    keyfile = os.path.join(workdir, "stub-key.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+            "-keyout", keyfile, "-out", certfile, "-days", "1",
+            "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return certfile, keyfile
+
+
+def start_stub_server(http_hosts: int, https_hosts: int,
+                      certfile: str, keyfile: str) -> Tuple[subprocess.Popen, Dict[str, List[int]]]:
+    proc = subprocess.Popen(
+        [
+            sys.executable, os.path.join(ROOT, "benchmarks", "stub_server.py"),
+            "--http-hosts", str(http_hosts),
+            "--https-hosts", str(https_hosts),
+            "--certfile", certfile,
+            "--keyfile", keyfile,
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    line = proc.stdout.readline()
+    if not line.startswith("READY "):
+        proc.kill()
+        raise RuntimeError("stub server failed to start: %r" % line)
+    return proc, json.loads(line[len("READY "):])
+
+
+# --- Payloads -------------------------------------------------------------------
+
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    mix = []
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        mix.append((kind.strip(), float(weight)))
+    return mix
+
+
+def latency_sampler(spec: str, rng: random.Random):
+    """
+    "fixed:MS", "uniform:LO,HI", "exp:MEAN_MS" or "lognormal:MEDIAN_MS,SIGMA".
+    """
+    name, _, args = spec.partition(":")
+    vals = [float(v) for v in args.split(",") if v]
+    if name == "fixed":
+        return lambda: vals[0]
+    if name == "uniform":
+        return lambda: rng.uniform(vals[0], vals[1])
+    if name == "exp":
+        return lambda: rng.expovariate(1.0 / vals[0]) if vals[0] > 0 else 0.0
+    if name == "lognormal":
+        mu = math.log(max(vals[0], 0.001))
+        return lambda: rng.lognormvariate(mu, vals[1])
+    raise ValueError("unknown latency distribution: %s" % spec)
+
+
+def build_payload(n: int, ports: Dict[str, List[int]], mix, latency, dup_ratio: float,
+                  rng: random.Random) -> List[Dict[str, str]]:
+    hosts = [("http", p) for p in ports["http"]] + [("https", p) for p in ports["https"]]
+    kinds = [k for k, _ in mix]
+    weights = [w for _, w in mix]
+
+    bookmarks = []
+    for i in range(n):
+        if bookmarks and rng.random() < dup_ratio:
+            bookmarks.append(dict(rng.choice(bookmarks)))
+            continue
+        scheme, port = rng.choice(hosts)
+        kind = rng.choices(kinds, weights)[0]
+        url = "%s://127.0.0.1:%d/%s/%d?ms=%d" % (scheme, port, kind, i, int(latency()))
+        bookmarks.append({"url": url, "title": "Bookmark %d" % i, "folder_name": "Bench"})
+    return bookmarks
+
+
+# --- Instrumentation ------------------------------------------------------------
+
+
+class LatencyRecorder:
+    """
+    Wraps the sync and async probe functions to time each call. Only
+    wraps; the real network code still runs.
+    """
+
+    def __init__(self):
+        self.samples: List[float] = []
+        self._lock = threading.Lock()
+        self._orig_sync = checker.head_with_redirects
+        self._orig_async = async_engine.AsyncProber.head_with_redirects
+
+    def install(self):
+        recorder = self
+        orig_sync, orig_async = self._orig_sync, self._orig_async
+
+        def timed_sync(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return orig_sync(*args, **kwargs)
+            finally:
+                recorder.add(time.perf_counter() - t0)
+
+        async def timed_async(self_, *args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return await orig_async(self_, *args, **kwargs)
+            finally:
+                recorder.add(time.perf_counter() - t0)
+
+        checker.head_with_redirects = timed_sync
+        async_engine.AsyncProber.head_with_redirects = timed_async
+
+    def uninstall(self):
+        checker.head_with_redirects = self._orig_sync
+        async_engine.AsyncProber.head_with_redirects = self._orig_async
+
+    def add(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+
+class ThreadSampler(threading.Thread):
+    def __init__(self, interval: float = 0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.peak = max(self.peak, threading.active_count())
+            time.sleep(self.interval)
+
+    def stop(self) -> int:
+        self._stop_event.set()
+        self.join()
+        return self.peak - 1  # don't count the sampler itself
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+# --- Runner ---------------------------------------------------------------------
+
+
+def run_once(bookmarks, engine: str, use_cache: bool, use_tracemalloc: bool) -> Dict[str, float]:
+    body = json.dumps({"bookmarks": bookmarks, "engine": engine, "use_cache": use_cache})
+    req = func.HttpRequest(method="POST", url="/api/ExpiredLinkChecker", body=body.encode("utf-8"))
+
+    recorder = LatencyRecorder()
+    recorder.install()
+    sampler = ThreadSampler()
+    if use_tracemalloc:
+        tracemalloc.start()
+    sampler.start()
+
+    t0 = time.perf_counter()
+    try:
+        resp = checker.main(req)
+    finally:
+        wall = time.perf_counter() - t0
+        peak_threads = sampler.stop()
+        recorder.uninstall()
+
+    if use_tracemalloc:
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_mb = peak_bytes / 1e6
+    else:
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak_mb = rss / 1e6 if sys.platform == "darwin" else rss / 1e3
+
+    if resp.status_code != 200:
+        raise RuntimeError("main() returned %d: %s" % (resp.status_code, resp.get_body()[:200]))
+
+    return {
+        "urls": len(bookmarks),
+        "probes": len(recorder.samples),
+        "wall_s": wall,
+        "urls_per_s": len(bookmarks) / wall if wall else 0.0,
+        "p50_ms": percentile(recorder.samples, 50) * 1000,
+        "p99_ms": percentile(recorder.samples, 99) * 1000,
+        "peak_threads": peak_threads,
+        "peak_mem_mb": peak_mb,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ExpiredLinkChecker against a local stub server.")
+    parser.add_argument("--sizes", default="1000,10000", help="comma-separated payload sizes (1k-100k)")
+    parser.add_argument("--engines", default="threads,async", help="comma-separated: threads, async")
+    parser.add_argument("--hosts", type=int, default=50, help="number of virtual hosts")
+    parser.add_argument("--https-ratio", type=float, default=0.2, help="share of virtual hosts speaking TLS")
+    parser.add_argument("--latency", default="lognormal:20,0.6", help="server latency distribution")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="response mix, kind=weight,...")
+    parser.add_argument("--dup-ratio", type=float, default=0.05, help="share of duplicate URLs in the payload")
+    parser.add_argument("--use-cache", action="store_true", help="keep the persistent status cache on")
+    parser.add_argument("--tracemalloc", action="store_true", help="measure Python heap peak (slower)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--json", action="store_true", help="print one JSON object per run")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    https_hosts = int(round(args.hosts * args.https_ratio))
+    http_hosts = max(1, args.hosts - https_hosts)
+
+    workdir = tempfile.mkdtemp(prefix="elc-bench-")
+    certfile = keyfile = ""
+    if https_hosts:
+        try:
+            certfile, keyfile = make_self_signed_cert(workdir)
+        except (OSError, subprocess.CalledProcessError):
+            print("openssl not available; benchmarking HTTP hosts only", file=sys.stderr)
+            https_hosts = 0
+        else:
+            # Every engine verifies through tls.shared_ssl_context(), which
+            # loads the default CAs (honouring SSL_CERT_FILE) once per
+            # process: point it at the stub's CA and drop any context built
+            # before this
+            os.environ["SSL_CERT_FILE"] = certfile
+            tls._context = None
+
+    # Keep benchmark runs away from the real status cache. The checker is
+    # already imported, so LINK_STATUS_DB_PATH has been read: point the
+    # store at the scratch file directly unless the caller chose a path.
+    if "LINK_STATUS_DB_PATH" not in os.environ:
+        status_store._store = status_store.LinkStatusStore(os.path.join(workdir, "status.sqlite3"))
+
+    proc, ports = start_stub_server(http_hosts, https_hosts, certfile, keyfile)
+    try:
+        mix = parse_mix(args.mix)
+        latency = latency_sampler(args.latency, rng)
+
+        if not args.json:
+            print("%-8s %8s %8s %9s %10s %9s %9s %8s %9s" % (
+                "engine", "urls", "probes", "wall_s", "urls/s", "p50_ms", "p99_ms", "threads", "mem_mb"))
+
+        for size in [int(s) for s in args.sizes.split(",") if s]:
+            bookmarks = build_payload(size, ports, mix, latency, args.dup_ratio, rng)
+            for engine in [e.strip() for e in args.engines.split(",") if e.strip()]:
+                stats = run_once(bookmarks, engine, args.use_cache, args.tracemalloc)
+                stats["engine"] = engine
+                if args.json:
+                    print(json.dumps(stats))
+                else:
+                    print("%-8s %8d %8d %9.2f %10.1f %9.1f %9.1f %8d %9.1f" % (
+                        engine, stats["urls"], stats["probes"], stats["wall_s"], stats["urls_per_s"],
+                        stats["p50_ms"], stats["p99_ms"], stats["peak_threads"], stats["peak_mem_mb"]))
+                sys.stdout.flush()
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    main()
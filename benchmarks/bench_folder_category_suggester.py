@@ -0,0 +1,111 @@
+"""
+Benchmark FolderCategorySuggester's keyword matcher against the substring
+scan it replaced.
+
+Builds synthetic bookmarks from the keyword vocabulary plus filler words
+(some of which contain keywords as substrings, e.g. "category", "happy"),
+then times suggest_category() over the whole payload for both
+implementations and one full main() call. Also reports how many
+suggestions differ: the new matcher is word-aware on purpose, so
+substring-only hits like "cat" in "category" no longer count.
+
+Example:
+    python benchmarks/bench_folder_category_suggester.py --rows 50000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import azure.functions as func  # noqa: E402
+
+import FolderCategorySuggester as suggester  # noqa: E402
+
+FILLER = (
+    "the a how to guide best top tips for your with and of in on new "
+    "category happy application timeline scattered bookshelf teapot "
+    "interesting passwords stocking datingapp"
+).split()
+
+
+def legacy_suggest_category(title, description):
+    """
+    The original implementation: one substring scan per keyword.
+    """
+    text = f"{title} {description}".lower()
+    match_counts = {}
+
+    for category, keywords in suggester.CATEGORY_KEYWORDS.items():
+        count = sum(1 for kw in keywords if kw in text)
+        if count > 0:
+            match_counts[category] = count
+
+    if not match_counts:
+        return "Uncategorized", "No keyword match"
+
+    best_match = max(match_counts, key=match_counts.get)
+    reason = ", ".join([kw for kw in suggester.CATEGORY_KEYWORDS[best_match] if kw in text])
+    return best_match, reason
+
+
+def build_payload(n: int, rng: random.Random):
+    keywords = [kw for kws in suggester.CATEGORY_KEYWORDS.values() for kw in kws]
+    bookmarks = []
+    for i in range(n):
+        words = [rng.choice(keywords) if rng.random() < 0.25 else rng.choice(FILLER)
+                 for _ in range(rng.randint(4, 14))]
+        desc = [rng.choice(FILLER) for _ in range(rng.randint(0, 30))]
+        bookmarks.append({
+            "title": " ".join(words).capitalize(),
+            "description": " ".join(desc),
+            "url": "https://example.com/%d" % i,
+        })
+    return bookmarks
+
+
+def time_calls(fn, bookmarks, repeat: int):
+    best = float("inf")
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = [fn(bm["title"], bm["description"]) for bm in bookmarks]
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark FolderCategorySuggester matching.")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3, help="best of N timing runs")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    bookmarks = build_payload(args.rows, random.Random(args.seed))
+
+    legacy_s, legacy_out = time_calls(legacy_suggest_category, bookmarks, args.repeat)
+    new_s, new_out = time_calls(suggester.suggest_category, bookmarks, args.repeat)
+    changed = sum(1 for a, b in zip(legacy_out, new_out) if a[0] != b[0])
+
+    body = json.dumps({"bookmarks": bookmarks}).encode("utf-8")
+    t0 = time.perf_counter()
+    resp = suggester.main(func.HttpRequest(method="POST", url="/api/FolderCategorySuggester", body=body))
+    main_s = time.perf_counter() - t0
+    if resp.status_code != 200:
+        raise RuntimeError("main() returned %d" % resp.status_code)
+
+    print("rows:              %d" % args.rows)
+    print("substring scan:    %.3fs  (%.0f rows/s)" % (legacy_s, args.rows / legacy_s))
+    print("word matcher:      %.3fs  (%.0f rows/s)" % (new_s, args.rows / new_s))
+    print("speedup:           %.1fx" % (legacy_s / new_s))
+    print("changed category:  %d (%.1f%%, substring-only matches dropped)"
+          % (changed, 100.0 * changed / max(1, args.rows)))
+    print("full main():       %.3fs" % main_s)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Local stand-in for "the internet", used by the ExpiredLinkChecker benchmark.
+
+Listens on one 127.0.0.1 port per virtual host (so each one is a distinct
+host to the checker's pools, breaker and per-host limits). Some ports can
+speak TLS. The request path picks the behaviour:
+
+    /ok/<n>        200
+    /404/<n>       404          /410/<n>   410
+    /500/<n>       500          /503/<n>   503
+    /redirect/<n>  302 -> /ok/<n>
+    /hang/<n>      never answers within any sane timeout
+    /reset/<n>     drops the TCP connection (RST) without answering
+
+and `?ms=<int>` adds that much latency before answering.
+
+Run as a script: it prints one line `READY {"http": [...], "https": [...]}`
+with the ports it listens on, then serves until killed.
+"""
+import argparse
+import http.server
+import json
+import socket
+import socketserver
+import ssl
+import struct
+import sys
+import threading
+import time
+import urllib.parse
+
+HANG_SECONDS = 30.0
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _answer(self, with_body: bool):
+        parsed = urllib.parse.urlparse(self.path)
+        parts = [p for p in parsed.path.split("/") if p]
+        kind = parts[0] if parts else "ok"
+        query = urllib.parse.parse_qs(parsed.query)
+
+        try:
+            delay_ms = int(query.get("ms", ["0"])[0])
+        except ValueError:
+            delay_ms = 0
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000.0)
+
+        if kind == "hang":
+            time.sleep(HANG_SECONDS)
+            self.close_connection = True
+            return
+
+        if kind == "reset":
+            # SO_LINGER with zero timeout makes close() send RST
+            self.connection.setsockopt(
+                socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0)
+            )
+            self.close_connection = True
+            return
+
+        if kind == "redirect":
+            target = "/ok/" + "/".join(parts[1:])
+            self.send_response(302)
+            self.send_header("Location", target)
+        elif kind.isdigit():
+            self.send_response(int(kind))
+        else:
+            self.send_response(200)
+            self.send_header("ETag", '"stub-%s"' % "-".join(parts[1:] or ["0"]))
+
+        body = b"ok\n" if with_body else b""
+        self.send_header("Content-Length", str(len(b"ok\n")))
+        self.end_headers()
+        if with_body:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._answer(with_body=False)
+
+    def do_GET(self):
+        self._answer(with_body=True)
+
+
+class StubServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+
+def start_servers(n_http: int, n_https: int, certfile: str = "", keyfile: str = ""):
+    """
+    Start the stub servers on ephemeral ports in daemon threads.
+    Returns ({"http": [ports], "https": [ports]}, [servers]).
+    """
+    ports = {"http": [], "https": []}
+    servers = []
+
+    context = None
+    if n_https:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+
+    for scheme, count in (("http", n_http), ("https", n_https)):
+        for _ in range(count):
+            server = StubServer(("127.0.0.1", 0), StubHandler)
+            if scheme == "https":
+                # Handshake lazily in the handler thread, not in accept()
+                server.socket = context.wrap_socket(
+                    server.socket, server_side=True, do_handshake_on_connect=False
+                )
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            ports[scheme].append(server.server_address[1])
+            servers.append(server)
+
+    return ports, servers
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--http-hosts", type=int, default=20)
+    parser.add_argument("--https-hosts", type=int, default=0)
+    parser.add_argument("--certfile", default="")
+    parser.add_argument("--keyfile", default="")
+    args = parser.parse_args(argv)
+
+    ports, _ = start_servers(args.http_hosts, args.https_hosts, args.certfile, args.keyfile)
+    sys.stdout.write("READY " + json.dumps(ports) + "\n")
+    sys.stdout.flush()
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
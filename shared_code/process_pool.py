@@ -0,0 +1,86 @@
+"""
+The process pool shared by the functions that spread CPU-bound work over
+cores (OutlierFinder, ClusterSimilarBookmarks).
+
+Workers are started by a forkserver (spawn where there is none), never
+forked from the Functions worker itself: that process runs requests on
+threads next to the host's gRPC threads, and a fork taken while any of
+them holds a lock (SQLite, the caches, logging) can leave the child
+deadlocked on it. The pool object is created once, when this module is
+imported; worker processes are only started when work is first
+submitted.
+
+A pool that must be abandoned (a dead worker, or shards still running
+past a request's deadline) is replaced with reset_pool(), which also
+terminates its workers, so the next request never queues behind work
+nobody is waiting for.
+"""
+import logging
+import multiprocessing
+import os
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from typing import Optional
+
+# Worker processes in the shared pool (0 = one per CPU)
+PROCESS_POOL_WORKERS = int(os.environ.get("PROCESS_POOL_WORKERS", "0"))
+
+# What a task's future can raise when its pool was broken or reset
+# under it; callers redo that work inline
+POOL_FAILURES = (BrokenProcessPool, CancelledError)
+
+_pool_lock = Lock()
+
+
+def pool_size() -> int:
+    return PROCESS_POOL_WORKERS if PROCESS_POOL_WORKERS > 0 else (os.cpu_count() or 1)
+
+
+def _start_method() -> str:
+    return "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _new_pool() -> Optional[ProcessPoolExecutor]:
+    try:
+        return ProcessPoolExecutor(max_workers=pool_size(), mp_context=multiprocessing.get_context(_start_method()))
+    except (OSError, NotImplementedError, ValueError):
+        logging.warning("process pool unavailable, running inline", exc_info=True)
+        return None
+
+
+# Workers import this module too (re-importing __main__, or unpickling
+# their tasks), before parent_process() is set; only the main process,
+# the Functions worker itself, gets a pool
+_pool: Optional[ProcessPoolExecutor] = (
+    _new_pool() if multiprocessing.current_process().name == "MainProcess" else None
+)
+
+
+def get_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    The process-wide pool; None if this sandbox can't start processes,
+    or inside a pool worker.
+    """
+    return _pool
+
+
+def reset_pool(pool: Optional[ProcessPoolExecutor] = None) -> None:
+    """
+    Replace `pool` (default: the current one) with a fresh pool: queued
+    tasks are cancelled and running workers terminated. A no-op if
+    another caller already replaced it.
+    """
+    global _pool
+    with _pool_lock:
+        old = _pool
+        if old is None or (pool is not None and pool is not old):
+            return
+        _pool = _new_pool()
+    # Taken before shutdown(), which forgets them
+    workers = list((getattr(old, "_processes", None) or {}).values())
+    old.shutdown(wait=False, cancel_futures=True)
+    for process in workers:
+        process.terminate()
+    for process in workers:
+        process.join(timeout=5)
@@ -0,0 +1,62 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Function folders are imported as top-level packages, as the Functions host does
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+
+def call_function(module, payload):
+    """
+    POST `payload` as JSON to a function package's main(); returns
+    (status_code, body) with the body parsed (a list of lines for NDJSON).
+    """
+    import azure.functions as func
+
+    req = func.HttpRequest(method="POST", url="/api/" + module.__name__,
+                           body=json.dumps(payload).encode("utf-8"))
+    resp = module.main(req)
+    text = resp.get_body().decode("utf-8")
+    if resp.mimetype == "application/x-ndjson":
+        return resp.status_code, [json.loads(line) for line in text.splitlines()]
+    return resp.status_code, json.loads(text)
+
+
+@pytest.fixture(scope="session")
+def stub_ports():
+    """
+    benchmarks/stub_server.py hosts on 127.0.0.1: {"http": [ports], "https": []}.
+    """
+    import stub_server
+
+    ports, servers = stub_server.start_servers(4, 0)
+    yield ports
+    for server in servers:
+        server.shutdown()
+
+
+@pytest.fixture
+def link_store(tmp_path, monkeypatch):
+    """
+    A fresh ExpiredLinkChecker status cache for one test.
+    """
+    from ExpiredLinkChecker import status_store
+
+    store = status_store.LinkStatusStore(str(tmp_path / "status.sqlite3"))
+    monkeypatch.setattr(status_store, "_store", store)
+    return store
+
+
+@pytest.fixture
+def check_links(link_store):
+    """
+    Call ExpiredLinkChecker.main() with a JSON payload; returns
+    (status_code, body) with the body parsed (a list of lines for NDJSON).
+    """
+    import ExpiredLinkChecker as checker
+
+    return lambda payload: call_function(checker, payload)
@@ -0,0 +1,38 @@
+"""
+cluster_exact() (engine "exact") against the original greedy scan,
+cluster_bookmarks(), on random bookmarks.
+"""
+import random
+
+import pytest
+
+import ClusterSimilarBookmarks as clusterer
+from ClusterSimilarBookmarks.exact import cluster_exact
+
+THRESHOLDS = [0.05, 0.15, 0.2, 1 / 3, 0.5, 0.75, 1.0]
+
+
+def random_bookmarks(rng: random.Random, n: int):
+    # Small vocabularies so many pairs land right on a threshold
+    vocab = ["word%02d" % i for i in range(rng.choice([5, 12, 40]))]
+    bookmarks = []
+    for i in range(n):
+        if bookmarks and rng.random() < 0.1:
+            content = rng.choice(bookmarks)["url_content"]  # exact duplicate
+        else:
+            content = " ".join(rng.choice(vocab) for _ in range(rng.randint(0, 8)))
+            if rng.random() < 0.1:
+                content += " a an to"  # words tokenize() drops
+        bookmarks.append({"url": "https://example.com/%d" % i, "url_content": content})
+    return bookmarks
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_cluster_exact_matches_greedy_scan(seed):
+    rng = random.Random(seed)
+    bookmarks = random_bookmarks(rng, rng.randint(0, 120))
+    token_sets = [clusterer.tokenize(bm["url_content"]) for bm in bookmarks]
+    for threshold in THRESHOLDS:
+        expected = clusterer.cluster_bookmarks(bookmarks, threshold)
+        got = clusterer.group_by_label(bookmarks, cluster_exact(token_sets, threshold))
+        assert got == expected, threshold
@@ -0,0 +1,137 @@
+"""
+"mode": "incremental" in ClusterSimilarBookmarks: stable group ids,
+representatives handed over on removal, snapshots, row-level saves,
+reloading across instances and threshold changes.
+"""
+import random
+
+import pytest
+
+import ClusterSimilarBookmarks as clusterer
+from ClusterSimilarBookmarks import incremental
+from ClusterSimilarBookmarks.incremental import ClusterStateStore
+from ClusterSimilarBookmarks.minhash import jaccard
+
+from conftest import call_function
+
+WORDS = ["python", "asyncio", "tutorial", "bread", "sourdough", "hotel", "flight", "yoga", "stocks", "museum"]
+THRESHOLD = clusterer.CLUSTER_THRESHOLD
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "clusters.sqlite3")
+    monkeypatch.setattr(incremental, "_store", ClusterStateStore(path))
+    return path
+
+
+def delta(add=(), remove=(), **extra):
+    status, body = call_function(clusterer, {"mode": "incremental", "user_key": "u",
+                                             "add": list(add), "remove": list(remove), **extra})
+    assert status == 200 and body["success"]
+    return body
+
+
+def stored(path=None):
+    store = ClusterStateStore(path) if path else incremental.get_state_store()
+    with store.open("u", THRESHOLD) as state:
+        return state
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_random_deltas_keep_ids_stable_and_place_bookmarks_near_a_representative(seed, db_path):
+    rng = random.Random(seed)
+    library = {}  # id -> text
+    groups = {}   # id -> group, as a client applying the responses holds it
+    for _ in range(20):
+        add, remove = [], []
+        for _ in range(rng.randint(1, 8)):
+            item_id = "b%d" % rng.randint(0, 60)
+            if item_id in library and rng.random() < 0.4:
+                del library[item_id]
+                remove.append({"id": item_id})
+            else:
+                library[item_id] = " ".join(rng.sample(WORDS, rng.randint(0, 4)))
+                add.append({"id": item_id, "url_content": library[item_id]})
+        ids = {a["id"] for a in add} & set(library)
+        add = [{"id": i, "url_content": library[i]} for i in ids]
+        remove = [r for r in remove if r["id"] not in library]
+
+        before = dict(groups)
+        body = delta(add, remove)
+        for item_id in body["removed"]:
+            groups.pop(item_id)
+        for row in body["changed"]:
+            groups[row["id"]] = row["cluster_group"]
+        assert set(groups) == set(library)
+        # only added or edited bookmarks ever move
+        assert all(groups[i] == g for i, g in before.items() if i in groups and i not in ids)
+
+        state = stored()
+        assert {i: "Group %d" % state.group_of(i) for i in library} == groups
+        # bookmarks placed by this delta are near their representative
+        # (older members may not be, once a representative was handed over)
+        for item_id in ids:
+            cluster_id, _, tokens, _ = state.items[item_id]
+            cluster = state.clusters[cluster_id]
+            assert item_id == cluster.rep_id or jaccard(set(tokens), cluster.rep_tokens) >= THRESHOLD
+
+
+def test_removing_a_representative_hands_over_to_the_next_oldest(db_path):
+    delta([{"id": str(i), "url_content": "python asyncio tutorial %d" % i} for i in range(3)])
+    body = delta(remove=[{"id": "0"}])
+    assert body["removed"] == ["0"]
+    state = stored()
+    (cluster,) = state.clusters.values()
+    assert cluster.rep_id == "1" and list(cluster.members) == ["1", "2"]
+
+    body = delta([{"id": "3", "url_content": "python asyncio tutorial 1"}])
+    assert body["changed"] == [{"id": "3", "cluster_group": "Group 1"}]
+
+
+def test_a_snapshot_drops_missing_bookmarks_and_skips_unchanged_ones(db_path):
+    delta([{"id": "a", "url_content": "python asyncio"}, {"id": "b", "url_content": "sourdough bread"}])
+    body = delta(bookmarks=[{"id": "a", "url_content": "python asyncio"}, {"id": "c", "url_content": "yoga"}])
+    assert body["removed"] == ["b"] and [row["id"] for row in body["changed"]] == ["c"]
+    assert body["items_clustered"] == 1
+
+
+def test_a_fresh_instance_loads_the_same_clusters(db_path):
+    rng = random.Random(1)
+    delta([{"id": str(i), "url_content": " ".join(rng.sample(WORDS, 3))} for i in range(40)])
+    delta(remove=[{"id": str(i)} for i in range(0, 40, 3)])
+    warm, cold = stored(), stored(db_path)
+    assert cold.items == warm.items and cold.version == warm.version
+    assert {c: (k.rep_id, k.sketch, list(k.members)) for c, k in cold.clusters.items()} == \
+           {c: (k.rep_id, k.sketch, list(k.members)) for c, k in warm.clusters.items()}
+
+
+def test_a_delta_writes_only_the_rows_it_touched(db_path):
+    delta([{"id": str(i), "url_content": "word%d other%d" % (i, i)} for i in range(300)])
+    conn = incremental.get_state_store()._conn
+    before = conn.total_changes
+    delta([{"id": "new", "url_content": "python asyncio"}])
+    # the bookmark, its new cluster and the user row
+    assert conn.total_changes - before == 3
+
+
+def test_a_threshold_change_never_revives_a_cached_state(db_path):
+    a, b = ClusterStateStore(db_path), ClusterStateStore(db_path)
+    with a.open("u", 0.5) as state:
+        state.add("x", "h", {"python", "asyncio"}, None)      # a caches version 1
+    with b.open("u", 0.9) as state:
+        pass                                                # another threshold wipes it
+    with b.open("u", 0.5) as state:
+        state.add("y", "h", {"bread"}, None)                # ...and back again
+    with a.open("u", 0.5) as state:
+        assert set(state.items) == {"y"}
+
+
+def test_incremental_mode_needs_a_user_key_and_a_shared_database(monkeypatch):
+    status, body = call_function(clusterer, {"mode": "incremental", "add": []})
+    assert status == 400 and "user_key" in body["error"]
+
+    monkeypatch.setattr(incremental, "_store", None)
+    monkeypatch.setattr(incremental, "CLUSTER_STATE_DB_PATH", "")
+    status, body = call_function(clusterer, {"mode": "incremental", "user_key": "u", "add": []})
+    assert status == 503 and "CLUSTER_STATE_DB_PATH" in body["error"]
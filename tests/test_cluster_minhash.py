@@ -0,0 +1,120 @@
+"""
+MinHash + LSH clustering (engine "minhash"): NumPy and pure-Python
+signatures agree, components never join dissimilar bookmarks, and
+duplicates and oversized buckets are still linked.
+"""
+import random
+
+import pytest
+
+import ClusterSimilarBookmarks as clusterer
+from ClusterSimilarBookmarks import minhash
+from ClusterSimilarBookmarks.minhash import (
+    MAX_BUCKET_SIZE, TooManyEdges, UnionFind, candidate_edges, cluster_minhash, jaccard, lsh_candidates,
+    lsh_params, signatures,
+)
+
+from conftest import call_function
+from test_cluster_exact import random_bookmarks
+
+
+def exact_components(token_sets, threshold):
+    uf = UnionFind(len(token_sets))
+    for i in range(len(token_sets)):
+        for j in range(i + 1, len(token_sets)):
+            if jaccard(token_sets[i], token_sets[j]) >= threshold:
+                uf.union(i, j)
+    return [uf.find(i) for i in range(len(token_sets))]
+
+
+def random_token_sets(seed, n=80):
+    rng = random.Random(seed)
+    return [clusterer.tokenize(bm["url_content"]) for bm in random_bookmarks(rng, n)]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_numpy_signatures_match_pure_python(seed):
+    pytest.importorskip("numpy")
+    token_sets = random_token_sets(seed)
+    docs, matrix = minhash.signature_matrix(token_sets)
+    sigs = signatures(token_sets)
+    assert docs.tolist() == [i for i, sig in enumerate(sigs) if sig is not None]
+    assert [tuple(row) for row in matrix.tolist()] == [sig for sig in sigs if sig is not None]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_numpy_and_pure_python_candidates_agree(seed, monkeypatch):
+    pytest.importorskip("numpy")
+    token_sets = random_token_sets(seed)
+
+    def candidates():
+        duplicates, buckets = lsh_candidates(token_sets, 0.5)
+        return sorted(duplicates), sorted(tuple(b) for b in buckets)
+
+    with_numpy = candidates()
+    monkeypatch.setattr(minhash, "np", None)
+    assert candidates() == with_numpy
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_components_refine_the_exact_similarity_graph(seed):
+    token_sets = random_token_sets(seed)
+    for threshold in (0.15, 0.5, 0.8):
+        exact = exact_components(token_sets, threshold)
+        got = cluster_minhash(token_sets, threshold)
+        # every LSH component lies inside one exact component...
+        assert all(exact[i] == exact[got[i]] for i in range(len(token_sets)))
+        # ...and equal token sets always end up together
+        for i, tokens in enumerate(token_sets):
+            first = token_sets.index(tokens)
+            assert not tokens or got[i] == got[first]
+
+
+def test_near_duplicates_are_found_at_scale():
+    rng = random.Random(3)
+    vocab = ["w%d" % i for i in range(5000)]
+    token_sets = []
+    for _ in range(300):
+        base = rng.sample(vocab, 20)
+        token_sets.append(set(base))
+        token_sets.append(set(base[:19] + [rng.choice(vocab)]))  # Jaccard >= 19/21
+    labels = cluster_minhash(token_sets, 0.5)
+    joined = sum(labels[2 * k] == labels[2 * k + 1] for k in range(300))
+    assert joined >= 295
+    assert len(set(labels)) >= 295
+
+
+def test_oversized_buckets_are_joined_not_dropped():
+    # Every bookmark shares most of its tokens, so bands collide in buckets
+    # far larger than MAX_BUCKET_SIZE
+    common = ["shared%d" % i for i in range(30)]
+    token_sets = [set(common + ["own%d" % i]) for i in range(3 * MAX_BUCKET_SIZE)]
+    assert len(set(cluster_minhash(token_sets, 0.5))) == 1
+
+
+def test_candidate_edges_are_each_pair_once_and_capped():
+    token_sets = random_token_sets(1, 120)
+    edges = candidate_edges(token_sets, 0.3)
+    pairs = [(i, j) for _, i, j in edges]
+    assert len(pairs) == len(set(pairs)) and all(i < j for i, j in pairs)
+    assert all(sim == jaccard(token_sets[i], token_sets[j]) >= 0.3 for sim, i, j in edges)
+    if edges:
+        with pytest.raises(TooManyEdges):
+            candidate_edges(token_sets, 0.3, max_edges=len(edges) - 1)
+
+
+def test_lsh_params_use_every_permutation_sensibly():
+    for threshold in (0.15, 0.5, 0.9):
+        bands, rows = lsh_params(threshold)
+        assert bands * rows <= minhash.NUM_PERM
+        # the S-curve's midpoint sits near the threshold
+        assert abs((1 / bands) ** (1 / rows) - threshold) < 0.2
+
+
+def test_minhash_engine_through_main():
+    bookmarks = [{"url": "https://a.test/%d" % i, "url_content": "python asyncio tutorial part %d" % (i % 2)}
+                 for i in range(4)] + [{"url": "https://b.test", "url_content": "sourdough bread baking"}]
+    status, body = call_function(clusterer, {"bookmarks": bookmarks, "engine": "minhash"})
+    assert status == 200
+    groups = [r["cluster_group"] for r in body["results"]]
+    assert groups == ["Group 1"] * 4 + ["Group 2"]
@@ -0,0 +1,112 @@
+"""
+Sharded clustering (engine "sharded"): shards by domain, the same labels
+whatever the worker count, and a merge that only joins groups whose
+representatives are similar.
+"""
+import random
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import ClusterSimilarBookmarks as clusterer
+from ClusterSimilarBookmarks import parallel
+from ClusterSimilarBookmarks.exact import cluster_exact
+from ClusterSimilarBookmarks.minhash import jaccard
+from ClusterSimilarBookmarks.parallel import cluster_sharded, shard_key, shard_of
+from shared_code import process_pool
+
+from conftest import call_function
+from test_cluster_exact import random_bookmarks
+
+
+def with_domains(rng, bookmarks, n_domains=6):
+    for bm in bookmarks:
+        if rng.random() < 0.9:
+            bm["url"] = "https://%ssite%d.test/%s" % (rng.choice(["", "www."]), rng.randrange(n_domains), bm["url"])
+        else:
+            bm["url"] = ""
+    return bookmarks
+
+
+@pytest.fixture
+def force_pool(monkeypatch):
+    monkeypatch.setattr(parallel, "PARALLEL_MIN_ITEMS", 0)
+    yield
+    process_pool.reset_pool()
+
+
+def test_shards_follow_the_domain():
+    a = {"url": "https://www.Example.test/a", "url_content": "x"}
+    b = {"url": "https://example.test/b?q=1", "url_content": "y"}
+    assert shard_key(a) == shard_key(b) == "example.test"
+    assert shard_of(a, 64) == shard_of(b, 64)
+    assert shard_key({"url": "", "url_content": "hello"}) == "text:hello"
+
+
+@pytest.mark.parametrize("seed", range(15))
+def test_groups_are_unions_of_shard_groups_joined_by_similar_representatives(seed):
+    rng = random.Random(seed)
+    bookmarks = with_domains(rng, random_bookmarks(rng, rng.randint(0, 120)))
+    threshold = rng.choice([0.15, 0.5, 1.0])
+    token_sets = [clusterer.tokenize(bm["url_content"]) for bm in bookmarks]
+    labels = cluster_sharded(bookmarks, threshold, clusterer.tokenize, workers=1)
+
+    # Within one shard, the greedy scan's groups are never split
+    shards = {}
+    for i, bm in enumerate(bookmarks):
+        shards.setdefault(shard_of(bm, parallel.CLUSTER_SHARDS), []).append(i)
+    for members in shards.values():
+        local = cluster_exact([token_sets[i] for i in members], threshold)
+        for i, first in zip(members, local):
+            assert labels[i] == labels[members[first]]
+
+    # Each group is labelled by its first bookmark, and a bookmark only
+    # shares its label with another shard's group through a similar
+    # representative
+    for i, label in enumerate(labels):
+        assert label <= i and labels[label] == label
+    reps = sorted({members[first] for members in shards.values()
+                   for first in cluster_exact([token_sets[i] for i in members], threshold)})
+    for r in reps:
+        assert labels[r] == r or jaccard(token_sets[r], token_sets[labels[r]]) >= threshold
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_labels_do_not_depend_on_the_worker_count(seed, force_pool):
+    rng = random.Random(seed)
+    bookmarks = with_domains(rng, random_bookmarks(rng, 300), n_domains=20)
+    single = cluster_sharded(bookmarks, 0.15, clusterer.tokenize, workers=1)
+    assert cluster_sharded(bookmarks, 0.15, clusterer.tokenize, workers=2) == single
+    assert cluster_sharded(bookmarks, 0.15, clusterer.tokenize, workers=3) == single
+
+
+def test_a_broken_pool_falls_back_inline(force_pool, monkeypatch):
+    class BrokenPool:
+        def submit(self, *args, **kwargs):
+            raise BrokenProcessPool("worker died")
+
+        def shutdown(self, **kwargs):
+            pass
+
+    rng = random.Random(4)
+    bookmarks = with_domains(rng, random_bookmarks(rng, 100))
+    expected = cluster_sharded(bookmarks, 0.15, clusterer.tokenize, workers=1)
+    monkeypatch.setattr(process_pool, "get_pool", lambda: BrokenPool())
+    assert cluster_sharded(bookmarks, 0.15, clusterer.tokenize, workers=4) == expected
+
+
+def test_near_duplicates_on_different_domains_are_merged():
+    bookmarks = [
+        {"url": "https://a.test/1", "url_content": "python asyncio tutorial event loop"},
+        {"url": "https://b.test/1", "url_content": "python asyncio tutorial event loops"},
+        {"url": "https://c.test/1", "url_content": "sourdough bread starter"},
+    ]
+    assert cluster_sharded(bookmarks, 0.5, clusterer.tokenize, workers=1) == [0, 0, 2]
+
+
+def test_sharded_engine_through_main():
+    bookmarks = [{"url": "https://a.test/%d" % i, "url_content": "python asyncio tutorial %d" % i}
+                 for i in range(3)] + [{"url": "https://b.test/x", "url_content": "sourdough bread"}]
+    status, body = call_function(clusterer, {"bookmarks": bookmarks, "engine": "sharded"})
+    assert status == 200
+    assert [r["cluster_group"] for r in body["results"]] == ["Group 1", "Group 1", "Group 1", "Group 2"]
@@ -0,0 +1,111 @@
+"""
+Threshold sweeps ("thresholds": [...]) in ClusterSimilarBookmarks: the
+edge list against brute force, one grouping per threshold against
+connected components, and the edge and candidate caps.
+"""
+import random
+
+import pytest
+
+import ClusterSimilarBookmarks as clusterer
+from ClusterSimilarBookmarks import minhash, sweep
+from ClusterSimilarBookmarks.minhash import TooManyEdges, candidate_edges, jaccard
+from ClusterSimilarBookmarks.sweep import exact_edges, sweep_clusters
+
+from conftest import call_function
+from test_cluster_exact import random_bookmarks
+from test_cluster_minhash import exact_components
+
+THRESHOLDS = [0.05, 0.15, 1 / 3, 0.5, 0.8, 1.0]
+
+
+def random_token_sets(seed, n=None):
+    rng = random.Random(seed)
+    return [clusterer.tokenize(bm["url_content"]) for bm in random_bookmarks(rng, n or rng.randint(0, 90))]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_exact_edges_match_brute_force(seed):
+    token_sets = random_token_sets(seed)
+    for threshold in THRESHOLDS:
+        expected = sorted(
+            (jaccard(token_sets[i], token_sets[j]), i, j)
+            for j in range(len(token_sets)) for i in range(j)
+            if jaccard(token_sets[i], token_sets[j]) >= threshold
+        )
+        assert sorted(exact_edges(token_sets, threshold)) == expected, threshold
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_one_sweep_gives_the_components_at_every_threshold(seed):
+    token_sets = random_token_sets(seed)
+    labels, engine = sweep_clusters(token_sets, THRESHOLDS)
+    assert engine == "exact"
+    for threshold in THRESHOLDS:
+        assert labels[threshold] == exact_components(token_sets, threshold), threshold
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_minhash_sweep_refines_the_exact_components(seed):
+    token_sets = random_token_sets(seed)
+    labels, engine = sweep_clusters(token_sets, THRESHOLDS, engine="minhash")
+    assert engine == "minhash"
+    for threshold in THRESHOLDS:
+        exact = exact_components(token_sets, threshold)
+        assert all(exact[i] == exact[label] for i, label in enumerate(labels[threshold]))
+
+
+def test_candidate_caps_refuse_before_comparing_any_pair(monkeypatch):
+    token_sets = [{"common", "word%d" % i} for i in range(200)]
+
+    def no_comparisons(a, b):
+        raise AssertionError("compared a pair past the candidate cap")
+
+    monkeypatch.setattr(sweep, "jaccard", no_comparisons)
+    monkeypatch.setattr(minhash, "jaccard", no_comparisons)
+    with pytest.raises(TooManyEdges, match="candidate pairs"):
+        exact_edges(token_sets, 0.2, max_candidates=1000)
+    with pytest.raises(TooManyEdges, match="candidate pairs"):
+        candidate_edges(token_sets, 0.2, max_candidates=1000)
+
+
+def test_exact_join_over_the_candidate_cap_falls_back_to_lsh(monkeypatch):
+    # Every prefix holds the same common word, so the exact join would
+    # compare all pairs, while LSH only collides the rare similar ones
+    rng = random.Random(5)
+    common = ["common%d" % i for i in range(10)]
+    token_sets = [set(common + ["own%d_%d" % (i, k) for k in range(10)]) for i in range(200)]
+    for i in rng.sample(range(200), 20):
+        token_sets.append(set(token_sets[i]) - {"own%d_0" % i})  # Jaccard 19/20 with i
+    monkeypatch.setattr(sweep, "SWEEP_MAX_CANDIDATES", 10000)
+    with pytest.raises(TooManyEdges):
+        exact_edges(token_sets, 0.5, max_candidates=10000)
+
+    labels, engine = sweep_clusters(token_sets, [0.5, 0.9])
+    assert engine == "minhash"
+    assert labels == {t: exact_components(token_sets, t) for t in (0.5, 0.9)}
+
+
+def test_sweep_over_both_caps_is_refused_with_400(monkeypatch):
+    monkeypatch.setattr(sweep, "SWEEP_MAX_CANDIDATES", 10)
+    bookmarks = [{"url": "https://a.test/%d" % i, "url_content": "python asyncio tutorial part %d" % i}
+                 for i in range(50)]
+    status, body = call_function(clusterer, {"bookmarks": bookmarks, "thresholds": [0.2, 0.5]})
+    assert status == 400 and "candidate pairs" in body["error"]
+
+
+def test_sweep_through_main():
+    bookmarks = [{"url": "https://a.test/1", "url_content": "python asyncio tutorial basics"},
+                 {"url": "https://a.test/2", "url_content": "python asyncio tutorial advanced"},
+                 {"url": "https://b.test/1", "url_content": "python packaging guide"}]
+    status, body = call_function(clusterer, {"bookmarks": bookmarks, "thresholds": [0.1, 0.5]})
+    assert status == 200 and body["engine"] == "exact"
+    assert [r["cluster_groups"] for r in body["results"]] == [
+        ["Group 1", "Group 1"], ["Group 1", "Group 1"], ["Group 1", "Group 2"],
+    ]
+
+
+@pytest.mark.parametrize("thresholds", [[], [0.01], [0.5, True], "0.5", [0.2] * 21, [1.5]])
+def test_bad_thresholds_are_rejected(thresholds):
+    status, body = call_function(clusterer, {"bookmarks": [{"url_content": "x"}], "thresholds": thresholds})
+    assert status == 400 and "threshold" in body["error"]
@@ -0,0 +1,58 @@
+"""
+The asyncio probe engine against the thread engine, on the local stub server.
+"""
+from ExpiredLinkChecker import async_engine
+
+
+def bookmarks(ports, n=60):
+    kinds = ["ok", "404", "410", "500", "redirect"]
+    return [
+        {"url": "http://127.0.0.1:%d/%s/%d" % (ports["http"][i % 2], kinds[i % len(kinds)], i),
+         "title": "T%d" % i, "folder_name": "F"}
+        for i in range(n)
+    ]
+
+
+def test_async_engine_matches_threads(stub_ports, check_links):
+    items = bookmarks(stub_ports)
+    _, threads = check_links({"bookmarks": items, "engine": "threads", "use_cache": False})
+    _, asynced = check_links({"bookmarks": items, "engine": "async", "use_cache": False})
+    assert asynced["results"] == threads["results"]
+    assert [r["status_code"] for r in asynced["results"][:5]] == [200, 404, 410, 500, 302]
+
+
+def test_async_engine_reuses_connections_per_host(stub_ports, monkeypatch):
+    created = []
+    orig_aclose = async_engine.AsyncProber.aclose
+
+    async def aclose(self):
+        created.append((self.created, self.reused))
+        await orig_aclose(self)
+
+    monkeypatch.setattr(async_engine.AsyncProber, "aclose", aclose)
+
+    urls = ["http://127.0.0.1:%d/ok/%d" % (stub_ports["http"][0], i) for i in range(50)]
+
+    async def check(prober, url):
+        return await prober.head_with_redirects(url, timeout=2.0, max_redirects=0)
+
+    outcomes = async_engine.run_async_checks(urls, check)
+    assert [status for status, _ in outcomes] == [200] * 50
+    (n_created, n_reused), = created
+    assert n_created <= async_engine.ASYNC_MAX_PER_HOST
+    assert n_created + n_reused == 50
+
+
+def test_async_engine_retries_reused_connection_closed_by_server(stub_ports):
+    port = stub_ports["http"][0]
+    prober = async_engine.AsyncProber(max_per_host=1)
+
+    async def check(prober, url):
+        return await prober.head_with_redirects(url, timeout=2.0, max_redirects=0)
+
+    # The reset drops the connection; later probes must not fail because of it
+    urls = ["http://127.0.0.1:%d/ok/1" % port, "http://127.0.0.1:%d/reset/2" % port,
+            "http://127.0.0.1:%d/ok/3" % port]
+    outcomes = async_engine.run_async_checks(urls, check, prober=prober)
+    assert outcomes[0][0] == 200 and outcomes[2][0] == 200
+    assert isinstance(outcomes[1], Exception)
@@ -0,0 +1,95 @@
+"""
+DomainCircuitBreaker states, and the dead-host case end to end on the
+local stub server.
+"""
+import socket
+import time
+
+import pytest
+
+import ExpiredLinkChecker as checker
+from ExpiredLinkChecker.circuit_breaker import CLOSED, HALF_OPEN, OPEN, DomainCircuitBreaker, is_fatal_error
+
+
+def state(breaker, domain):
+    return breaker._get(domain).state
+
+
+def test_breaker_opens_at_threshold_and_half_opens_after_cooldown():
+    breaker = DomainCircuitBreaker(failure_threshold=3, base_cooldown=2.0, max_cooldown=5.0)
+    for _ in range(3):
+        assert breaker.allow("d", now=0.0)
+    breaker.record_failure("d", now=0.0)
+    breaker.record_failure("d", now=0.0)
+    assert state(breaker, "d") == CLOSED
+    breaker.record_failure("d", now=0.0)
+    assert state(breaker, "d") == OPEN
+
+    assert not breaker.allow("d", now=1.9)
+    assert breaker.skipped == 1
+
+    # One trial after the cooldown; nobody else gets through meanwhile
+    assert breaker.allow("d", now=2.0)
+    assert state(breaker, "d") == HALF_OPEN
+    assert not breaker.allow("d", now=2.0)
+
+    # A failed trial doubles the cooldown (capped)
+    breaker.record_failure("d", now=2.0)
+    assert state(breaker, "d") == OPEN
+    assert not breaker.allow("d", now=5.9)
+    assert breaker.allow("d", now=6.0)
+    breaker.record_failure("d", now=6.0)
+    assert not breaker.allow("d", now=10.9)
+    assert breaker.allow("d", now=11.0)
+
+    breaker.record_success("d")
+    assert state(breaker, "d") == CLOSED
+    assert breaker.open_domains() == 0
+    assert breaker.allow("d", now=11.0)
+
+
+def test_fatal_error_opens_at_once_and_domains_are_independent():
+    breaker = DomainCircuitBreaker()
+    assert is_fatal_error(ConnectionRefusedError()) and is_fatal_error(socket.gaierror())
+    assert not is_fatal_error(socket.timeout())
+
+    assert breaker.allow("dead") and breaker.allow("alive")
+    breaker.record_failure("dead", fatal=True)
+    breaker.record_success("alive")
+    assert not breaker.allow("dead")
+    assert breaker.allow("alive")
+    assert breaker.open_domains() == 1
+
+
+def test_success_resets_the_failure_count():
+    breaker = DomainCircuitBreaker(failure_threshold=2)
+    for outcome in ("fail", "ok", "fail", "ok", "fail"):
+        assert breaker.allow("d")
+        if outcome == "ok":
+            breaker.record_success("d")
+        else:
+            breaker.record_failure("d")
+    assert state(breaker, "d") == CLOSED
+
+
+@pytest.mark.parametrize("engine", ["threads", "async"])
+def test_hanging_host_trips_before_queued_probes_time_out(stub_ports, check_links, monkeypatch, engine):
+    timeout = 0.5
+    monkeypatch.setattr(checker, "PER_URL_TIMEOUT", timeout)
+    dead, alive = stub_ports["http"][0], stub_ports["http"][1]
+    urls = ["http://127.0.0.1:%d/hang/%d" % (dead, i) for i in range(200)]
+    urls += ["http://127.0.0.1:%d/ok/%d" % (alive, i) for i in range(20)]
+
+    started = time.monotonic()
+    status, body = check_links({"urls": urls, "engine": engine, "use_cache": False})
+    elapsed = time.monotonic() - started
+
+    assert status == 200
+    # One round of in-flight probes times out, then the circuit is open.
+    # Without the check after the per-host slot, every queued probe waited
+    # for a slot and then timed out too.
+    assert elapsed < 1.6 * timeout
+    assert body["circuit_breaker"]["open_domains"] == 1
+    assert body["circuit_breaker"]["skipped"] >= 200 - 2 * checker.MAX_WORKERS
+    assert [r["status_code"] for r in body["results"][200:]] == [200] * 20
+    assert all(r["status_code"] is None and not r["expired_link"] for r in body["results"][:200])
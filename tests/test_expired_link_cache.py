@@ -0,0 +1,60 @@
+"""
+The persistent link-status cache: TTLs per outcome, and main() answering
+fresh entries without probing.
+"""
+import sqlite3
+
+from ExpiredLinkChecker import status_store
+from ExpiredLinkChecker.status_store import EXPIRED_TTL, ERROR_TTL, HEALTHY_TTL, LinkStatusStore
+
+
+def test_entries_expire_per_outcome(tmp_path):
+    store = LinkStatusStore(str(tmp_path / "s.sqlite3"))
+    store.put_many([
+        ("ok", 200, False, None, None),
+        ("gone", 404, True, None, None),
+        ("err", None, False, None, None),
+        ("down", 503, False, None, None),
+    ], now=0.0)
+
+    assert store.get_many(["ok", "gone", "err", "down", "missing"], now=ERROR_TTL) == {
+        "ok": (200, False), "gone": (404, True), "err": (None, False), "down": (503, False),
+    }
+    assert set(store.get_many(["ok", "gone", "err", "down"], now=ERROR_TTL + 1)) == {"ok", "gone"}
+    assert set(store.get_many(["ok", "gone"], now=EXPIRED_TTL + 1)) == {"ok"}
+    assert store.get_many(["ok"], now=HEALTHY_TTL + 1) == {}
+
+
+def test_store_survives_reopening_and_many_keys(tmp_path):
+    path = str(tmp_path / "s.sqlite3")
+    keys = ["https://example.com/%d" % i for i in range(1200)]  # > one lookup chunk
+    LinkStatusStore(path).put_many([(k, 200, False, None, None) for k in keys])
+    assert len(LinkStatusStore(path).get_many(keys)) == len(keys)
+
+
+def test_fresh_entries_are_answered_without_probing(stub_ports, check_links, link_store):
+    port = stub_ports["http"][0]
+    urls = ["http://127.0.0.1:%d/404/%d" % (port, i) for i in range(5)]
+    _, first = check_links({"urls": urls})
+    assert first["cache"] == {"enabled": True, "hits": 0, "misses": 5, "revalidated": 0}
+
+    # Now the host would say 200, but the cache still answers 404
+    _, second = check_links({"urls": urls})
+    assert second["cache"]["hits"] == 5 and second["cache"]["misses"] == 0
+    assert [r["status_code"] for r in second["results"]] == [404] * 5
+    assert all(r["expired_link"] for r in second["results"])
+
+    _, uncached = check_links({"urls": urls, "use_cache": False})
+    assert uncached["cache"]["enabled"] is False
+
+
+def test_broken_cache_never_fails_the_check(stub_ports, check_links, monkeypatch):
+    def unavailable():
+        raise sqlite3.OperationalError("unable to open database file")
+
+    monkeypatch.setattr(status_store, "_store", None)
+    monkeypatch.setattr(status_store, "LinkStatusStore", unavailable)
+    status, body = check_links({"urls": ["http://127.0.0.1:%d/ok/1" % stub_ports["http"][0]]})
+    assert status == 200
+    assert body["cache"]["enabled"] is False
+    assert body["results"][0]["status_code"] == 200
@@ -0,0 +1,90 @@
+"""
+Time budgets and continuation tokens, on the local stub server.
+"""
+import time
+
+import pytest
+
+import ExpiredLinkChecker as checker
+
+EPSILON = 0.3  # seconds, for building the response and scheduler noise
+
+
+def slow_bookmarks(ports, n, ms=150):
+    # One host, so most probes queue for its MAX_CONNECTIONS_PER_HOST slots
+    return [
+        {"url": "http://127.0.0.1:%d/%s/%d?ms=%d" % (ports["http"][2], "404" if i % 5 == 0 else "ok", i, ms),
+         "title": "T%d" % i, "folder_name": "F"}
+        for i in range(n)
+    ]
+
+
+def test_continuation_token_round_trip():
+    keys = ["https://a.example/x?y=1", "http://b.example/", "café"]
+    assert checker.decode_continuation(checker.encode_continuation(keys)) == keys
+    for bad in ("", "not-a-token", checker.encode_continuation(keys)[:-4]):
+        with pytest.raises(ValueError):
+            checker.decode_continuation(bad)
+
+
+def test_bad_token_and_too_small_budget_are_rejected(check_links):
+    status, body = check_links({"urls": ["http://a.example/"], "continuation": "garbage"})
+    assert status == 400 and "continuation" in body["error"]
+    status, body = check_links({"urls": ["http://a.example/"], "time_budget": checker.PER_URL_TIMEOUT})
+    assert status == 400 and "time_budget" in body["error"]
+
+
+@pytest.mark.parametrize("engine", ["threads", "async"])
+def test_time_budget_holds_with_probes_queued_for_slots(stub_ports, check_links, monkeypatch, engine):
+    monkeypatch.setattr(checker, "PER_URL_TIMEOUT", 0.5)
+    budget = 1.2
+    items = slow_bookmarks(stub_ports, 200, ms=300)
+    # A hanging URL holds its slot for a whole timeout
+    items[1]["url"] = "http://127.0.0.1:%d/hang/1" % stub_ports["http"][2]
+
+    started = time.monotonic()
+    status, body = check_links({"bookmarks": items, "engine": engine, "use_cache": False,
+                                "time_budget": budget})
+    elapsed = time.monotonic() - started
+
+    assert status == 200
+    assert elapsed <= budget + EPSILON
+    assert not body["complete"] and body["continuation"]
+    assert 0 < len(body["results"]) < len(items)
+    assert body["remaining"] == len(items) - len(body["results"])
+
+
+@pytest.mark.parametrize("engine", ["threads", "async"])
+def test_following_tokens_checks_everything_once(stub_ports, check_links, monkeypatch, engine):
+    monkeypatch.setattr(checker, "PER_URL_TIMEOUT", 0.5)
+    items = slow_bookmarks(stub_ports, 60, ms=100)
+    payload = {"bookmarks": items, "engine": engine, "use_cache": False, "time_budget": 1.0}
+
+    seen = {}
+    for _ in range(len(items)):
+        status, body = check_links(payload)
+        assert status == 200
+        for row in body["results"]:
+            assert row["url"] not in seen
+            seen[row["url"]] = row
+        if body["complete"]:
+            break
+        payload["continuation"] = body["continuation"]
+    else:
+        pytest.fail("continuation tokens never completed")
+
+    assert len(body["results"]) < len(items)  # it took more than one call
+    assert set(seen) == {bm["url"] for bm in items}
+    for i, bm in enumerate(items):
+        row = seen[bm["url"]]
+        assert row["title"] == bm["title"]
+        assert row["status_code"] == (404 if i % 5 == 0 else 200)
+        assert row["expired_link"] == (i % 5 == 0)
+
+
+def test_token_alone_resumes_without_resending_bookmarks(stub_ports, check_links):
+    urls = ["http://127.0.0.1:%d/ok/%d" % (stub_ports["http"][2], i) for i in range(3)]
+    token = checker.encode_continuation(urls[1:])
+    status, body = check_links({"continuation": token, "use_cache": False})
+    assert status == 200 and body["complete"]
+    assert [r["url"] for r in body["results"]] == urls[1:]
@@ -0,0 +1,68 @@
+"""
+The DNS pre-resolution stage: every address is kept and tried in order,
+lookups are cached, and hosts that don't exist are answered without probes.
+"""
+import socket
+
+import pytest
+
+from ExpiredLinkChecker import dns_resolver
+
+# First address refuses (or can't be routed), the second one is the stub server
+ADDRESSES = ("::1", "127.0.0.1")
+
+
+@pytest.fixture
+def fake_dns(monkeypatch):
+    monkeypatch.setattr(dns_resolver, "_dns_cache", {})
+    lookups = []
+
+    def lookup(hostname):
+        lookups.append(hostname)
+        if hostname.startswith("nx."):
+            return dns_resolver.UNRESOLVABLE
+        return ADDRESSES
+
+    monkeypatch.setattr(dns_resolver, "_lookup", lookup)
+    return lookups
+
+
+def test_lookup_keeps_every_address_in_order(monkeypatch):
+    infos = [
+        (socket.AF_INET6, socket.SOCK_STREAM, 6, "", ("2001:db8::1", 0, 0, 0)),
+        (socket.AF_INET, socket.SOCK_STREAM, 6, "", ("192.0.2.1", 0)),
+        (socket.AF_INET6, socket.SOCK_STREAM, 6, "", ("2001:db8::1", 0, 0, 0)),
+    ]
+    monkeypatch.setattr(socket, "getaddrinfo", lambda *a, **k: infos)
+    assert dns_resolver._lookup("example.test") == ("2001:db8::1", "192.0.2.1")
+
+
+def test_resolve_hosts_caches_answers(fake_dns):
+    first, hits = dns_resolver.resolve_hosts(["a.test", "nx.test", "a.test"])
+    assert first == {"a.test": ADDRESSES, "nx.test": dns_resolver.UNRESOLVABLE}
+    assert hits == 0
+    second, hits = dns_resolver.resolve_hosts(["a.test", "nx.test"])
+    assert second == first and hits == 2
+    assert sorted(fake_dns) == ["a.test", "nx.test"]
+
+
+def test_connect_in_order_falls_back_to_later_addresses(stub_ports):
+    port = stub_ports["http"][0]
+    sock = dns_resolver.connect_in_order(ADDRESSES, port, timeout=2.0)
+    try:
+        assert sock.getpeername()[0] == "127.0.0.1"
+    finally:
+        sock.close()
+    with pytest.raises(OSError):
+        dns_resolver.connect_in_order(("::1",), port, timeout=2.0)
+
+
+@pytest.mark.parametrize("engine", ["threads", "async"])
+def test_checker_reaches_host_whose_first_address_is_dead(stub_ports, check_links, fake_dns, engine):
+    port = stub_ports["http"][0]
+    urls = ["http://multi.test:%d/ok/1" % port, "http://multi.test:%d/404/2" % port,
+            "http://nx.test:%d/ok/3" % port]
+    status, body = check_links({"urls": urls, "engine": engine, "use_cache": False})
+    assert status == 200
+    assert [r["status_code"] for r in body["results"]] == [200, 404, None]
+    assert body["dns"] == {"hosts": 2, "cache_hits": 0, "unresolvable_urls": 1}
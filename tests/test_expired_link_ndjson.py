@@ -0,0 +1,38 @@
+"""
+"stream": true -> NDJSON rows in completion order plus a summary line.
+"""
+import pytest
+
+
+@pytest.mark.parametrize("engine", ["threads", "async"])
+def test_stream_has_one_line_per_input_row_and_a_summary(stub_ports, check_links, engine):
+    port = stub_ports["http"][0]
+    items = [
+        {"url": "http://127.0.0.1:%d/ok/1" % port, "title": "a", "folder_name": "F"},
+        {"url": "http://127.0.0.1:%d/410/2" % port, "title": "b", "folder_name": "F"},
+        {"url": "http://127.0.0.1:%d/ok/1" % port, "title": "dup", "folder_name": "G"},
+        {"url": "mailto:someone@example.com", "title": "m"},
+        {"url": ""},
+    ]
+    status, lines = check_links({"bookmarks": items, "engine": engine, "use_cache": False, "stream": True})
+    assert status == 200
+
+    summary = lines[-1]
+    assert summary["summary"] is True and summary["total"] == 4 and summary["complete"]
+
+    rows = {row["index"]: row for row in lines[:-1]}
+    assert sorted(rows) == [0, 1, 2, 3]
+    assert rows[0]["status_code"] == 200 and rows[0]["title"] == "a"
+    assert rows[1]["expired_link"] is True
+    assert rows[2]["status_code"] == 200 and (rows[2]["title"], rows[2]["folder_name"]) == ("dup", "G")
+    assert rows[3]["status_code"] is None and rows[3]["url"] == "mailto:someone@example.com"
+
+
+def test_stream_rows_match_the_json_results(stub_ports, check_links):
+    port = stub_ports["http"][1]
+    items = [{"url": "http://127.0.0.1:%d/%s/%d" % (port, kind, i), "title": str(i)}
+             for i, kind in enumerate(["ok", "404", "500", "redirect", "410"] * 4)]
+    _, body = check_links({"bookmarks": items, "use_cache": False})
+    _, lines = check_links({"bookmarks": items, "use_cache": False, "stream": True})
+    streamed = sorted(lines[:-1], key=lambda row: row.pop("index"))
+    assert streamed == body["results"]
@@ -0,0 +1,88 @@
+"""
+HostConnectionPool: keep-alive reuse, the per-host cap, idle eviction and
+retrying a reused socket the server has closed.
+"""
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import ExpiredLinkChecker as checker
+from ExpiredLinkChecker.connection_pool import HostConnectionPool
+
+
+def head(pool, url):
+    return checker.head_status_with_redirects(url, timeout=2.0, max_redirects=0, pool=pool)
+
+
+def test_sequential_probes_share_one_connection(stub_ports):
+    pool = HostConnectionPool(timeout=2.0)
+    port = stub_ports["http"][0]
+    try:
+        assert [head(pool, "http://127.0.0.1:%d/ok/%d" % (port, i)) for i in range(20)] == [200] * 20
+    finally:
+        pool.close_all()
+    assert pool.created == 1 and pool.reused == 19
+
+
+def test_idle_connections_are_evicted(stub_ports):
+    pool = HostConnectionPool(timeout=2.0, idle_timeout=0.0)
+    port = stub_ports["http"][0]
+    try:
+        for i in range(3):
+            assert head(pool, "http://127.0.0.1:%d/ok/%d" % (port, i)) == 200
+    finally:
+        pool.close_all()
+    assert pool.created == 3 and pool.reused == 0
+
+
+def test_at_most_max_per_host_connections(stub_ports):
+    pool = HostConnectionPool(timeout=2.0, max_per_host=3)
+    port = stub_ports["http"][0]
+    urls = ["http://127.0.0.1:%d/ok/%d?ms=50" % (port, i) for i in range(30)]
+    try:
+        with ThreadPoolExecutor(max_workers=15) as executor:
+            assert list(executor.map(lambda u: head(pool, u), urls)) == [200] * 30
+    finally:
+        pool.close_all()
+    assert pool.created <= 3
+    assert pool.created + pool.reused == 30
+
+
+@pytest.fixture
+def one_shot_server():
+    """
+    Answers one keep-alive-looking response per connection, then hangs up:
+    the next request on that socket fails like a server-side idle close.
+    """
+    listener = socket.create_server(("127.0.0.1", 0))
+    stop = threading.Event()
+
+    def serve():
+        listener.settimeout(0.1)
+        while not stop.is_set():
+            try:
+                conn, _ = listener.accept()
+            except socket.timeout:
+                continue
+            with conn:
+                conn.recv(65536)
+                conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield listener.getsockname()[1]
+    stop.set()
+    thread.join()
+    listener.close()
+
+
+def test_reused_socket_closed_by_server_is_retried(one_shot_server):
+    pool = HostConnectionPool(timeout=2.0)
+    try:
+        assert head(pool, "http://127.0.0.1:%d/a" % one_shot_server) == 200
+        assert head(pool, "http://127.0.0.1:%d/b" % one_shot_server) == 200
+    finally:
+        pool.close_all()
+    assert pool.created == 2 and pool.reused == 1
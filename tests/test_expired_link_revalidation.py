@@ -0,0 +1,112 @@
+"""
+Stale cache entries with an ETag / Last-Modified are re-checked with a
+conditional HEAD, and a 304 keeps the stored answer.
+"""
+import http.server
+import threading
+
+import pytest
+
+import ExpiredLinkChecker as checker
+
+
+class ValidatingHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    etag = '"v1"'
+    seen = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        type(self).seen.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+        else:
+            self.send_response(200)
+        self.send_header("ETag", self.etag)
+        self.send_header("Last-Modified", "Mon, 05 Oct 2026 10:00:00 GMT")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+@pytest.fixture
+def validating_server():
+    ValidatingHandler.etag = '"v1"'
+    ValidatingHandler.seen = []
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ValidatingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def make_stale(store):
+    with store._lock:
+        store._conn.execute("UPDATE link_status SET checked_at = 0")
+        store._conn.commit()
+
+
+def test_conditional_headers():
+    assert checker.conditional_headers(None, None) == {}
+    assert checker.conditional_headers('"x"', "Mon, 05 Oct 2026 10:00:00 GMT") == {
+        "If-None-Match": '"x"', "If-Modified-Since": "Mon, 05 Oct 2026 10:00:00 GMT",
+    }
+
+
+def test_only_good_answers_keep_validators(link_store):
+    link_store.put_many([
+        ("ok", 200, False, '"a"', None),
+        ("gone", 404, True, '"b"', None),
+        ("plain", 200, False, None, None),
+    ])
+    link_store.put_many([("ok", None, False, None, None)])  # a later failed probe
+    assert link_store.get_validators(["ok", "gone", "plain"]) == {"ok": (200, '"a"', None)}
+
+
+@pytest.mark.parametrize("engine", ["threads", "async"])
+def test_stale_entry_is_revalidated_with_a_304(validating_server, check_links, link_store, engine):
+    url = "http://127.0.0.1:%d/page" % validating_server
+    _, first = check_links({"urls": [url], "engine": engine})
+    assert first["results"][0]["status_code"] == 200
+    assert "If-None-Match" not in ValidatingHandler.seen[-1]
+
+    make_stale(link_store)
+    _, second = check_links({"urls": [url], "engine": engine})
+    assert ValidatingHandler.seen[-1]["If-None-Match"] == '"v1"'
+    assert ValidatingHandler.seen[-1]["If-Modified-Since"] == "Mon, 05 Oct 2026 10:00:00 GMT"
+    assert second["results"][0] == {"url": url, "expired_link": False, "status_code": 200, "revalidated": True}
+    assert second["cache"]["revalidated"] == 1
+
+    # The 304 refreshed the entry: the next call is a plain cache hit
+    _, third = check_links({"urls": [url], "engine": engine})
+    assert third["cache"]["hits"] == 1 and len(ValidatingHandler.seen) == 2
+
+
+def test_changed_resource_gets_a_full_answer(validating_server, check_links, link_store):
+    url = "http://127.0.0.1:%d/page" % validating_server
+    check_links({"urls": [url]})
+    make_stale(link_store)
+    ValidatingHandler.etag = '"v2"'
+    _, body = check_links({"urls": [url]})
+    assert body["results"][0] == {"url": url, "expired_link": False, "status_code": 200}
+    assert link_store.get_validators([url]) == {url: (200, '"v2"', "Mon, 05 Oct 2026 10:00:00 GMT")}
+
+
+def test_store_from_before_validators_is_migrated(tmp_path):
+    import sqlite3
+
+    from ExpiredLinkChecker.status_store import LinkStatusStore
+
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE link_status (url_key TEXT PRIMARY KEY, status INTEGER,"
+                 " expired INTEGER NOT NULL, outcome TEXT NOT NULL, checked_at REAL NOT NULL)")
+    conn.execute("INSERT INTO link_status VALUES ('old', 200, 0, 'healthy', 0)")
+    conn.commit()
+    conn.close()
+
+    store = LinkStatusStore(path)
+    assert store.get_validators(["old"]) == {}
+    store.put_many([("old", 200, False, '"e"', None)])
+    assert store.get_validators(["old"]) == {"old": (200, '"e"', None)}
@@ -0,0 +1,76 @@
+"""
+One shared SSLContext, and TLS sessions resumed across connections and
+invocations, against a TLS stub host with a throwaway self-signed cert.
+"""
+import shutil
+
+import pytest
+
+import ExpiredLinkChecker as checker
+from ExpiredLinkChecker import tls
+
+
+@pytest.fixture(scope="module")
+def tls_port(tmp_path_factory):
+    if not shutil.which("openssl"):
+        pytest.skip("openssl CLI not available")
+    import bench_expired_link_checker as bench
+    import stub_server
+
+    certfile, keyfile = bench.make_self_signed_cert(str(tmp_path_factory.mktemp("tls")))
+    ports, servers = stub_server.start_servers(0, 1, certfile, keyfile)
+
+    # The shared context is built once per process; build it trusting the stub
+    mp = pytest.MonkeyPatch()
+    mp.setenv("SSL_CERT_FILE", certfile)
+    mp.setattr(tls, "_context", None)
+    mp.setattr(tls, "tls_sessions", tls.TLSSessionStore())
+    yield ports["https"][0]
+    mp.undo()
+    for server in servers:
+        server.shutdown()
+
+
+def test_context_is_shared():
+    assert tls.shared_ssl_context() is tls.shared_ssl_context()
+
+
+def test_session_store_keeps_the_newest_sessions():
+    store = tls.TLSSessionStore(max_sessions=2)
+    for i in range(3):
+        store.put(("h%d" % i, 443), "session-%d" % i)
+    store.put(("h9", 443), None)
+    assert store.get(("h0", 443)) is None
+    assert store.get(("h1", 443)) == "session-1" and store.get(("h2", 443)) == "session-2"
+
+
+def test_unpooled_probes_resume_the_session(tls_port):
+    handshakes = []
+
+    class Counting(tls.ResumingHTTPSConnection):
+        def __init__(self, *args, **kwargs):
+            kwargs["on_handshake"] = handshakes.append
+            super().__init__(*args, **kwargs)
+
+    for i in range(3):
+        conn = Counting("127.0.0.1", tls_port, timeout=2.0)
+        try:
+            conn.request("HEAD", "/ok/%d" % i)
+            assert conn.getresponse().status == 200
+            conn.save_session()
+        finally:
+            conn.close()
+    assert handshakes == [False, True, True]
+
+
+@pytest.mark.parametrize("engine", ["threads", "async"])
+def test_checker_reports_handshakes(tls_port, check_links, engine):
+    urls = ["https://127.0.0.1:%d/ok/%d" % (tls_port, i) for i in range(12)]
+    _, body = check_links({"urls": urls, "engine": engine, "use_cache": False})
+    assert [r["status_code"] for r in body["results"]] == [200] * 12
+    handshakes = body["tls"]["full_handshakes"] + body["tls"]["resumed_handshakes"]
+    # Keep-alive: at most one handshake per per-host slot, not one per URL
+    assert 1 <= handshakes <= 6
+
+    _, again = check_links({"urls": urls[:1], "engine": "threads", "use_cache": False})
+    assert again["tls"] == {"full_handshakes": 0, "resumed_handshakes": 1}
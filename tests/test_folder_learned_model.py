@@ -0,0 +1,94 @@
+"""
+The learned folder model: incremental training against a full retrain,
+skipping unchanged bookmarks, and "mode": "learned" in main().
+"""
+import random
+
+import FolderCategorySuggester as fcs
+from FolderCategorySuggester import learned_model
+from FolderCategorySuggester.learned_model import FolderModel, train
+
+from conftest import call_function
+
+WORDS = ["python", "coding", "bread", "sourdough", "flight", "hotel", "yoga", "stocks", "the", "x"]
+
+
+def random_snapshot(rng, n_keys=30):
+    rows = []
+    for k in range(n_keys):
+        if rng.random() < 0.3:
+            continue  # deleted / unfiled
+        for folder in rng.sample(["Dev", "Food", "Trips", "Money"], rng.choice([1, 1, 1, 2])):
+            title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 5)))
+            rows.append(("k%d" % k, folder, title, rng.choice(["", "notes"]), "https://h%d.example/" % (k % 4)))
+    return rows
+
+
+def model_view(model, queries):
+    """
+    Everything scoring depends on, by folder name rather than class id (a
+    fresh model numbers folders in another order, which only changes who
+    wins an exact tie).
+    """
+    live = {model.classes[c]: (model.class_docs[c], model.class_tokens[c])
+            for c in range(len(model.classes)) if model.class_docs[c] > 0}
+    postings = {
+        (model.tokens[t], model.classes[c]): count
+        for t in range(len(model.tokens))
+        for c, count in zip(model.post_classes[t], model.post_counts[t]) if count > 0
+    }
+    scorer = model.scorer()
+    posteriors = [p and round(p[1], 9) for p in map(scorer.predict, queries)]
+    return model.stats(), live, postings, posteriors
+
+
+def test_incremental_training_matches_a_fresh_model():
+    rng = random.Random(5)
+    model = FolderModel()
+    queries = [[rng.choice(WORDS) for _ in range(3)] for _ in range(20)]
+    for _ in range(25):
+        rows = random_snapshot(rng)
+        train(model, rows, fcs._WORD_RE)
+        fresh = FolderModel()
+        train(fresh, rows, fcs._WORD_RE)
+        assert model_view(model, queries) == model_view(fresh, queries)
+
+
+def test_unchanged_rows_are_not_tokenized_again(monkeypatch):
+    calls = []
+    tokenize = learned_model.tokenize
+    monkeypatch.setattr(learned_model, "tokenize", lambda *a: calls.append(a) or tokenize(*a))
+
+    rows = [("k%d" % i, "Dev" if i % 2 else "Food", "python coding %d" % i, "", "") for i in range(50)]
+    model = FolderModel()
+    assert train(model, rows, fcs._WORD_RE)["added"] == 50 and len(calls) == 50
+
+    calls.clear()
+    counts = train(model, rows, fcs._WORD_RE)
+    assert counts["unchanged"] == 50 and calls == []
+
+    rows[3] = ("k3", "Dev", "sourdough bread", "", "")
+    rows[4] = ("k4", "Dev", rows[4][2], "", "")  # moved from Food
+    counts = train(model, rows[:-1], fcs._WORD_RE)
+    assert (counts["updated"], counts["added"], counts["moved"], counts["removed"]) == (1, 1, 1, 1)
+    assert len(calls) == 2
+
+
+def test_learned_mode_suggests_the_users_own_folders():
+    filed = [{"url": "https://r%d.example" % i, "title": t, "folder_name": f}
+             for i, (t, f) in enumerate([("sourdough starter tips", "Kitchen"), ("bread crumb recipe", "Kitchen"),
+                                         ("rust borrow checker", "Work stuff"), ("rust async runtime", "Work stuff")])]
+    unfiled = [{"url": "https://new.example", "title": "rust borrow rules", "folder_name": ""},
+               {"url": "https://fares.test", "title": "Cheap flight deals", "folder_name": "Unsorted"}]
+
+    _, body = call_function(fcs, {"bookmarks": filed + unfiled, "mode": "learned", "user_key": "test-user"})
+    new, other = body["results"][-2:]
+    assert new["ai_folder_suggestion"] == "Work stuff" and "rust" in new["reason"]
+    assert other["ai_folder_suggestion"] == "Travel"  # no known words: keyword fallback
+    assert body["model"]["added"] == 4 and body["model"]["cached"] is False
+
+    _, body = call_function(fcs, {"bookmarks": filed + unfiled, "mode": "learned", "user_key": "test-user"})
+    assert body["model"]["cached"] is True and body["model"]["unchanged"] == 4
+
+    _, body = call_function(fcs, {"bookmarks": filed, "mode": "learned", "user_key": "test-user", "retrain": True})
+    assert body["model"]["cached"] is False and body["model"]["added"] == 4
@@ -0,0 +1,59 @@
+"""
+The offline benchmark harness: stub server behaviours, payload building and
+one small timed run.
+"""
+import http.client
+import random
+
+import pytest
+
+import bench_expired_link_checker as bench
+
+
+def head(port, path):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2.0)
+    try:
+        conn.request("HEAD", path)
+        resp = conn.getresponse()
+        return resp.status, resp.getheader("location")
+    finally:
+        conn.close()
+
+
+def test_stub_server_paths(stub_ports):
+    port = stub_ports["http"][3]
+    assert head(port, "/ok/1") == (200, None)
+    assert head(port, "/404/1")[0] == 404 and head(port, "/503/1")[0] == 503
+    assert head(port, "/redirect/7") == (302, "/ok/7")
+    with pytest.raises((ConnectionError, http.client.HTTPException)):
+        head(port, "/reset/1")
+
+
+def test_payload_follows_mix_and_duplicates():
+    rng = random.Random(3)
+    ports = {"http": [1001, 1002], "https": [2001]}
+    payload = bench.build_payload(500, ports, bench.parse_mix("ok=0.5,404=0.5"),
+                                  bench.latency_sampler("fixed:7", rng), 0.2, rng)
+    assert len(payload) == 500
+    urls = [bm["url"] for bm in payload]
+    assert 0 < len(urls) - len(set(urls)) < 200
+    assert {u.split("/")[3] for u in urls} == {"ok", "404"}
+    assert all(u.endswith("?ms=7") for u in urls)
+    assert any(u.startswith("https://127.0.0.1:2001/") for u in urls)
+
+
+def test_latency_sampler_rejects_unknown_distributions():
+    with pytest.raises(ValueError):
+        bench.latency_sampler("gamma:1,2", random.Random(0))
+
+
+@pytest.mark.parametrize("engine", ["threads", "async"])
+def test_run_once_reports_throughput(stub_ports, link_store, engine):
+    rng = random.Random(0)
+    payload = bench.build_payload(40, {"http": stub_ports["http"][:2], "https": []},
+                                  bench.parse_mix(bench.DEFAULT_MIX), bench.latency_sampler("fixed:0", rng),
+                                  0.1, rng)
+    stats = bench.run_once(payload, engine, use_cache=False, use_tracemalloc=False)
+    assert stats["urls"] == 40
+    assert 0 < stats["probes"] <= 40
+    assert stats["urls_per_s"] > 0 and stats["p99_ms"] >= stats["p50_ms"]
@@ -0,0 +1,93 @@
+"""
+"mode": "centroid" in OutlierFinder: quickselect medians, TF-IDF centroid
+distances and top-k / robust-z flagging against straightforward
+sort-based versions, and the mode through main().
+"""
+import math
+import random
+import statistics
+
+import pytest
+
+import OutlierFinder as finder
+from OutlierFinder.centroid import (
+    DEFAULT_Z_THRESHOLD, centroid_distances, centroid_outliers, median, robust_z_scores,
+)
+
+from conftest import call_function
+
+WORDS = ["python", "coding", "bread", "baking", "yoga", "travel", "hotel", "stocks", "museum", "the"]
+
+
+def dense_distances(token_sets):
+    vocab = sorted({t for tokens in token_sets for t in tokens})
+    n = len(token_sets)
+    idf = {t: math.log((1 + n) / (1 + sum(t in s for s in token_sets))) + 1 for t in vocab}
+    vectors = []
+    for tokens in token_sets:
+        v = [idf[t] if t in tokens else 0.0 for t in vocab]
+        norm = math.sqrt(sum(x * x for x in v))
+        vectors.append([x / norm for x in v] if norm else v)
+    centroid = [sum(col) / n for col in zip(*vectors)] if vocab else []
+    c_norm = math.sqrt(sum(x * x for x in centroid))
+    out = []
+    for tokens, v in zip(token_sets, vectors):
+        if not tokens or not c_norm:
+            out.append(1.0)
+        else:
+            out.append(max(0.0, 1 - sum(a * b for a, b in zip(v, centroid)) / c_norm))
+    return out
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_median_matches_statistics_median(seed):
+    rng = random.Random(seed)
+    values = [rng.choice([0.0, 0.5, 1.0, rng.random()]) for _ in range(rng.randint(1, 60))]
+    assert median(values) == statistics.median(values)
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_centroid_distances_match_dense_vectors(seed):
+    rng = random.Random(seed)
+    token_sets = [set(rng.sample(WORDS, rng.randint(0, 4))) for _ in range(rng.randint(1, 25))]
+    assert centroid_distances(token_sets) == pytest.approx(dense_distances(token_sets), abs=1e-9)
+
+
+def test_robust_z_falls_back_to_mean_deviation_when_mad_is_zero():
+    values = [0.1, 0.1, 0.1, 0.1, 0.9]
+    z = robust_z_scores(values)
+    assert z[:4] == [0.0] * 4 and z[4] > DEFAULT_Z_THRESHOLD
+    assert robust_z_scores([0.4] * 5) == [0.0] * 5
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_flagging_matches_a_full_sort(seed):
+    rng = random.Random(seed)
+    texts = [" ".join(rng.sample(WORDS, rng.randint(0, 4))) for _ in range(rng.randint(3, 30))]
+    top_k = rng.choice([None, 0, 1, 3, 100])
+    z_threshold = rng.choice([None, 0.0, 1.0, 3.5])
+
+    flagged, distances, zscores = centroid_outliers(texts, finder.tokenize, top_k=top_k, z_threshold=z_threshold)
+    if top_k is None and z_threshold is None:
+        z_threshold = DEFAULT_Z_THRESHOLD
+    ranked = sorted(range(len(texts)), key=lambda i: (-distances[i], i))
+    if z_threshold is not None:
+        ranked = [i for i in ranked if zscores[i] >= z_threshold]
+    if top_k is not None:
+        ranked = ranked[:top_k]
+    assert flagged == set(ranked)
+
+
+def test_centroid_mode_flags_many_outliers_in_a_dumping_ground_folder():
+    bookmarks = [{"folder_name": "Dev", "title": "python coding tutorial %d" % i} for i in range(6)]
+    bookmarks += [{"folder_name": "Dev", "title": t} for t in ("sourdough bread", "hotel flight")]
+    status, body = call_function(finder, {"bookmarks": bookmarks, "mode": "centroid", "top_k": 2})
+    assert status == 200
+    flagged = [r["title"] for r in body["results"] if r["outlier_score"] == "🌠 Outlier"]
+    assert flagged == ["sourdough bread", "hotel flight"]
+    assert all("outlier_distance" in r and "outlier_z" in r for r in body["results"])
+
+
+def test_centroid_mode_rejects_a_non_numeric_top_k():
+    status, body = call_function(finder, {"bookmarks": [], "mode": "centroid", "top_k": "lots"})
+    assert status == 400 and "top_k" in body["error"]
@@ -0,0 +1,133 @@
+"""
+"mode": "incremental" in OutlierFinder: labels kept up to date by deltas
+against find_outlier_quick() on the current folders, row-level storage,
+reloading across instances, and versions that survive folder deletion.
+"""
+import random
+
+import pytest
+
+import OutlierFinder as finder
+from OutlierFinder import incremental
+from OutlierFinder.incremental import OutlierStateStore
+
+from conftest import call_function
+
+WORDS = ["python", "coding", "bread", "baking", "yoga", "travel", "hotel", "stocks", "museum", "the", "café"]
+OUTLIER = "🌠 Outlier"
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "outliers.sqlite3")
+    monkeypatch.setattr(incremental, "_store", OutlierStateStore(path))
+    return path
+
+
+def expected_labels(library):
+    """
+    {(folder, id): outlier_score} for library = {folder: {id: text}}, ids
+    in first-seen order, with float-order ties going to the earliest.
+    """
+    labels = {}
+    for folder, items in library.items():
+        ids = list(items)
+        outlier = None
+        if len(ids) >= incremental.MIN_FOLDER_ITEMS:
+            _, scores = finder.find_outlier_quick([{"text": items[i]} for i in ids])
+            top = max(scores)
+            outlier = ids[min(k for k, score in enumerate(scores) if score >= top - 1e-9)]
+        labels.update({(folder, i): OUTLIER if i == outlier else "✅ Normal" for i in ids})
+    return labels
+
+
+@pytest.mark.parametrize("seed", range(15))
+def test_deltas_keep_labels_equal_to_a_full_recompute(seed, db_path):
+    rng = random.Random(seed)
+    library = {}  # folder -> {id: text}, in first-seen order
+    client = {}   # what a client applying the responses would hold
+    for step in range(25):
+        before = {f: dict(items) for f, items in library.items()}
+        for _ in range(rng.randint(1, 6)):
+            folder = rng.choice(["Dev", "Food", "Trips"])
+            items = library.setdefault(folder, {})
+            if items and rng.random() < 0.3:
+                del items[rng.choice(list(items))]
+                continue
+            item_id = rng.choice(list(items)) if items and rng.random() < 0.3 else "b%d" % rng.randint(0, 40)
+            if not any(item_id in other for f, other in library.items() if f != folder):  # ids are unique
+                items[item_id] = " ".join(rng.sample(WORDS, rng.randint(0, 4)))
+        library = {f: items for f, items in library.items() if items}
+        add = [{"folder_name": f, "id": i, "title": t} for f, items in library.items() for i, t in items.items()
+               if before.get(f, {}).get(i) != t]
+        remove = [{"folder_name": f, "id": i} for f, items in before.items() for i in items
+                  if i not in library.get(f, {})]
+
+        payload = {"mode": "incremental", "user_key": "u", "add": add, "remove": remove}
+        if step % 7 == 6:
+            payload["bookmarks"] = [{"folder_name": f, "id": i, "title": t}
+                                    for f, items in library.items() for i, t in items.items()]
+        status, body = call_function(finder, payload)
+        assert status == 200
+        for row in body["removed"]:
+            client.pop((row["folder_name"], row["id"]), None)
+        for row in body["changed"]:
+            client[(row["folder_name"], row["id"])] = row["outlier_score"]
+        assert client == expected_labels(library)
+
+
+def test_a_fresh_instance_loads_the_same_state_without_rescoring(db_path):
+    bookmarks = [{"folder_name": "Dev", "id": str(i), "title": "python coding %d" % (i % 4)} for i in range(50)]
+    assert call_function(finder, {"mode": "incremental", "user_key": "u", "add": bookmarks})[0] == 200
+    warm = incremental.get_state_store().get("u", "Dev")
+
+    other = OutlierStateStore(db_path)
+    cold = other.get("u", "Dev")
+    assert cold.scores == warm.scores and cold.outlier() == warm.outlier()
+    assert cold.version == warm.version and not cold.dirty_items
+
+
+def test_a_delta_writes_only_the_rows_it_touched(db_path):
+    bookmarks = [{"folder_name": "Dev", "id": str(i), "title": "word%d" % i} for i in range(500)]
+    call_function(finder, {"mode": "incremental", "user_key": "u", "add": bookmarks})
+    conn = incremental.get_state_store()._conn
+    before = conn.total_changes
+    status, body = call_function(finder, {"mode": "incremental", "user_key": "u",
+                                          "add": [{"folder_name": "Dev", "id": "new", "title": "fresh word3"}]})
+    assert status == 200 and body["items_tokenized"] == 1
+    # the new row, word3's re-scored holder, the folder row and the clock
+    assert conn.total_changes - before <= 5
+
+
+def test_a_recreated_folder_is_not_mistaken_for_a_cached_copy(db_path):
+    a, b = OutlierStateStore(db_path), OutlierStateStore(db_path)
+
+    def apply(store, fn):
+        with store.transaction("u"):
+            state = store.get("u", "Dev")
+            fn(state)
+            store.save("u", "Dev", state)
+
+    def fill(names):
+        def fn(state):
+            for name in names:
+                state.upsert(name, name, [name])
+            state.refresh(set(), names)
+        return fn
+
+    def empty(state):
+        for item_id in list(state.items):
+            state.remove(item_id)
+
+    apply(a, fill(["x", "y", "z"]))        # a caches the folder
+    apply(b, empty)                        # b deletes it...
+    apply(b, fill(["p", "q", "r"]))        # ...and creates it again
+    with a.transaction("u"):
+        assert set(a.get("u", "Dev").items) == {"p", "q", "r"}
+
+
+def test_incremental_mode_needs_a_shared_database(monkeypatch):
+    monkeypatch.setattr(incremental, "_store", None)
+    monkeypatch.setattr(incremental, "OUTLIER_STATE_DB_PATH", "")
+    status, body = call_function(finder, {"mode": "incremental", "user_key": "u", "add": []})
+    assert status == 503 and "OUTLIER_STATE_DB_PATH" in body["error"]
@@ -0,0 +1,138 @@
+"""
+OutlierFinder's process pool: size sharding, job order, the deadline,
+a dead pool, and main() giving the same labels parallel or inline.
+"""
+import random
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import OutlierFinder as finder
+from OutlierFinder import parallel
+from OutlierFinder.parallel import TIMED_OUT, run_jobs, shard_by_size
+from shared_code import process_pool
+
+from conftest import call_function
+
+WORDS = ["python", "coding", "bread", "baking", "yoga", "travel", "hotel", "stocks", "the", "museum"]
+
+
+def slow_shard(jobs):
+    time.sleep(0.5)
+    return [len(job) for job in jobs]
+
+
+def stalled_shard(jobs):
+    time.sleep(60)
+    return [len(job) for job in jobs]
+
+
+def random_bookmarks(rng, n_folders=12):
+    return [
+        {"id": "%d-%d" % (f, i), "folder_name": "F%d" % f,
+         "title": " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 5)))}
+        for f in range(n_folders)
+        for i in range(rng.choice([1, 2, 3, 8, 40]))
+    ]
+
+
+@pytest.fixture
+def force_pool(monkeypatch):
+    # Use the pool for any workload, with at least two workers
+    monkeypatch.setattr(parallel, "PARALLEL_MIN_ITEMS", 0)
+    monkeypatch.setattr(parallel, "OUTLIER_WORKERS", 2)
+    yield
+    process_pool.reset_pool()
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_shard_by_size_covers_every_job_once_and_balances(seed):
+    rng = random.Random(seed)
+    sizes = [rng.choice([1, 3, 10, 500]) for _ in range(rng.randint(0, 40))]
+    n_shards = rng.randint(1, 8)
+    shards = shard_by_size(sizes, n_shards)
+
+    assert sorted(i for shard in shards for i in shard) == list(range(len(sizes)))
+    assert len(shards) <= n_shards and all(shard == sorted(shard) for shard in shards)
+    if shards:
+        loads = [sum(sizes[i] for i in shard) for shard in shards]
+        # Greedy LPT: no shard exceeds the average by more than the largest job
+        assert max(loads) <= sum(sizes) / n_shards + max(sizes)
+
+
+def test_run_jobs_on_the_pool_returns_results_in_job_order(force_pool):
+    rng = random.Random(1)
+    jobs = [["x"] * rng.randint(0, 30) for _ in range(25)]
+    got = run_jobs(finder.evaluate_folders, jobs, [len(job) for job in jobs], deadline=time.monotonic() + 30)
+    assert got == finder.evaluate_folders(jobs)
+
+
+def test_run_jobs_marks_unfinished_jobs_timed_out(force_pool):
+    jobs = [["a"], ["b", "c"]]
+    got = run_jobs(slow_shard, jobs, [1, 2], deadline=time.monotonic() + 0.05)
+    assert got == [TIMED_OUT, TIMED_OUT]
+
+
+def test_a_request_after_a_timed_out_one_gets_the_whole_pool(force_pool, monkeypatch):
+    got = run_jobs(stalled_shard, [["a"], ["b"], ["c"]], [1, 1, 1], deadline=time.monotonic() + 0.5)
+    assert got == [TIMED_OUT] * 3
+
+    # The stalled shards would hold the workers for a minute; this request
+    # must not wait behind them
+    monkeypatch.setattr(finder, "MAX_PROCESSING_SECONDS", 5.0)
+    bookmarks = random_bookmarks(random.Random(7))
+    status, body = call_function(finder, {"bookmarks": bookmarks})
+    assert status == 200 and not body["time_limit_reached"]
+    assert body["folders_evaluated"] == sum(1 for f in {b["folder_name"] for b in bookmarks}
+                                            if sum(b["folder_name"] == f for b in bookmarks) >= 3)
+
+
+def test_run_jobs_inline_skips_jobs_after_the_deadline():
+    got = run_jobs(slow_shard, [["a"], ["b", "c"], ["d"]], [1, 2, 1], deadline=time.monotonic() + 0.2)
+    assert got == [1, TIMED_OUT, TIMED_OUT]
+
+
+def test_run_jobs_redoes_shards_inline_when_the_pool_is_broken(force_pool, monkeypatch):
+    class BrokenPool:
+        def submit(self, *args, **kwargs):
+            raise BrokenProcessPool("worker died")
+
+        def shutdown(self, **kwargs):
+            pass
+
+    monkeypatch.setattr(process_pool, "get_pool", lambda: BrokenPool())
+    jobs = [["a"] * n for n in (3, 0, 5)]
+    got = run_jobs(finder.evaluate_folders, jobs, [3, 0, 5], deadline=time.monotonic() + 30)
+    assert got == finder.evaluate_folders(jobs)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_main_labels_match_with_and_without_the_pool(seed, monkeypatch):
+    bookmarks = random_bookmarks(random.Random(seed))
+    status, inline = call_function(finder, {"bookmarks": bookmarks})
+    assert status == 200
+
+    monkeypatch.setattr(parallel, "PARALLEL_MIN_ITEMS", 0)
+    monkeypatch.setattr(parallel, "OUTLIER_WORKERS", 2)
+    try:
+        status, pooled = call_function(finder, {"bookmarks": bookmarks})
+    finally:
+        process_pool.reset_pool()
+    assert status == 200
+    assert pooled == inline
+    assert inline["folders_evaluated"] == sum(1 for f in {b["folder_name"] for b in bookmarks}
+                                              if sum(b["folder_name"] == f for b in bookmarks) >= 3)
+
+
+def test_the_shared_pool_never_forks_the_functions_worker():
+    pool = process_pool.get_pool()
+    assert pool is not None and pool._mp_context.get_start_method() in ("forkserver", "spawn")
+    assert process_pool.get_pool() is pool  # one pool, made at import
+
+
+def test_pool_workers_do_not_start_pools_of_their_own():
+    try:
+        assert process_pool.get_pool().submit(process_pool.get_pool).result(timeout=30) is None
+    finally:
+        process_pool.reset_pool()
@@ -0,0 +1,78 @@
+"""
+rarity_outliers() (engine "batch") against find_outlier_quick() per
+folder, on random folders, and "engine": "batch" in main().
+"""
+import random
+
+import pytest
+
+import OutlierFinder as finder
+from OutlierFinder.batch import rarity_outliers
+
+from conftest import call_function
+
+pytest.importorskip("numpy")
+
+WORDS = [
+    "python", "pythons", "coding", "coded", "stocks", "stock", "crypto", "bread", "baking",
+    "yoga", "the", "and", "of", "travel", "flights", "hotel", "museum", "x", "", "café",
+]
+
+
+def random_text(rng: random.Random) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 7)))
+    if rng.random() < 0.2:
+        text = text.upper() + rng.choice(["!", "...", " (2024)", ", a-b"])
+    return text
+
+
+def expected_outlier(texts):
+    """
+    find_outlier_quick()'s pick, with sums that differ only by float
+    summation order counted as ties (first one wins), as rarity_outliers()
+    documents.
+    """
+    index, scores = finder.find_outlier_quick([{"text": text} for text in texts])
+    if index is None:
+        return None
+    top = max(scores)
+    first = min(i for i, score in enumerate(scores) if score >= top - 1e-9)
+    assert scores[index] >= top - 1e-9
+    return first
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_rarity_outliers_matches_find_outlier_quick(seed):
+    rng = random.Random(seed)
+    folders = [[random_text(rng) for _ in range(rng.choice([0, 1, 2, 5, 30]))] for _ in range(rng.randint(1, 8))]
+    got = rarity_outliers(folders, finder.normalize_words, finder._word_token)
+    assert got == [expected_outlier(texts) for texts in folders]
+
+
+@pytest.mark.parametrize("folders", [[], [[]], [[], [], []], [[""], []], [["the and", "of"], ["x"]]])
+def test_rarity_outliers_handles_empty_and_stopword_only_folders(folders):
+    got = rarity_outliers(folders, finder.normalize_words, finder._word_token)
+    assert got == [expected_outlier(texts) for texts in folders]
+
+
+def test_rarity_outliers_keeps_texts_containing_the_separator():
+    folders = [["a\x00b python", "bread", "bread"], ["yoga", "yoga stocks"]]
+    got = rarity_outliers(folders, finder.normalize_words, finder._word_token)
+    assert got == [expected_outlier(texts) for texts in folders]
+
+
+def test_batch_engine_gives_the_same_labels_as_the_default():
+    rng = random.Random(7)
+    bookmarks = [{"folder_name": "F%d" % (i % 6), "title": random_text(rng), "description": random_text(rng)}
+                 for i in range(200)]
+
+    def labels(payload):
+        status, body = call_function(finder, payload)
+        assert status == 200
+        return [(r["folder_name"], r["outlier_score"]) for r in body["results"]]
+
+    # Float sums that tie only up to rounding may pick another bookmark,
+    # so compare the number of outliers per folder and the folder order
+    default, batch = labels({"bookmarks": bookmarks}), labels({"bookmarks": bookmarks, "engine": "batch"})
+    assert [f for f, _ in default] == [f for f, _ in batch]
+    assert sorted(default) == sorted(batch)
@@ -0,0 +1,62 @@
+"""
+The batch engine (classify_batch) against the per-subcategory walk, and its
+memory bounds for wide request taxonomies.
+"""
+import random
+
+import pytest
+
+import SmarterFolderSuggester as suggester
+from SmarterFolderSuggester import batch
+from SmarterFolderSuggester.batch import KeywordMatrix, classify_batch
+from test_smarter_folder_scoring import random_case, result_loop
+
+pytest.importorskip("numpy")
+
+
+def classify(categories, texts, hints):
+    km = KeywordMatrix(suggester.compile_taxonomy(categories), suggester._TOKEN_RE)
+    fallback = lambda t, h: suggester.match_folder_category_scored(t, h, compiled=km.compiled)  # noqa: E731
+    return km, classify_batch(km, texts, hints, fallback)
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_classify_batch_matches_loop(seed):
+    categories, texts, hints = random_case(random.Random(seed))
+    hints = [hint or None for hint in hints]
+    expected = [result_loop(categories, text, hint) for text, hint in zip(texts, hints)]
+    assert classify(categories, texts, hints)[1] == expected
+
+
+@pytest.mark.parametrize("dense", [False, True])
+def test_small_block_budget_splits_rows_without_changing_answers(monkeypatch, dense):
+    if dense:
+        monkeypatch.setattr(batch, "sp", None)
+    categories, texts, hints = random_case(random.Random(7))
+    hints = [hint or None for hint in hints]
+    km = KeywordMatrix(suggester.compile_taxonomy(categories), suggester._TOKEN_RE)
+    per_row = 20 * len(km.compiled.labels) + (4 * len(km.col_entries) if batch.sp is None else 0)
+    monkeypatch.setattr(batch, "BATCH_BLOCK_BYTES", 3 * per_row)
+
+    assert batch.chunk_rows(km) == 3
+    expected = [result_loop(categories, text, hint) for text, hint in zip(texts, hints)]
+    assert classify(categories, texts, hints)[1] == expected
+
+
+def test_wide_taxonomy_bounds_the_dense_chunk(monkeypatch):
+    monkeypatch.setattr(batch, "sp", None)
+    categories = {"P": {"S%d" % s: ["kw%d_%d" % (s, k) for k in range(100)] for s in range(200)}}
+    km = KeywordMatrix(suggester.compile_taxonomy(categories), suggester._TOKEN_RE)
+    rows = batch.chunk_rows(km)
+    # A chunk's dense match and score blocks stay within the byte budget
+    assert rows * (4 * len(km.col_entries) + 20 * len(km.compiled.labels)) <= batch.BATCH_BLOCK_BYTES
+    assert rows < batch.BATCH_CHUNK_ROWS
+
+
+def test_oversized_weight_matrix_falls_back_to_the_loop(monkeypatch):
+    monkeypatch.setattr(batch, "BATCH_MAX_WEIGHT_BYTES", 0)
+    categories, texts, hints = random_case(random.Random(3))
+    hints = [hint or None for hint in hints]
+    km, got = classify(categories, texts, hints)
+    assert km.weights is None and batch.batch_backend(km) == "python"
+    assert got == [result_loop(categories, text, hint) for text, hint in zip(texts, hints)]
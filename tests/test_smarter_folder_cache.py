@@ -0,0 +1,88 @@
+"""
+Memoized classification results: keys, the LRU, the optional SQLite copy
+and main() answering unchanged bookmarks from the memo.
+"""
+
+import pytest
+
+import SmarterFolderSuggester as suggester
+from SmarterFolderSuggester import result_cache
+from SmarterFolderSuggester.result_cache import ClassificationCache, classification_key
+
+from conftest import call_function
+
+RESULT = ("Travel", "Flights", 0.75, "score=2 conf=0.75 hits=['flight'] parent=Travel")
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    cache = ClassificationCache(max_entries=1000)
+    monkeypatch.setattr(result_cache, "_cache", cache)
+    return cache
+
+
+def test_key_covers_every_input():
+    base = ("title", "desc", "https://x", "hint", "tax1")
+    keys = {classification_key(*base)}
+    for i in range(len(base)):
+        changed = list(base)
+        changed[i] += "!"
+        keys.add(classification_key(*changed))
+    keys.add(classification_key("tit", "ledesc", "https://x", "hint", "tax1"))
+    assert len(keys) == len(base) + 2
+
+
+def test_lru_evicts_oldest_and_counts_hits():
+    cache = ClassificationCache(max_entries=2, db_path="")
+    cache.put_many([("a", RESULT), ("b", RESULT)])
+    assert cache.get_many(["a"]) == {"a": RESULT}
+    cache.put_many([("c", RESULT)])            # "b" is least recently used
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+    assert cache.stats()["hits"] == 3 and cache.stats()["misses"] == 1
+
+
+def test_sqlite_copy_warms_a_fresh_worker(tmp_path):
+    path = str(tmp_path / "memo.sqlite3")
+    ClassificationCache(db_path=path).put_many([("k", RESULT), ("n", (None, "", 0.0, "No strong match"))])
+    fresh = ClassificationCache(db_path=path)
+    assert fresh.stats()["persistent"] is True
+    assert fresh.get_many(["k", "n", "missing"]) == {"k": RESULT, "n": (None, "", 0.0, "No strong match")}
+
+
+def test_unusable_db_path_keeps_memory_cache(tmp_path):
+    cache = ClassificationCache(db_path=str(tmp_path / "no" / "dir" / "memo.sqlite3"))
+    cache.put_many([("k", RESULT)])
+    assert cache.stats()["persistent"] is False and cache.get_many(["k"]) == {"k": RESULT}
+
+
+def test_main_answers_unchanged_bookmarks_from_the_memo(fresh_cache):
+    def bookmarks():
+        return [
+            {"url": "https://a.example", "title": "Cheap flight tickets", "suggested_category": "Travel"},
+            {"url": "https://b.example", "title": "Python coding tutorial", "suggested_category": "Technology"},
+        ]
+
+    _, first = call_function(suggester, {"bookmarks": bookmarks()})
+    assert first["cache"]["hits"] == 0 and first["cache"]["misses"] == 2
+
+    changed = bookmarks()
+    changed[1]["title"] = "JavaScript coding tutorial"
+    _, second = call_function(suggester, {"bookmarks": changed})
+    assert second["cache"]["hits"] == 1 and second["cache"]["misses"] == 1
+    assert second["results"][0] == first["results"][0]
+
+    _, uncached = call_function(suggester, {"bookmarks": changed, "use_cache": False})
+    assert "cache" not in uncached
+    assert uncached["results"] == second["results"]
+
+
+def test_a_null_field_is_not_the_text_none(fresh_cache):
+    def cache_counts(bookmark):
+        _, body = call_function(suggester, {"bookmarks": [bookmark]})
+        return body["cache"]
+
+    bookmark = {"url": "https://a.example", "title": "Cheap flight tickets", "suggested_category": "Travel"}
+    assert cache_counts(dict(bookmark, description=None))["misses"] == 1
+    assert cache_counts(dict(bookmark, description="None"))["misses"] == 1
+    # ...while a missing description is the same input as a null one
+    assert cache_counts(bookmark)["hits"] == 1
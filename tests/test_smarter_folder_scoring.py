@@ -0,0 +1,110 @@
+"""
+score_compiled() against the original per-subcategory score_match() walk,
+on random taxonomies and texts.
+"""
+import random
+
+import pytest
+
+import SmarterFolderSuggester as suggester
+
+
+def score_loop(categories, text_norm, hint_category=None):
+    """
+    The scorer before the compiled index: score_match() over every
+    subcategory in taxonomy order, strict ">" so the first one wins ties.
+    """
+    tokens = set(suggester._TOKEN_RE.findall(text_norm))
+    best = (None, None, 0, [])
+    second_score = 0
+
+    cats = categories.items()
+    if hint_category and hint_category in categories:
+        cats = [(hint_category, categories[hint_category])]
+
+    for parent, subcats in cats:
+        for subcat, keywords in subcats.items():
+            score, hits = suggester.score_match(text_norm, tokens, keywords)
+            if score > best[2]:
+                second_score = best[2]
+                best = (parent, subcat, score, hits)
+            elif score > second_score:
+                second_score = score
+
+    parent, subcat, score, hits = best
+    return parent, subcat, score, hits, second_score
+
+
+def result_loop(categories, text_norm, hint_category=None):
+    """
+    match_folder_category_scored() output built on score_loop().
+    """
+    parent, subcat, score, hits, second_score = score_loop(categories, text_norm, hint_category)
+    if score <= 0:
+        return None, "", 0.0, "No strong match"
+    conf = 0.55 + 0.10 * score + 0.08 * max(0, score - second_score)
+    conf = max(0.0, min(0.95, conf))
+    return parent, subcat, conf, f"score={score} conf={conf:.2f} hits={hits[:3]} parent={parent}"
+
+
+def random_case(rng: random.Random):
+    words = ["w%d" % i for i in range(rng.choice([6, 20]))] + ["x", "c++", " "]
+    categories = {}
+    for p in range(rng.randint(1, 4)):
+        categories["P%d" % p] = {
+            "S%d" % s: [
+                " ".join(rng.choice(words) for _ in range(rng.choice([1, 1, 1, 2, 3])))
+                for _ in range(rng.randint(0, 8))
+            ]
+            for s in range(rng.randint(1, 4))
+        }
+    texts = [
+        suggester.normalize_text(" ".join(rng.choice(words + ["zz"]) for _ in range(rng.randint(0, 12))))
+        for _ in range(rng.randint(1, 60))
+    ]
+    hints = [rng.choice([None, "", "P0", "P1", "Nope"]) for _ in texts]
+    return categories, texts, hints
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_score_compiled_matches_loop(seed):
+    categories, texts, hints = random_case(random.Random(seed))
+    compiled = suggester.compile_taxonomy(categories)
+    for text, hint in zip(texts, hints):
+        tokens = set(suggester._TOKEN_RE.findall(text))
+        assert suggester.score_compiled(compiled, text, tokens, hint) == score_loop(categories, text, hint)
+
+
+def test_default_taxonomy_matches_loop():
+    rng = random.Random(0)
+    vocab = sorted({
+        w for subcats in suggester.CATEGORIES.values() for keywords in subcats.values()
+        for kw in keywords for w in kw.lower().split()
+    }) + ["the", "how", "to"]
+    for _ in range(2000):
+        text = suggester.normalize_text(" ".join(rng.choice(vocab) for _ in range(rng.randint(0, 25))))
+        hint = rng.choice([None, "Travel", "Technology", "Nope"])
+        assert suggester.match_folder_category_scored(text, hint) == result_loop(suggester.CATEGORIES, text, hint)
+
+
+
+def test_compile_taxonomy_index_layout():
+    compiled = suggester.compile_taxonomy({
+        "A": {"X": ["Flight", " wind power ", "", "flight"], "Y": ["wind power"]},
+        "B": {"Z": []},
+    })
+    assert compiled.labels == [("A", "X"), ("A", "Y"), ("B", "Z")]
+    assert compiled.parents == {"A": [0, 1], "B": [2]}
+    assert compiled.token_index == {"flight": [(0, 0, "flight"), (0, 3, "flight")]}
+    # each distinct phrase is scanned once, whoever lists it
+    assert compiled.phrases == [("wind power", [(0, 1, "wind power"), (1, 0, "wind power")])]
+
+
+def test_hint_limits_candidates_and_keeps_runner_up():
+    categories = {"A": {"X": ["alpha", "beta"]}, "B": {"Y": ["alpha"]}}
+    compiled = suggester.compile_taxonomy(categories)
+    text = "alpha beta"
+    tokens = set(text.split())
+    assert suggester.score_compiled(compiled, text, tokens) == ("A", "X", 2, ["alpha", "beta"], 1)
+    assert suggester.score_compiled(compiled, text, tokens, "B") == ("B", "Y", 1, ["alpha"], 0)
+    assert suggester.score_compiled(compiled, "gamma", {"gamma"}) == (None, None, 0, [], 0)
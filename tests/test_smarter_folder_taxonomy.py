@@ -0,0 +1,80 @@
+"""
+Per-request taxonomies: validation, the compiled-taxonomy LRU and main()
+classifying against the tenant's tree.
+"""
+import json
+
+import pytest
+
+import SmarterFolderSuggester as suggester
+from SmarterFolderSuggester.taxonomy_cache import (
+    MAX_TAXONOMY_KEYWORDS, TaxonomyCache, TaxonomyError, taxonomy_key, validate_taxonomy,
+)
+
+from conftest import call_function
+
+TENANT = {"Cooking": {"Bread": ["sourdough", "bread"], "Pasta": ["pasta", "fresh pasta"]}}
+
+
+@pytest.mark.parametrize("bad", [
+    {},
+    [],
+    {"P": ["x"]},
+    {"P": {"S": "kw"}},
+    {"P": {"S": ["ok", 3]}},
+    {"P": {"S": ["k"] * (MAX_TAXONOMY_KEYWORDS + 1)}},
+])
+def test_malformed_taxonomies_are_rejected(bad):
+    with pytest.raises(TaxonomyError):
+        validate_taxonomy(bad)
+
+
+def test_key_depends_on_content_and_order():
+    same = json.loads(json.dumps(TENANT))
+    reordered = {"Cooking": {"Pasta": TENANT["Cooking"]["Pasta"], "Bread": TENANT["Cooking"]["Bread"]}}
+    assert taxonomy_key(same) == taxonomy_key(TENANT)
+    assert taxonomy_key(reordered) != taxonomy_key(TENANT)
+
+
+def test_cache_compiles_once_and_evicts_least_recently_used():
+    compiled = []
+
+    def compile_fn(taxonomy):
+        compiled.append(taxonomy)
+        return suggester.compile_taxonomy(taxonomy)
+
+    cache = TaxonomyCache(compile_fn, suggester._TOKEN_RE, max_entries=2)
+    trees = [{"P%d" % i: {"S": ["kw%d" % i]}} for i in range(3)]
+
+    first, hit = cache.get(trees[0])
+    assert not hit
+    again, hit = cache.get(json.loads(json.dumps(trees[0])))
+    assert hit and again is first
+    cache.get(trees[1])
+    cache.get(trees[0])          # trees[1] is now the oldest
+    cache.get(trees[2])          # evicts trees[1]
+    assert cache.get(trees[0])[1] and not cache.get(trees[1])[1]
+    assert len(compiled) == 4
+    assert cache.stats() == {"size": 2, "hits": 3, "misses": 4}
+
+
+@pytest.mark.parametrize("engine", ["loop", "batch"])
+def test_main_classifies_with_the_request_taxonomy(engine):
+    bookmarks = [
+        {"url": "https://a.example", "title": "Best sourdough starter", "suggested_category": "x"},
+        {"url": "https://b.example", "title": "Making fresh pasta at home", "suggested_category": "x"},
+        {"url": "https://c.example", "title": "Cheap flights to Rome", "suggested_category": "x"},
+    ]
+    status, body = call_function(suggester, {"bookmarks": bookmarks, "taxonomy": TENANT, "engine": engine,
+                                             "min_conf": 0.5, "use_cache": False})
+    assert status == 200
+    assert [r["smarter_folder"] for r in body["results"]] == ["Cooking > Bread", "Cooking > Pasta", ""]
+    assert body["taxonomy"]["key"] == taxonomy_key(TENANT)[:16]
+
+    status, body = call_function(suggester, {"bookmarks": bookmarks[:1], "taxonomy": TENANT, "use_cache": False})
+    assert body["taxonomy"]["cache_hit"] is True and body["taxonomy"]["compile_ms"] == 0.0
+
+
+def test_main_rejects_bad_taxonomy_with_400():
+    status, body = call_function(suggester, {"bookmarks": [], "taxonomy": {"P": "nope"}})
+    assert status == 400 and "taxonomy" in body["error"]